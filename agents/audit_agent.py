@@ -0,0 +1,217 @@
+# agents/audit_agent.py
+"""
+Auditoria completa num único processo: o estado compartilhado (ledger, índice e e-mails parseados,
+índice da política) é carregado uma vez e as etapas rodam ao mesmo tempo:
+- emails: EmailAgent.iter_evidence (palavras-chave, busca semântica remota, grafo)
+- rules: TransactionAgent.iter_violations (CPU)
+- correlate: CorrelationAgent.iter_correlations, com o mesmo ledger e os mesmos e-mails já carregados (CPU)
+- policy: perguntas ao RAGPolicyAgent, todas ao mesmo tempo (chamadas remotas)
+Um laço asyncio coordena as etapas: as chamadas remotas rodam em threads (asyncio.to_thread; cotas e
+concorrência ficam com core/scheduler.py) e as etapas de CPU (regras e correlação, Python puro que
+disputaria o GIL) num pool de processos criado por fork depois da carga: os workers herdam o estado
+em memória, sem recarregar nem serializar; só os resultados e as métricas voltam. Com um único núcleo,
+sem fork (ex.: Windows) ou com processes=False, o pool é de threads.
+O tempo total tende ao da etapa mais lenta, não à soma das etapas.
+Ao final, consolida os resultados num relatório único (ver consolidate()).
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from core import metrics
+
+DEFAULT_QUESTIONS = [
+    "Qual o limite para despesas sem PO?",
+    "Quais itens são proibidos pela política?",
+    "Quem aprova despesas acima de 500 dólares?",
+]
+CPU_STAGES = ("rules", "correlate")
+SEVERITY_ORDER = {"critical": 3, "high": 2, "medium": 1, "low": 0}
+HIGH_RISK, MEDIUM_RISK = 60, 45  # mesmos cortes do comando `correlate`
+
+# estado carregado no processo principal; os workers (fork) herdam sem recarregar nem serializar
+_SHARED = {}
+
+def _result(name, t0, ok, result=None, error=None):
+    # mesmo formato dos resultados de core/pipeline.py
+    return {"name": name, "ok": ok, "seconds": time.perf_counter() - t0, "result": result, "error": error}
+
+def _cpu_stage(name):
+    """Etapa de CPU sobre o estado compartilhado; num processo filho, devolve também as métricas dele."""
+    forked = _SHARED.get("pid") != os.getpid()
+    if forked:
+        metrics.METRICS.detach()
+    if name == "rules":
+        out = list(_SHARED["ta"].iter_violations())
+    else:
+        from agents.correlation_agent import CorrelationAgent
+        out = list(CorrelationAgent(ta=_SHARED["ta"], emails=_SHARED["emails"]).iter_correlations())
+    return out, metrics.METRICS.snapshot() if forked else None
+
+def _cpu_pool(workers, processes=None):
+    """Pool de processos por fork (herdam o estado já carregado); sem fork, pool de threads. None: automático."""
+    if processes is None:
+        processes = (os.cpu_count() or 1) > 1
+    if processes and "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audit-cpu")
+
+def _email_agent():
+    from agents.email_agent import EmailAgent
+    return EmailAgent()
+
+class AuditAgent:
+    def __init__(self, chunksize=None, questions=None, processes=None, on_finish=None):
+        self.chunksize = chunksize
+        self.questions = DEFAULT_QUESTIONS if questions is None else list(questions)
+        self.processes = processes
+        # on_finish(result) a cada etapa concluída (progresso no CLI)
+        self.on_finish = on_finish
+
+    def _done(self, res):
+        if self.on_finish:
+            self.on_finish(res)
+        return res
+
+    def _load(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            with metrics.span(f"audit.{name}"):
+                return self._done(_result(name, t0, True, fn()))
+        except Exception:
+            return self._done(_result(name, t0, False, error=traceback.format_exc()))
+
+    async def _stage(self, name, make, needs=()):
+        """Roda `make()` (corrotina) como etapa: mede, captura a exceção e avisa on_finish."""
+        t0 = time.perf_counter()
+        failed = [d["name"] for d in needs if not d["ok"]]
+        if failed:
+            return self._done(_result(name, t0, False, error=f"pulada: dependência falhou ({', '.join(failed)})"))
+        try:
+            res = _result(name, t0, True, await make())
+        except Exception:
+            res = _result(name, t0, False, error=traceback.format_exc())
+        # as etapas se intercalam na mesma thread: span registrado no fim, não aberto durante o await
+        metrics.record_span(f"audit.{name}", res["seconds"])
+        return self._done(res)
+
+    async def run_async(self):
+        from agents.transaction_agent import TransactionAgent
+        t0 = time.perf_counter()
+        # o estado compartilhado é carregado antes do pool: os workers criados por fork já o encontram em memória
+        ledger = self._load("load_transactions", lambda: TransactionAgent(chunksize=self.chunksize))
+        mailbox = self._load("load_emails", _email_agent)
+        _SHARED.clear()
+        _SHARED.update(pid=os.getpid(), ta=ledger["result"],
+                       # sem o índice de e-mails, a correlação ainda lê o JSONL por conta própria
+                       emails=mailbox["result"].parsed if mailbox["ok"] else None)
+        loop = asyncio.get_running_loop()
+        try:
+            with _cpu_pool(len(CPU_STAGES), self.processes) as cpu:
+                # etapas de CPU submetidas primeiro: o fork acontece antes de existirem outras threads
+                futures = {name: loop.run_in_executor(cpu, _cpu_stage, name) for name in CPU_STAGES} if ledger["ok"] else {}
+
+                def on_cpu(name):
+                    async def run():
+                        out, snap = await futures[name]
+                        if snap is not None:
+                            metrics.METRICS.merge(snap, under=f"audit.{name}")
+                        return out
+                    return run
+
+                async def emails():
+                    # a busca semântica faz uma chamada remota: thread comum, fora do pool de CPU
+                    return await asyncio.to_thread(lambda: list(mailbox["result"].iter_evidence()))
+
+                async def policy():
+                    from agents.rag_policy_agent import RAGPolicyAgent
+                    agent = await asyncio.to_thread(RAGPolicyAgent)
+                    answers = await asyncio.gather(*(asyncio.to_thread(agent.answer, q) for q in self.questions),
+                                                   return_exceptions=True)
+                    return [{"question": q, "answer": a if not isinstance(a, Exception) else None,
+                             "error": f"{type(a).__name__}: {a}" if isinstance(a, Exception) else None}
+                            for q, a in zip(self.questions, answers)]
+
+                stages = [self._stage("emails", emails, needs=[mailbox]),
+                          self._stage("rules", on_cpu("rules"), needs=[ledger]),
+                          self._stage("correlate", on_cpu("correlate"), needs=[ledger])]
+                if self.questions:
+                    stages.append(self._stage("policy", policy))
+                results = [ledger, mailbox] + list(await asyncio.gather(*stages))
+        finally:
+            _SHARED.clear()
+        return consolidate(results, time.perf_counter() - t0)
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+def consolidate(results, wall):
+    """
+    Relatório único: tempos por etapa, resumo, e `findings` — uma entrada por transação com as violações
+    de regra e a melhor correlação juntas (as duas evidências reforçam uma à outra), mais graves primeiro.
+    """
+    by_name = {r["name"]: r for r in results}
+    get = lambda name, default: by_name[name]["result"] if name in by_name and by_name[name]["ok"] else default
+    evidence = get("emails", [])
+    violations = get("rules", [])
+    correlations = get("correlate", [])
+    policy = get("policy", [])
+
+    findings = {}
+
+    def finding(idx, tx):
+        return findings.setdefault(idx, {"tx_index": idx, "date": tx.get("date"), "beneficiary": tx.get("beneficiary"),
+                                         "amount": tx.get("amount"), "description": tx.get("description"),
+                                         "rules": [], "severity": None, "correlation": None})
+
+    for v in violations:
+        # regras agregadas apontam para todas as parcelas do episódio
+        for idx in v.get("related_rows") or [v["row_index"]]:
+            f = finding(int(idx), v)
+            if v["rule_id"] not in f["rules"]:
+                f["rules"].append(v["rule_id"])
+            if SEVERITY_ORDER.get(v["severity"], -1) > SEVERITY_ORDER.get(f["severity"], -1):
+                f["severity"] = v["severity"]
+    for c in correlations:
+        best = c["best_match"]
+        if best["score"] < MEDIUM_RISK and c["tx_index"] not in findings:
+            continue
+        f = finding(c["tx_index"], c["transaction"])
+        email = best.get("email") or {}
+        f["correlation"] = {"score": round(best["score"], 1), "days_diff": best.get("days_diff"),
+                            "email_id": email.get("id"), "from": email.get("from"), "subject": email.get("subject"),
+                            "policy_sections": [s["section"] for s in c.get("policy_sections", [])]}
+    ranked = sorted(findings.values(), key=lambda f: (
+        bool(f["rules"]) and f["correlation"] is not None,
+        (f["correlation"] or {}).get("score", 0),
+        SEVERITY_ORDER.get(f["severity"], -1)), reverse=True)
+
+    count = lambda items, key: {k: sum(1 for i in items if i.get(key) == k) for k in sorted({i.get(key) for i in items})}
+    scores = [c["best_match"]["score"] for c in correlations]
+    stages = [{k: r[k] for k in ("name", "ok", "seconds", "error")} for r in results]
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "seconds": wall,
+        # soma das etapas (exceto a carga): o que os comandos separados levariam em série
+        "stages_seconds_sum": sum(s["seconds"] for s in stages if not s["name"].startswith("load_")),
+        "stages": stages,
+        "summary": {
+            "conspiracy": None if "emails" not in by_name or not by_name["emails"]["ok"] else ("Sim" if evidence else "Não"),
+            "evidence": len(evidence), "evidence_by_type": count(evidence, "type"),
+            "violations": len(violations), "violations_by_rule": count(violations, "rule_id"),
+            "correlations": len(correlations),
+            "high_risk": sum(s >= HIGH_RISK for s in scores),
+            "medium_risk": sum(MEDIUM_RISK <= s < HIGH_RISK for s in scores),
+            "findings": len(ranked),
+            "findings_with_both": sum(1 for f in ranked if f["rules"] and f["correlation"]),
+            "questions": len(policy),
+        },
+        "findings": ranked,
+        "emails": {"verdict": "Sim" if evidence else "Não", "evidence": evidence},
+        "violations": violations,
+        "correlations": correlations,
+        "policy": policy,
+    }
@@ -9,18 +9,73 @@ Sistema de pontuação:
 - padrões de remetente/destinatário => até 15 pontos
 - relevância do assunto do e-mail => até 10 pontos
 Total possível: 115 pontos (normalizado para 100)
+O score semântico (até 20 pontos) completa o de beneficiário/descrição: os dois juntos não passam dos
+30 pontos dele, então o total e os cortes de risco continuam na mesma escala, com ou sem os vetores.
+É o maior cosseno entre o vetor da descrição e os chunks do e-mail, lidos de core/semantic_match.py:
+um produto matriz-vetor por transação com os chunks da janela, sem chamadas remotas. Sem os vetores
+(etapa TxSemantic ausente ou desatualizada, ou descrição não embedada), vale 0 ("semantic": None).
+Cada correlação traz também as seções da política mais parecidas com o e-mail ("policy_sections"),
+lidas do mapa pré-calculado na ingestão (core/policy_map.py), sem chamadas ao provedor.
 """
 from datetime import timedelta, datetime
 from dateutil import parser as dtparser
+from contextlib import ExitStack
 from pathlib import Path
-import json, re
+import json, os, re, time
 from agents.transaction_agent import TransactionAgent
 from agents.email_agent import EmailAgent, SUSPICIOUS_KEYWORDS
+from core import metrics
+from core.policy_map import load_policy_map
+from core.semantic_match import load_matcher
+
+# score semântico: cosseno até SEMANTIC_FLOOR vale 0, a partir de SEMANTIC_CEIL vale SEMANTIC_MAX (linear entre eles),
+# limitado ao que falta para os 30 pontos de beneficiário/descrição
+SEMANTIC_MAX = 20
+BENEFICIARY_MAX = 30
+SEMANTIC_FLOOR = float(os.getenv("AUDITOR_SEMANTIC_FLOOR", "0.35"))
+SEMANTIC_CEIL = float(os.getenv("AUDITOR_SEMANTIC_CEIL", "0.75"))
+
+# colunas de exportação (core/export.py) de cada correlação
+CORRELATION_COLUMNS = [
+    ("tx_index","int64"), ("transaction.date","string"), ("transaction.beneficiary","string"),
+    ("transaction.amount","float64"), ("transaction.description","string"),
+    ("best_match.score","float64"), ("best_match.days_diff","int64"),
+    *[(f"best_match.score_breakdown.{k}","float64") for k in ("temporal","amount","keywords","sender","beneficiary","subject","semantic")],
+    ("best_match.email.id","string"), ("best_match.email.from","string"), ("best_match.email.to","string"),
+    ("best_match.email.subject","string"), ("best_match.email.date","string"),
+    ("policy_sections","string"),
+]
 
 class CorrelationAgent:
-    def __init__(self, days_window=7):
-        self.ta = TransactionAgent()
-        self.ea = EmailAgent()
+    @property
+    def ea(self):
+        # o índice de e-mails só é carregado se for usado (correlate_all lê o JSONL parseado)
+        if self._ea is None:
+            self._ea = EmailAgent()
+        return self._ea
+
+    @property
+    def policy_map(self):
+        # {email_id: seções da política}; {} se o mapa não existe ou está desatualizado
+        if self._policy_map is None:
+            self._policy_map = load_policy_map() or {}
+        return self._policy_map
+
+    @property
+    def semantic(self):
+        # vetores das descrições e dos chunks de e-mail; None se a etapa TxSemantic não rodou ou está desatualizada
+        if self._semantic is None:
+            self._semantic = load_matcher() or False
+        return self._semantic or None
+
+    def __init__(self, days_window=7, chunksize=None, ta=None, emails=None):
+        # chunksize: percorre o ledger em pedaços em vez de mantê-lo inteiro em memória
+        # ta / emails: ledger e e-mails parseados já carregados por outro agente (ex.: `audit`), para não ler de novo
+        self.ta = ta if ta is not None else TransactionAgent(chunksize=chunksize)
+        self._emails = emails
+        self._ea = None
+        self._policy_map = None
+        self._semantic = None
         self.days_window = days_window
         
         # Padrões suspeitos estendidos
@@ -137,6 +192,13 @@ class CorrelationAgent:
         
         return min(score, 30)
 
+    def calculate_semantic_score(self, similarity):
+        """Pontuação pela similaridade (cosseno) entre a descrição da transação e o e-mail"""
+        if similarity is None:
+            return 0
+        scaled = (similarity - SEMANTIC_FLOOR) / (SEMANTIC_CEIL - SEMANTIC_FLOOR)
+        return round(SEMANTIC_MAX * min(max(scaled, 0.0), 1.0), 1)
+
     def calculate_subject_relevance(self, email_subject):
         """Calcula pontuação baseada na relevância do assunto"""
         score = 0
@@ -155,94 +217,148 @@ class CorrelationAgent:
 
     def correlate_all(self):
         """Correlação aprimorada com melhor pontuação"""
-        results = []
-        
-        # Carrega e-mails parseados
-        parsed_emails = []
+        return list(self.iter_correlations())
+
+    def _load_emails(self):
+        """E-mails parseados com data válida, como pares (e-mail, datetime); a data é parseada uma única vez."""
+        dated = []
         p = Path("data/emails_parsed.jsonl")
-        if p.exists():
-            with p.open("r", encoding="utf-8") as fo:
-                for l in fo:
-                    parsed_emails.append(json.loads(l))
-        
-        # Processa cada transação
-        for idx, tx in self.ta.df.iterrows():
-            tx_date = tx.get("date")
-            tx_amount = float(tx.get("amount", 0.0))
-            tx_benef = str(tx.get("beneficiary", "")).lower()
-            tx_desc = str(tx.get("description", "")).lower() if 'description' in tx else ''
-            
-            candidates = []
-            
-            for e in parsed_emails:
+        if self._emails is None and not p.exists():
+            return dated
+        with metrics.span("correlate.load_emails"), ExitStack() as stack:
+            if self._emails is not None:
+                emails = self._emails
+            else:
+                emails = (json.loads(l) for l in stack.enter_context(p.open("r", encoding="utf-8")))
+            for e in emails:
                 if not e.get("date"):
                     continue
-                
                 try:
-                    ed = dtparser.parse(e["date"], dayfirst=False)
+                    dated.append((e, dtparser.parse(e["date"], dayfirst=False)))
                 except:
                     continue
-                
-                days_diff = abs((ed - pd_to_dt(tx_date)).days) if tx_date is not None else 9999
-                
+        return dated
+
+    def tx_fields(self, tx):
+        """(data, valor, beneficiário, descrição) de uma transação, no formato usado pela pontuação."""
+        tx_date = tx.get("date")
+        tx_dt = pd_to_dt(tx_date) if tx_date is not None else None
+        tx_amount = float(tx.get("amount", 0.0))
+        tx_benef = str(tx.get("beneficiary", "")).lower()
+        tx_desc = str(tx.get("description", "")).lower() if 'description' in tx else ''
+        return tx_dt, tx_amount, tx_benef, tx_desc
+
+    def score_pair(self, fields, e, days_diff, similarity=None):
+        """
+        Pontua uma transação (campos de tx_fields) contra um e-mail a `days_diff` dias dela;
+        `similarity`: cosseno descrição x e-mail (None: sem os vetores, score semântico 0).
+        """
+        _, tx_amount, tx_benef, tx_desc = fields
+        email_body = e.get("body") or ""
+        email_subject = e.get("subject") or ""
+        email_from = e.get("from") or ""
+
+        # Calcula pontuações individuais
+        temporal_score = self.calculate_temporal_score(days_diff)
+        amount_score = self.calculate_amount_score(tx_amount, email_body)
+        keyword_score = self.calculate_keyword_score(email_body, email_subject)
+        sender_score = self.calculate_sender_score(email_from)
+        beneficiary_score = self.calculate_beneficiary_score(
+            tx_benef, tx_desc, email_body, email_subject
+        )
+        subject_score = self.calculate_subject_relevance(email_subject)
+        # completa o match textual de beneficiário/descrição, sem passar do teto dele
+        semantic_score = min(self.calculate_semantic_score(similarity), BENEFICIARY_MAX - beneficiary_score)
+
+        # Pontuação total
+        total_score = (
+            temporal_score +
+            amount_score +
+            keyword_score +
+            sender_score +
+            beneficiary_score +
+            subject_score +
+            semantic_score
+        )
+
+        # Normaliza para 100 (máximo possível é 115)
+        normalized_score = min((total_score / 115) * 100, 100)
+        return {
+            "email": e,
+            "score": normalized_score,
+            "days_diff": days_diff,
+            "score_breakdown": {
+                "temporal": temporal_score,
+                "amount": amount_score,
+                "keywords": keyword_score,
+                "sender": sender_score,
+                "beneficiary": beneficiary_score,
+                "subject": subject_score,
+                "semantic": semantic_score if similarity is not None else None
+            }
+        }
+
+    def similarities(self, tx, emails):
+        """
+        Cosseno da descrição da transação com cada e-mail, num único produto com os chunks de todos eles;
+        None para todos se não há vetores (matcher ausente/desatualizado ou descrição não embedada).
+        """
+        matcher = self.semantic
+        vector = matcher.vector(tx) if matcher is not None and emails else None
+        if vector is None:
+            return [None] * len(emails)
+        return matcher.similarities(vector, [e.get("id") for e in emails])
+
+    def correlation(self, idx, tx, best):
+        """Registro de correlação de uma transação com o seu melhor e-mail."""
+        return {
+            "tx_index": int(idx),
+            "transaction": {
+                "date": str(tx.get("date")),
+                "beneficiary": tx.get("beneficiary"),
+                "amount": tx.get("amount"),
+                "description": tx.get("description", "")
+            },
+            "best_match": best,
+            "policy_sections": self.policy_map.get(str(best["email"].get("id")), []),
+        }
+
+    def iter_correlations(self):
+        """Gera a correlação de cada transação (que tenha algum e-mail candidato) assim que ela é calculada."""
+        parsed_emails = self._load_emails()
+        
+        # Processa cada transação
+        for idx, tx in self._iter_transactions():
+            fields = self.tx_fields(tx)
+            tx_dt = fields[0]
+            
+            candidates = []
+            t0 = time.perf_counter()
+            
+            window = []
+            for e, ed in parsed_emails:
+                days_diff = abs((ed - tx_dt).days) if tx_dt is not None else 9999
                 if days_diff <= self.days_window:
-                    email_body = e.get("body") or ""
-                    email_subject = e.get("subject") or ""
-                    email_from = e.get("from") or ""
-                    
-                    # Calcula pontuações individuais
-                    temporal_score = self.calculate_temporal_score(days_diff)
-                    amount_score = self.calculate_amount_score(tx_amount, email_body)
-                    keyword_score = self.calculate_keyword_score(email_body, email_subject)
-                    sender_score = self.calculate_sender_score(email_from)
-                    beneficiary_score = self.calculate_beneficiary_score(
-                        tx_benef, tx_desc, email_body, email_subject
-                    )
-                    subject_score = self.calculate_subject_relevance(email_subject)
-                    
-                    # Pontuação total
-                    total_score = (
-                        temporal_score +
-                        amount_score +
-                        keyword_score +
-                        sender_score +
-                        beneficiary_score +
-                        subject_score
-                    )
-                    
-                    # Normaliza para 100 (máximo possível é 115)
-                    normalized_score = min((total_score / 115) * 100, 100)
-                    
-                    if normalized_score > 0:
-                        candidates.append({
-                            "email": e,
-                            "score": normalized_score,
-                            "days_diff": days_diff,
-                            "score_breakdown": {
-                                "temporal": temporal_score,
-                                "amount": amount_score,
-                                "keywords": keyword_score,
-                                "sender": sender_score,
-                                "beneficiary": beneficiary_score,
-                                "subject": subject_score
-                            }
-                        })
+                    window.append((e, days_diff))
+            scored = len(window)
+
+            similarities = self.similarities(tx, [e for e, _ in window])
+            for (e, days_diff), similarity in zip(window, similarities):
+                candidate = self.score_pair(fields, e, days_diff, similarity)
+                if candidate["score"] > 0:
+                    candidates.append(candidate)
             
             if candidates:
                 candidates.sort(key=lambda x: x["score"], reverse=True)
-                best = candidates[0]
-                results.append({
-                    "tx_index": int(idx),
-                    "transaction": {
-                        "date": str(tx.get("date")),
-                        "beneficiary": tx.get("beneficiary"),
-                        "amount": tx.get("amount"),
-                        "description": tx.get("description", "")
-                    },
-                    "best_match": best
-                })
-        
-        return results
+            # um registro por transação (não por par): o custo fica fora do laço interno
+            metrics.record_span("correlate.score", time.perf_counter() - t0)
+            metrics.inc("correlation_pairs_scored_total", scored)
+            if candidates:
+                yield self.correlation(idx, tx, candidates[0])
+
+    def _iter_transactions(self):
+        for frame in self.ta.timed_frames():
+            yield from frame.iterrows()
 
 def pd_to_dt(pdts):
     # função auxiliar para criar datetime do python a partir de pandas Timestamp
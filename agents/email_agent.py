@@ -1,17 +1,24 @@
 # agents/email_agent.py
 """
 Agente de Email: busca e-mails, retorna mensagens suspeitas e detecta conspiração.
-Usa vectorstore/emails.
+Usa vectorstore/emails e o grafo de comunicação (core/comm_graph.py) montado na ingestão.
 """
 from pathlib import Path
 from core.embeddings import embed_text
-from core.vectorstore import FaissIndex
 from core.llm import chat_completion
+from core import metrics
+from datetime import date
 import json
+import os
 
 VSTORE_INDEX = Path("vectorstore/emails/emails.index")
 VSTORE_META = Path("vectorstore/emails/emails.meta.pkl")
 PARSED_JSONL = Path("data/emails_parsed.jsonl")
+SHARD_DIR = Path("vectorstore/emails/shards")
+# sem shards, a busca restrita pede ao índice único top_k * este fator e filtra a partição
+PARTITION_OVERFETCH = 8
+# partição dos shards do índice de e-mails (month, quarter, year; "none" não grava shards)
+SHARD_BY = os.getenv("AUDITOR_EMAIL_SHARD_BY", "month")
 
 SUSPICIOUS_KEYWORDS = [
     "conta alternativa","não registrar","apagar recibo","mascarar","mascarar custos",
@@ -20,17 +27,43 @@ SUSPICIOUS_KEYWORDS = [
     "mascarar", "mascaramento", "fazer desaparecer","walkie-talkies","câmeras","algemas","kit de ilusionismo"
 ]
 
+# alvo da conspiração e janela (± dias) em torno de cada e-mail suspeito na evidência do grafo
+CONSPIRACY_TARGET = "toby.flenderson@dundermifflin.com"
+GRAPH_WINDOW_DAYS = 3
+
+# colunas de exportação (core/export.py) de cada evidência
+EVIDENCE_COLUMNS = [
+    ("type","string"), ("email.id","string"), ("email.from","string"), ("email.to","string"),
+    ("email.subject","string"), ("email.date","string"), ("hits","string"),
+    ("chunk.chunk_id","int64"), ("chunk.text","string"), ("group","string"),
+]
+
+def expand_duplicates(meta):
+    """
+    O chunk indexado e as quase-duplicatas ligadas a ele na ingestão (meta["duplicates"]),
+    cada uma com o texto do canônico e os dados do seu próprio e-mail.
+    """
+    yield meta
+    for d in meta.get("duplicates", ()):
+        dup = {k: v for k, v in meta.items() if k != "duplicates"}
+        dup.update({k: d.get(k) for k in ("email_id", "chunk_id", "subject", "from", "date")})
+        dup["duplicate_of"] = f"{meta['email_id']}:{meta['chunk_id']}"
+        yield dup
+
 class EmailAgent:
     def __init__(self, k=6):
         if not VSTORE_INDEX.exists():
             raise RuntimeError("Vectorstore de emails não encontrado. Execute scripts/ingest_emails.py primeiro.")
         # carrega índice
         import pickle
+        from core.vectorstore import FaissIndex  # faiss só é importado quando o agente é criado
         with open(VSTORE_META, "rb") as f:
             metas = pickle.load(f)
         dim = 1536
         self.store = FaissIndex(dim, VSTORE_INDEX, VSTORE_META)
         self.k = k
+        self._graph = None
+        self._shards = None
         # pré-carrega arquivo parseado
         self.parsed = []
         if PARSED_JSONL.exists():
@@ -38,28 +71,108 @@ class EmailAgent:
                 for l in fo:
                     self.parsed.append(json.loads(l))
 
+    @property
+    def graph(self):
+        # grafo gravado na ingestão; desatualizado ou ausente, é montado dos e-mails já carregados
+        if self._graph is None:
+            from core.comm_graph import load_or_build
+            with metrics.span("emails.graph_load"):
+                self._graph = load_or_build(emails=self.parsed)
+        return self._graph
+
+    @property
+    def shards(self):
+        """
+        Shards por partição gravados na ingestão (scripts/ingest_email_shards.py), ou None se não existem
+        ou foram montados de outra versão do índice.
+        """
+        if self._shards is None:
+            from core.vectorstore import ShardedFaissIndex
+            from core.versions import file_version
+            shards = ShardedFaissIndex(SHARD_DIR, self.store.dim)
+            self._shards = shards if shards.keys() and shards.manifest.get("source") == file_version(VSTORE_INDEX) else False
+        return self._shards or None
+
+    def _partition_search(self, qvec, top_k, partitions):
+        """Busca restrita a partições: nos shards; sem shards válidos, no índice único filtrando a partição."""
+        if self.shards is not None:
+            return self.shards.query(qvec, k=top_k, partitions=partitions)
+        keep = self._partition_filter(partitions)
+        total = self.store.index.ntotal if self.store.index is not None else 0
+        # busca a mais e filtra; se a partição ficou com menos de top_k, dobra a busca (sem ordenar o índice inteiro)
+        fetch = min(total, max(top_k * PARTITION_OVERFETCH, top_k))
+        while True:
+            hits = [h for h in self.store.query(qvec, k=fetch) if any(map(keep, expand_duplicates(h["meta"])))]
+            if len(hits) >= top_k or fetch >= total:
+                return hits[:top_k]
+            fetch = min(total, fetch * 2)
+
+    def _partition_filter(self, partitions):
+        """Filtro dos chunks expandidos: as cópias de outras partições ficam de fora da busca restrita."""
+        if not partitions:
+            return None
+        from core.vectorstore import partition_key, partition_matches
+        partitions = [partitions] if isinstance(partitions, str) else partitions
+        by = self.shards.by if self.shards is not None else (SHARD_BY if SHARD_BY != "none" else "month")
+        return lambda meta: any(partition_matches(partition_key(meta, by), p) for p in partitions)
+
+    def graph_evidence(self, emails, target=CONSPIRACY_TARGET, window_days=GRAPH_WINDOW_DAYS):
+        """
+        Para cada e-mail suspeito: o grupo do remetente que conversou na janela (± window_days) sem o alvo,
+        embora algum membro fale com ele em outros momentos.
+        """
+        from core.comm_graph import parse_addresses
+        from core.dates import day_ordinal
+        if target not in self.graph.node:
+            return
+        seen = set()
+        for e in emails:
+            senders = parse_addresses((e or {}).get("from"))
+            if not senders or not e.get("date") or e.get("id") in seen:
+                continue
+            seen.add(e.get("id"))
+            try:
+                day = day_ordinal(e["date"])
+            except (ValueError, OverflowError):
+                continue
+            start, end = date.fromordinal(day - window_days), date.fromordinal(day + window_days)
+            with metrics.span("emails.graph_query"):
+                groups = self.graph.excluded_groups(target, start, end)
+            for g in groups:
+                if any(m["person"] == senders[0][1] for m in g["members"]):
+                    yield {"type": "graph", "email": e, "group": [m["name"] for m in g["members"]],
+                           "hits": [f"{g['messages']} e-mails entre {start} e {end} sem {target}"]}
+
     def search_keyword(self, keywords=None):
         keywords = keywords or SUSPICIOUS_KEYWORDS
         matches = []
-        for e in self.parsed:
-            body = (e.get("body") or "").lower()
-            hits = [kw for kw in keywords if kw.lower() in body]
-            if hits:
-                matches.append({"email":e,"hits":hits})
+        with metrics.span("emails.keyword_scan"):
+            for e in self.parsed:
+                body = (e.get("body") or "").lower()
+                hits = [kw for kw in keywords if kw.lower() in body]
+                if hits:
+                    matches.append({"email":e,"hits":hits})
+        metrics.inc("emails_scanned_total", len(self.parsed))
         return matches
 
-    def semantic_search(self, query, top_k=None):
+    def semantic_search(self, query, top_k=None, partitions=None):
+        """
+        Busca semântica agrupada por e-mail. `partitions` (ex.: ["2008-04"], ["2008-Q2"], ["2008"]) restringe
+        a busca aos shards dessas partições.
+        """
         top_k = top_k or self.k
-        qvec = embed_text(query)
-        hits = self.store.query(qvec, k=top_k)
+        with metrics.span("emails.semantic_search"):
+            qvec = embed_text(query)
+            hits = self._partition_search(qvec, top_k, partitions) if partitions else self.store.query(qvec, k=top_k)
         # agrupa resultados por email_id
+        keep = self._partition_filter(partitions)
         grouped = {}
         for h in hits:
-            meta = h["meta"]
-            eid = meta["email_id"]
-            grouped.setdefault(eid, {"score":[], "chunks":[]})
-            grouped[eid]["score"].append(h["score"])
-            grouped[eid]["chunks"].append(meta)
+            for meta in filter(keep, expand_duplicates(h["meta"])):
+                eid = meta["email_id"]
+                grouped.setdefault(eid, {"score":[], "chunks":[]})
+                grouped[eid]["score"].append(h["score"])
+                grouped[eid]["chunks"].append(meta)
         # formata resultados
         results = []
         for eid, val in grouped.items():
@@ -69,23 +182,30 @@ class EmailAgent:
         results.sort(key=lambda x: x["avg_score"])
         return results
 
-    def detect_conspiracy(self):
-        """
-        Retorna True se indicadores de conspiração estiverem presentes em relação ao Toby (menções explícitas / operação).
-        """
+    def iter_evidence(self):
+        """Gera as evidências uma a uma: primeiro as de palavra-chave, depois as semânticas."""
         # simples: verifica palavras-chave e também busca semântica por "operação fênix" / "Toby"
-        kw_matches = self.search_keyword()
+        suspicious = []
+        for m in self.search_keyword():
+            suspicious.append(m["email"])
+            yield {"type":"keyword","email":m["email"],"hits":m["hits"]}
         sem = self.semantic_search("Toby Flenderson conspiração operação fênix", top_k=10)
-        # considera conspiração presente se kw_matches não vazio OU resultados semânticos com chunks mencionando operação/toby
-        evidence = []
-        for m in kw_matches:
-            evidence.append({"type":"keyword","email":m["email"],"hits":m["hits"]})
         for s in sem:
             # analisa chunks
             for c in s["chunks"]:
                 txt = c.get("text","").lower()
                 if "toby" in txt or "fênix" in txt or "operação" in txt or "destroy" in txt or "destruir" in txt:
-                    evidence.append({"type":"semantic","email":s["email"],"chunk":c})
+                    suspicious.append(s["email"])
+                    yield {"type":"semantic","email":s["email"],"chunk":c}
+        # grafo: quem conversou em volta dos e-mails suspeitos deixando o alvo de fora
+        yield from self.graph_evidence(suspicious)
+
+    def detect_conspiracy(self):
+        """
+        Retorna True se indicadores de conspiração estiverem presentes em relação ao Toby (menções explícitas / operação).
+        """
+        # considera conspiração presente se houver palavra-chave OU resultados semânticos com chunks mencionando operação/toby
+        evidence = list(self.iter_evidence())
         verdict = "Sim" if len(evidence)>0 else "Não"
         return {"verdict":verdict, "evidence":evidence}
 
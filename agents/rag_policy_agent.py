@@ -4,35 +4,76 @@ Agente RAG para responder perguntas sobre politica_compliance.txt usando vectors
 """
 from pathlib import Path
 from core.embeddings import embed_text
-from core.vectorstore import FaissIndex
 from core.llm import chat_completion
+from core import metrics
+from core.context import pack_context, format_passages
 import json, os
 
 VSTORE_INDEX = Path("vectorstore/policy/policy.index")
 VSTORE_META = Path("vectorstore/policy/policy.meta.pkl")
+ANSWER_CACHE = Path("vectorstore/policy/answers.cache.pkl")
+# cosseno mínimo entre perguntas para reaproveitar uma resposta (além dos mesmos chunks recuperados)
+CACHE_THRESHOLD = float(os.getenv("AUDITOR_RAG_CACHE_THRESHOLD", "0.92"))
+CACHE_ENABLED = os.getenv("AUDITOR_RAG_CACHE", "1") != "0"
+# orçamento (tokens estimados) das evidências no prompt
+CONTEXT_TOKENS = int(os.getenv("AUDITOR_RAG_CONTEXT_TOKENS", "1000"))
+
+def index_fingerprint():
+    """Identifica a versão do índice da política: uma nova ingestão invalida o cache de respostas."""
+    from core.versions import file_version
+    return file_version(VSTORE_INDEX, VSTORE_META)
 
 class RAGPolicyAgent:
-    def __init__(self, k=4):
+    def __init__(self, k=4, cache=CACHE_ENABLED, cache_threshold=CACHE_THRESHOLD, context_tokens=CONTEXT_TOKENS):
         if not VSTORE_INDEX.exists():
             raise RuntimeError("Vectorstore de política não encontrado. Execute scripts/ingest_policy.py primeiro.")
         # inferir dim lendo arquivo de índice? Vamos carregar meta para obter um chunk e embedar para obter dim
         import pickle
+        from core.vectorstore import FaissIndex  # faiss só é importado quando o agente é criado
         with open(VSTORE_META, "rb") as f:
             metas = pickle.load(f)
         self.dim = 1536 if len(metas)==0 else 1536  # placeholder (dim de embedding dinâmica em produção)
         self.store = FaissIndex(self.dim, VSTORE_INDEX, VSTORE_META)
         self.k = k
+        self.context_tokens = context_tokens
+        self.cache = None
+        if cache:
+            from core.semantic_cache import SemanticCache
+            self.cache = SemanticCache(ANSWER_CACHE, index_fingerprint(), threshold=cache_threshold)
+
+    def _query_vector(self, question):
+        # pergunta idêntica já respondida: reaproveita o vetor em vez de embedar de novo
+        vec = self.cache.vector_for(question) if self.cache is not None else None
+        return vec if vec is not None else embed_text(question)
 
-    def retrieve(self, question):
-        qvec = embed_text(question)
-        hits = self.store.query(qvec, k=self.k)
+    def retrieve(self, question, qvec=None):
+        with metrics.span("rag.retrieve"):
+            if qvec is None:
+                qvec = self._query_vector(question)
+            hits = self.store.query(qvec, k=self.k)
         return hits
 
     def answer(self, question):
-        hits = self.retrieve(question)
+        with metrics.span("rag.answer"):
+            return self._answer(question)
+
+    def _answer(self, question):
+        qvec = self._query_vector(question)
+        hits = self.retrieve(question, qvec=qvec)
         if not hits:
             return "Não há evidência indexada da política."
-        evidence = "\n\n---\n".join([f"Chunk {h['meta']['chunk_id']} (score={h['score']}):\n{h['meta']['text']}" for h in hits])
+        chunk_ids = [h["meta"]["chunk_id"] for h in hits]
+        if self.cache is not None:
+            cached = self.cache.lookup(qvec, chunk_ids)
+            if cached is not None:
+                metrics.inc("cache_hits_total", cache="rag_answer")
+                return cached["answer"]
+            metrics.inc("cache_misses_total", cache="rag_answer")
+        # chunks sobrepostos/vizinhos viram uma passagem só, dentro do orçamento de tokens
+        passages = pack_context(hits, budget_tokens=self.context_tokens)
+        metrics.inc("context_chunks_total", len(hits), stage="retrieved")
+        metrics.inc("context_chunks_total", sum(len(p["chunk_ids"]) for p in passages), stage="packed")
+        evidence = format_passages(passages)
         prompt = [
             {"role":"system","content":"Você é um auditor especialista em política de compliance da Dunder Mifflin. Responda em Português."},
             {"role":"user","content":f"""Pergunta: {question}
@@ -44,7 +85,10 @@ EVIDÊNCIAS:
 
 Formate a resposta com: RESPOSTA:, RAZÃO:, EVIDÊNCIAS (lista de chunk_id com trechos)."""}
         ]
-        resp = chat_completion(prompt, temperature=0.1)
+        with metrics.span("rag.generate"):
+            resp = chat_completion(prompt, temperature=0.1)
+        if self.cache is not None:
+            self.cache.store(question, qvec, chunk_ids, resp)
         return resp
 
 if __name__ == "__main__":
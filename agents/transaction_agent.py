@@ -1,19 +1,27 @@
 # agents/transaction_agent.py
 """
 Agente de Transações: carrega CSV limpo e aplica regras de política (violações diretas).
-Usa data/transacoes_bancarias.csv produzido por scripts/ingest_transactions.py
+Usa data/transacoes_normalizadas.csv (ou o snapshot Parquet) produzido por scripts/ingest_transactions.py
 """
 import pandas as pd
+import numpy as np
 import re
 from pathlib import Path
+from core.anomaly import AnomalyScorer
+from core import metrics
 
-DATA_CSV = Path("data/transacoes_bancarias.csv")
+DATA_CSV = Path("data/transacoes_normalizadas.csv")
+SNAPSHOT = Path("data/transacoes_normalizadas.parquet")  # snapshot colunar tipado (scripts/ingest_transactions.py)
 POLICY_FILE = Path("data/politica_compliance.txt")  # para referência
+ANOMALY_STATE = Path("vectorstore/transactions/anomaly_state.pkl")
+
+LARGE_EXPENSE_LIMIT = 500.0  # Seção 1.3: acima disso exige PO
+SPLIT_MIN_PART = 50.0        # Seção 1.2: abaixo disso o funcionário tem autonomia (não conta como parcela)
 
 # REGRAS: exemplos básicos mapeados da política
 def rule_large_expense(row):
     # Qualquer despesa única > 500 -> requer PO
-    return row['amount'] > 500.0
+    return row['amount'] > LARGE_EXPENSE_LIMIT
 
 def rule_event_category_above_5(row):
     # "Outros" não permitido acima de 5 USD — aproximar pela descrição contendo 'outros' ou 'diversos'
@@ -37,17 +45,345 @@ RULES = [
     {"id":"R3","fn":rule_prohibited_item,"severity":"critical","explain":"Item proibido de acordo com Lista Negra (Seção 3)."}
 ]
 
+# REGRAS AGREGADAS: janelas deslizantes sobre os dados ordenados por grupo e data.
+# Detectam "smurfing" (Seção 1.3): várias compras abaixo de US$500 que, somadas
+# dentro de `window_days` dias, ultrapassam o limite.
+AGGREGATE_RULES = [
+    {"id":"A1","by":["funcionario","vendor"],"window_days":3,"severity":"high","explain":"Compras do mesmo funcionário ao mesmo fornecedor somam mais de US$500 em até 3 dias — possível divisão de compra (Seção 1.3)."},
+    {"id":"A2","by":["funcionario"],"window_days":1,"severity":"medium","explain":"Compras do mesmo funcionário no mesmo dia somam mais de US$500 sem exceder o limite individualmente (Seção 1.3)."},
+    {"id":"A3","by":["vendor"],"window_days":1,"severity":"medium","explain":"Compras ao mesmo fornecedor no mesmo dia somam mais de US$500 sem exceder o limite individualmente (Seção 1.3)."}
+]
+
+# REGRA ESTATÍSTICA: pontuação online por (funcionário, categoria, departamento), com
+# recuo para níveis mais amplos quando a chave ainda não tem histórico suficiente.
+ANOMALY_LEVELS = [("funcionario","categoria","departamento"), ("categoria",), ()]
+ANOMALY_RULE = {"id":"S1","severity":"medium","explain":"Valor atípico para o histórico do funcionário/categoria/departamento (z-score em escala log ≥ 3 e acima do p95)."}
+
+def vendor_key(description, beneficiary=None):
+    # fornecedor: beneficiário quando conhecido, senão o prefixo da descrição
+    # ("Staples - Despesa de ..." -> "staples", "Algemas de Houdini (Loja ...)" -> "algemas de houdini")
+    benef = str(beneficiary or "").strip().lower()
+    if benef and benef not in ("unknown", "nan", "none"):
+        return benef
+    desc = str(description or "").strip().lower()
+    if not desc or desc == "nan":
+        return None
+    return re.split(r" - | \(", desc, maxsplit=1)[0].strip()
+
+def _description(df):
+    # o CSV original traz 'descricao'; o normalizado pode trazer 'description'
+    if "description" in df.columns:
+        return df["description"]
+    if "descricao" in df.columns:
+        return df["descricao"]
+    return pd.Series([None] * len(df), index=df.index)
+
+def window_aggregates(keys, days, amounts, window_days):
+    """
+    Soma/contagem em janela deslizante de `window_days` dias por grupo.
+    `keys` (códigos inteiros de grupo) e `days` (dias inteiros) devem vir ordenados por (grupo, dia).
+    Cada linha i recebe a janela [dia_i - window_days + 1, dia_i] do seu grupo: uma busca binária
+    + somas prefixadas, O(n log n) no total, sem comparar pares.
+    Retorna (start, total, count) alinhados às linhas.
+    """
+    days = days - days.min() + window_days
+    span = int(days.max()) + 1
+    composite = keys.astype(np.int64) * span + days
+    start = np.searchsorted(composite, composite - (window_days - 1), side="left")
+    csum = np.concatenate(([0.0], np.cumsum(amounts, dtype=np.float64)))
+    pos = np.arange(len(composite))
+    total = csum[pos + 1] - csum[start]
+    count = pos - start + 1
+    return start, total, count
+
+def apply_aggregate_rule(df, rule):
+    """Aplica uma regra de AGGREGATE_RULES ao DataFrame e retorna uma violação por episódio."""
+    if df.empty or "date" not in df.columns:
+        return []
+    work = pd.DataFrame({
+        "date": pd.to_datetime(df["date"], errors="coerce"),
+        "amount": df["amount"].astype(float),
+        "vendor": [vendor_key(d, b) for d, b in zip(_description(df), df["beneficiary"] if "beneficiary" in df.columns else [None] * len(df))],
+        "funcionario": df["funcionario"] if "funcionario" in df.columns else None,
+    }, index=df.index)
+    # parcelas candidatas: abaixo do limite individual, acima da alçada do funcionário
+    mask = (work["amount"] > SPLIT_MIN_PART) & (work["amount"] <= LARGE_EXPENSE_LIMIT) & work["date"].notna()
+    for col in rule["by"]:
+        mask &= work[col].notna()
+    work = work[mask]
+    if work.empty:
+        return []
+    codes = work.groupby(rule["by"], sort=False, observed=True).ngroup().to_numpy()
+    days = work["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    order = np.lexsort((days, codes))
+    codes, days = codes[order], days[order]
+    amounts = work["amount"].to_numpy()[order]
+    row_index = work.index.to_numpy()[order]
+    start, total, count = window_aggregates(codes, days, amounts, rule["window_days"])
+
+    # janelas sobrepostas do mesmo grupo formam um único episódio
+    episodes = []
+    for i in np.flatnonzero((total > LARGE_EXPENSE_LIMIT) & (count >= 2)):
+        if episodes and episodes[-1]["code"] == codes[i] and start[i] <= episodes[-1]["end"]:
+            episodes[-1]["end"] = i
+        else:
+            episodes.append({"code": codes[i], "start": start[i], "end": i})
+
+    violations = []
+    for ep in episodes:
+        s, e = ep["start"], ep["end"]
+        last = df.loc[row_index[e]]
+        violations.append({
+            "row_index": int(row_index[e]),
+            "date": str(last.get("date")),
+            "beneficiary": last.get("beneficiary"),
+            "amount": round(float(amounts[s:e + 1].sum()), 2),
+            "rule_id": rule["id"],
+            "severity": rule["severity"],
+            "explain": rule["explain"],
+            "description": last.get("description", last.get("descricao")),
+            "group": {col: work.loc[row_index[e], col] for col in rule["by"]},
+            "window_count": int(e - s + 1),
+            "related_rows": [int(r) for r in row_index[s:e + 1]]
+        })
+    return violations
+
+# colunas de exportação (core/export.py) de cada violação; group/related_rows/anomaly vão como JSON
+VIOLATION_COLUMNS = [
+    ("row_index","int64"), ("date","string"), ("description","string"), ("beneficiary","string"),
+    ("amount","float64"), ("rule_id","string"), ("severity","string"), ("explain","string"),
+    ("group","string"), ("window_count","int64"), ("related_rows","string"), ("anomaly","string"),
+]
+
+# colunas que as regras e a correlação usam (projeção ao ler o ledger)
+COLUMNS = ["id_transacao","date","amount","funcionario","categoria","departamento","description","beneficiary"]
+
+def project(names):
+    """Colunas de COLUMNS presentes em `names`; 'descricao' (texto igual ao de 'description') só na falta dela."""
+    cols = [c for c in COLUMNS if c in names]
+    if "description" not in names and "descricao" in names:
+        cols.append("descricao")
+    return cols
+
+def _row_key(row):
+    if "id_transacao" in row.index:
+        return str(row["id_transacao"])
+    return (str(row.get("date")), float(row.get("amount", 0.0)))
+
+def normalize_frame(df):
+    # garante os tipos usados pelas regras (date datetime64, amount numérico)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["amount"] = df["amount"].astype(float)
+    return df
+
+def score_anomalies(df, scorer):
+    """
+    Pontua (uma passada) as linhas de `df` ainda não consumidas pelo `scorer`, atualizando-o.
+    `df` pode ser o ledger inteiro ou um pedaço dele: o índice das linhas é a posição no ledger.
+    Retorna as novas violações S1.
+    """
+    violations = []
+    new_rows = df[df.index >= scorer.offset]
+    if new_rows.empty:
+        return violations
+    cols = [c for c in ("funcionario","categoria","departamento") if c in df.columns]
+    records = new_rows[cols].to_dict("records") if cols else [{}] * len(new_rows)
+    for idx, rec, amount in zip(new_rows.index, records, new_rows["amount"].to_numpy()):
+        s = scorer.observe(rec, float(amount))
+        if s is None:
+            continue
+        row = df.loc[idx]
+        violations.append({
+            "row_index": int(idx),
+            "date": str(row.get("date")),
+            "beneficiary": row.get("beneficiary"),
+            "amount": float(amount),
+            "rule_id": ANOMALY_RULE["id"],
+            "severity": ANOMALY_RULE["severity"],
+            "explain": ANOMALY_RULE["explain"],
+            "description": row.get("description", row.get("descricao")),
+            "anomaly": s
+        })
+    scorer.offset = int(new_rows.index.max()) + 1
+    return violations
+
+class AggregateWindow:
+    """
+    Avalia AGGREGATE_RULES pedaço a pedaço, com memória limitada.
+    Mantém de um pedaço para o outro apenas as linhas que ainda podem entrar numa janela
+    (os últimos `window_days` dias) e as de episódios ainda abertos. Um episódio é emitido
+    quando fecha, ou seja, quando nenhuma linha futura pode mais estendê-lo.
+    Pressupõe o ledger em ordem cronológica (como o CSV exportado pelo banco).
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.carry = None
+        self.max_day = None
+        self.reported = {r["id"]: set() for r in rules}
+
+    def _evaluate(self, final):
+        out, keep_from = [], None
+        for rule in self.rules:
+            for v in apply_aggregate_rule(self.carry, rule):
+                rows = v["related_rows"]
+                if self.reported[rule["id"]].intersection(rows):
+                    continue
+                last_day = pd.Timestamp(v["date"]).normalize()
+                if final or last_day < self.max_day - pd.Timedelta(days=rule["window_days"] - 1):
+                    self.reported[rule["id"]].update(rows)
+                    out.append(v)
+                else:
+                    first_day = self.carry.loc[rows[0], "date"].normalize()
+                    keep_from = first_day if keep_from is None else min(keep_from, first_day)
+        return out, keep_from
+
+    def feed(self, chunk):
+        self.carry = chunk if self.carry is None else pd.concat([self.carry, chunk])
+        chunk_max = chunk["date"].max()
+        if pd.notna(chunk_max):
+            chunk_max = chunk_max.normalize()
+            self.max_day = chunk_max if self.max_day is None else max(self.max_day, chunk_max)
+        if self.max_day is None:
+            return []
+        out, keep_from = self._evaluate(final=False)
+        widest = max(r["window_days"] for r in self.rules)
+        cut = self.max_day - pd.Timedelta(days=widest - 1)
+        if keep_from is not None:
+            cut = min(cut, keep_from)
+        self.carry = self.carry[self.carry["date"] >= cut]
+        kept = set(self.carry.index)
+        for rid in self.reported:
+            self.reported[rid] &= kept
+        return out
+
+    def flush(self):
+        if self.carry is None or self.carry.empty:
+            return []
+        out, _ = self._evaluate(final=True)
+        self.carry = None
+        return out
+
 class TransactionAgent:
-    def __init__(self):
-        if not DATA_CSV.exists():
+    def __init__(self, chunksize=None):
+        if not DATA_CSV.exists() and not SNAPSHOT.exists():
             raise RuntimeError("CSV de transações limpo não encontrado. Execute scripts/ingest_transactions.py primeiro.")
-        self.df = pd.read_csv(DATA_CSV, parse_dates=["date"], dayfirst=False)
-        # garante que amount seja numérico
-        self.df['amount'] = self.df['amount'].astype(float)
+        # chunksize: processa o ledger em pedaços de N linhas sem carregá-lo inteiro (memória limitada)
+        self.chunksize = chunksize
+        self.snapshot = self._snapshot_columns()
+        self.df = None
+        self._keys = {}  # posição (1-based) -> chave da linha, só no modo em pedaços
+        if not chunksize:
+            with metrics.span("transactions.load"):
+                if self.snapshot:
+                    self.df = normalize_frame(pd.read_parquet(SNAPSHOT, columns=self.snapshot))
+                else:
+                    self.df = normalize_frame(pd.read_csv(DATA_CSV, usecols=project(self._csv_names())))
 
-    def run_rules(self):
+    def _snapshot_columns(self):
+        """
+        Colunas a ler do snapshot Parquet, ou None para usar o CSV (snapshot ausente, sem pyarrow ou
+        gerado de outro CSV: tamanho/hash gravados nos metadados diferentes do CSV atual).
+        """
+        from core.snapshot import is_fresh
+        if not is_fresh(SNAPSHOT, DATA_CSV):
+            return None
+        import pyarrow.parquet as pq
+        return project(pq.read_schema(SNAPSHOT).names)
+
+    def _csv_names(self):
+        return list(pd.read_csv(DATA_CSV, nrows=0).columns)
+
+    def iter_frames(self):
+        """Gera o ledger normalizado: inteiro, ou em pedaços com índice = posição da linha no arquivo."""
+        if self.df is not None:
+            yield self.df
+            return
+        if self.snapshot:
+            import pyarrow.parquet as pq
+            offset = 0
+            for batch in pq.ParquetFile(SNAPSHOT).iter_batches(batch_size=self.chunksize, columns=self.snapshot):
+                chunk = batch.to_pandas()
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                self._remember_keys(chunk)
+                yield normalize_frame(chunk)
+            return
+        for chunk in pd.read_csv(DATA_CSV, chunksize=self.chunksize, usecols=project(self._csv_names())):
+            self._remember_keys(chunk)
+            yield normalize_frame(chunk)
+
+    def timed_frames(self):
+        """iter_frames() com a leitura de cada pedaço medida à parte (span transactions.load)."""
+        frames = self.iter_frames()
+        while True:
+            with metrics.span("transactions.load"):
+                chunk = next(frames, None)
+            if chunk is None:
+                return
+            metrics.inc("transactions_scanned_total", len(chunk))
+            yield chunk
+
+    def _ledger_key(self, pos):
+        # identifica a linha `pos` (1-based) do ledger para detectar se o arquivo foi reescrito entre execuções
+        if pos <= 0:
+            return None
+        if self.df is not None:
+            return _row_key(self.df.iloc[pos - 1]) if pos <= len(self.df) else None
+        # em pedaços: chaves vistas na última passada (iter_frames) ou lidas sem carregar o ledger inteiro
+        if pos not in self._keys:
+            self._keys[pos] = self._snapshot_key(pos) if self.snapshot else self._csv_key(pos)
+        return self._keys[pos]
+
+    def _snapshot_key(self, pos):
+        """Chave da linha `pos` lendo só o row group do snapshot que a contém."""
+        import pyarrow.parquet as pq
+        cols = ["id_transacao"] if "id_transacao" in self.snapshot else ["date", "amount"]
+        pf = pq.ParquetFile(SNAPSHOT)
+        start = 0
+        for g in range(pf.num_row_groups):
+            n = pf.metadata.row_group(g).num_rows
+            if pos <= start + n:
+                return _row_key(pf.read_row_group(g, columns=cols).slice(pos - 1 - start, 1).to_pandas().iloc[0])
+            start += n
+        return None
+
+    def _csv_key(self, pos):
+        """Chave da linha `pos` percorrendo o CSV em pedaços de `chunksize` linhas (memória limitada)."""
+        start = 0
+        for chunk in pd.read_csv(DATA_CSV, chunksize=self.chunksize):
+            if pos <= start + len(chunk):
+                return _row_key(chunk.iloc[pos - 1 - start])
+            start += len(chunk)
+        return None
+
+    def _remember_keys(self, chunk):
+        # a primeira linha e a última lida até aqui: o fingerprint do estado S1 sai daqui, sem reler o ledger
+        if chunk.empty:
+            return
+        first = int(chunk.index[0])
+        if first == 0:
+            self._keys = {1: _row_key(chunk.iloc[0])}
+        else:
+            self._keys = {pos: key for pos, key in self._keys.items() if pos == 1}
+        self._keys[int(chunk.index[-1]) + 1] = _row_key(chunk.iloc[-1])
+
+    def _load_scorer(self, state_path):
+        scorer = AnomalyScorer.load(state_path, levels=ANOMALY_LEVELS)
+        if (scorer.levels != [tuple(l) for l in ANOMALY_LEVELS]
+                or scorer.fingerprint != (self._ledger_key(1), self._ledger_key(scorer.offset))):
+            scorer = AnomalyScorer(levels=ANOMALY_LEVELS)
+        return scorer
+
+    def _save_scorer(self, scorer, state_path, new_flags):
+        fingerprint = (self._ledger_key(1), self._ledger_key(scorer.offset))
+        if new_flags or scorer.fingerprint != fingerprint:
+            scorer.flags.extend(new_flags)
+            scorer.fingerprint = fingerprint
+            scorer.save(state_path)
+
+    def row_violations(self, df):
         violations = []
-        for idx, row in self.df.iterrows():
+        for idx, row in df.iterrows():
             for r in RULES:
                 try:
                     if r["fn"](row):
@@ -65,8 +401,64 @@ class TransactionAgent:
                     print("Erro ao avaliar regra", r["id"], e)
         return violations
 
+    def iter_violations(self, state_path=ANOMALY_STATE):
+        """
+        Gera as violações pedaço a pedaço: regras por linha, regras agregadas (A*) e
+        anomalias estatísticas (S1). Com `chunksize`, o pico de memória depende do tamanho
+        do pedaço e das janelas, não do tamanho do ledger.
+        """
+        scorer = self._load_scorer(state_path)
+        # anomalias já sinalizadas em execuções anteriores (linhas antes do offset salvo)
+        yield from list(scorer.flags)
+        window = AggregateWindow(AGGREGATE_RULES)
+        new_flags = []
+        # os spans cobrem só o cálculo: o consumidor do gerador (render/exportação) não entra na conta
+        for chunk in self.timed_frames():
+            with metrics.span("transactions.row_rules"):
+                rows = self.row_violations(chunk)
+            yield from rows
+            try:
+                with metrics.span("transactions.aggregate_rules"):
+                    aggregated = window.feed(chunk)
+                yield from aggregated
+            except Exception as e:
+                print("Erro ao avaliar regras agregadas", e)
+            try:
+                with metrics.span("transactions.anomaly"):
+                    flags = score_anomalies(chunk, scorer)
+            except Exception as e:
+                print("Erro ao avaliar regra", ANOMALY_RULE["id"], e)
+                flags = []
+            new_flags.extend(flags)
+            yield from flags
+        try:
+            with metrics.span("transactions.aggregate_rules"):
+                aggregated = window.flush()
+            yield from aggregated
+        except Exception as e:
+            print("Erro ao avaliar regras agregadas", e)
+        self._save_scorer(scorer, state_path, new_flags)
+
+    def run_rules(self):
+        return list(self.iter_violations())
+
+    def run_anomaly_scoring(self, state_path=ANOMALY_STATE):
+        """
+        Pontuação estatística incremental: as estatísticas ficam em `state_path` e só as
+        linhas novas do ledger (após o offset salvo) são pontuadas. Se o ledger foi
+        reescrito (ou os níveis mudaram), o estado é recomeçado do zero.
+        """
+        scorer = self._load_scorer(state_path)
+        new_flags = []
+        for chunk in self.iter_frames():
+            new_flags.extend(score_anomalies(chunk, scorer))
+        self._save_scorer(scorer, state_path, new_flags)
+        return list(scorer.flags)
+
 if __name__ == "__main__":
-    ta = TransactionAgent()
-    v = ta.run_rules()
+    import sys
+    chunksize = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    ta = TransactionAgent(chunksize=chunksize)
     import json, pprint
-    pprint.pprint(v)
+    for v in ta.iter_violations():
+        pprint.pprint(v)
@@ -0,0 +1,414 @@
+# cli/daemon.py
+"""
+Daemon de auditoria: carrega agentes e resultados uma vez num processo de longa duração e os
+expõe via HTTP em localhost (ThreadingHTTPServer, uma thread por requisição).
+- GET  /health                      -> {"status", "pid", "loaded"}
+- POST /rag          {"question"}   -> {"answer", "hits"}
+- GET  /emails                      -> resultado de EmailAgent.detect_conspiracy()
+- GET  /transactions?chunksize=N    -> lista de violações (TransactionAgent.run_rules())
+- GET  /correlate?chunksize=N       -> lista de correlações (CorrelationAgent.correlate_all())
+- GET  /transactions/stream, /correlate/stream (?chunksize=N)
+                                    -> os mesmos registros em NDJSON, um por linha, à medida que são gerados;
+                                       o cliente que fecha a conexão interrompe o processamento
+- GET  /metrics?format=json         -> métricas do daemon (core/metrics.py), texto Prometheus por padrão
+- POST /shutdown
+Agentes e resultados ficam em cache até os arquivos de que dependem mudarem (ex.: nova ingestão).
+O CLI (cli/run.py) vira um cliente fino quando encontra o daemon em AUDITOR_URL.
+Cada início gera um token aleatório gravado só para o dono (0600) em vectorstore/daemon-<porta>.token;
+toda rota, exceto /health, exige "Authorization: Bearer <token>". POSTs só com corpo application/json,
+e requisições com Origin de outro site (páginas abertas no navegador) são recusadas.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+import hmac
+import json
+import secrets
+import threading
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib import request as urlrequest, error as urlerror
+from urllib.parse import urlparse, parse_qs, urlencode
+from core import metrics
+from core.versions import file_version
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.getenv("AUDITOR_PORT", "8765"))
+DAEMON_URL = os.getenv("AUDITOR_URL", f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+TOKEN_DIR = Path(workspace_root) / "vectorstore"
+
+POLICY_FILES = ("vectorstore/policy/policy.index", "vectorstore/policy/policy.meta.pkl")
+EMAIL_FILES = ("vectorstore/emails/emails.index", "vectorstore/emails/emails.meta.pkl", "data/emails_parsed.jsonl",
+               "vectorstore/emails/graph.npz", "vectorstore/emails/shards/manifest.json")
+TX_FILES = ("data/transacoes_normalizadas.csv", "data/transacoes_normalizadas.parquet")
+# arquivos que cada agente lê: quando algum muda, o agente (e o resultado em cache) é recriado
+AGENT_FILES = {
+    "rag": POLICY_FILES,
+    "emails": EMAIL_FILES,
+    "transactions": TX_FILES,
+    "correlate": TX_FILES + ("data/emails_parsed.jsonl", "vectorstore/emails/policy_map.npz",
+                             "vectorstore/emails/emails.index", "vectorstore/emails/chunk_vectors.npz",
+                             "vectorstore/transactions/desc_vectors.npz"),
+}
+
+def token_path(port):
+    return Path(os.getenv("AUDITOR_TOKEN_FILE") or TOKEN_DIR / f"daemon-{port}.token")
+
+def write_token(port, token):
+    """Grava o token deste início do daemon legível só pelo dono (0600)."""
+    path = token_path(port)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    tmp.replace(path)
+
+def read_token(port):
+    try:
+        return token_path(port).read_text().strip() or None
+    except OSError:
+        return None
+
+def remove_token(port, token):
+    # só apaga se o arquivo ainda for deste daemon
+    if read_token(port) == token:
+        token_path(port).unlink(missing_ok=True)
+
+def _build_agent(name, chunksize=None):
+    if name == "rag":
+        from agents.rag_policy_agent import RAGPolicyAgent
+        return RAGPolicyAgent()
+    if name == "emails":
+        from agents.email_agent import EmailAgent
+        return EmailAgent()
+    if name == "transactions":
+        from agents.transaction_agent import TransactionAgent
+        return TransactionAgent(chunksize=chunksize)
+    if name == "correlate":
+        from agents.correlation_agent import CorrelationAgent
+        return CorrelationAgent(chunksize=chunksize)
+    raise ValueError(f"Agente desconhecido: {name}")
+
+class AuditService:
+    """Agentes e resultados compartilhados entre as requisições."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._agents = {}   # (nome, chunksize) -> (fingerprint, agente)
+        self._results = {}  # (nome, chunksize) -> (fingerprint, resultado)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def agent(self, name, chunksize=None):
+        key = (name, chunksize)
+        # um lock por agente: requisições a agentes diferentes não se bloqueiam
+        with self._key_lock(("agent",) + key):
+            fp = file_version(*AGENT_FILES[name])
+            cached = self._agents.get(key)
+            if cached is None or cached[0] != fp:
+                metrics.inc("cache_misses_total", cache="daemon_agent", agent=name)
+                with metrics.span(f"daemon.load.{name}"):
+                    cached = self._agents[key] = (fp, _build_agent(name, chunksize))
+            else:
+                metrics.inc("cache_hits_total", cache="daemon_agent", agent=name)
+            return cached[1]
+
+    def _cached(self, name, chunksize, compute):
+        """Resultado das consultas sem parâmetro (varreduras completas), recalculado só se os dados mudarem."""
+        key = (name, chunksize)
+        with self._key_lock(("result",) + key):
+            fp = file_version(*AGENT_FILES[name])
+            cached = self._results.get(key)
+            if cached is None or cached[0] != fp:
+                metrics.inc("cache_misses_total", cache="daemon_result", agent=name)
+                agent = self.agent(name, chunksize)
+                with metrics.span(f"daemon.{name}"):
+                    cached = self._results[key] = (fp, compute(agent))
+            else:
+                metrics.inc("cache_hits_total", cache="daemon_result", agent=name)
+            return cached[1]
+
+    def rag(self, question):
+        agent = self.agent("rag")
+        with metrics.span("daemon.rag"):
+            return {"answer": agent.answer(question), "hits": agent.retrieve(question)}
+
+    def emails(self):
+        return self._cached("emails", None, lambda a: a.detect_conspiracy())
+
+    def transactions(self, chunksize=None):
+        return self._cached("transactions", chunksize, lambda a: a.run_rules())
+
+    def correlate(self, chunksize=None):
+        return self._cached("correlate", chunksize, lambda a: a.correlate_all())
+
+    def stream(self, name, chunksize=None):
+        """
+        Registros de `name` ("transactions" ou "correlate") um a um: do resultado em cache, se estiver em dia,
+        senão direto do gerador do agente (uma varredura por vez por agente; fechar o gerador a interrompe).
+        """
+        key = (name, chunksize)
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == file_version(*AGENT_FILES[name]):
+            metrics.inc("cache_hits_total", cache="daemon_result", agent=name)
+            yield from cached[1]
+            return
+        with self._key_lock(("stream",) + key):
+            agent = self.agent(name, chunksize)
+            with metrics.span(f"daemon.{name}.stream"):
+                yield from (agent.iter_violations() if name == "transactions" else agent.iter_correlations())
+
+    def warm(self, names=("rag", "emails", "transactions", "correlate")):
+        """Carrega os agentes de antemão; retorna {nome: erro} dos que não puderam ser carregados."""
+        errors = {}
+        for name in names:
+            try:
+                self.agent(name)
+            except Exception as e:
+                errors[name] = str(e)
+        return errors
+
+    def loaded(self):
+        return sorted({name for name, _ in self._agents})
+
+def _chunksize(query):
+    values = query.get("chunksize")
+    return int(values[0]) if values and values[0] else None
+
+class AuditHandler(BaseHTTPRequestHandler):
+    server_version = "DunderAuditor/1.0"
+
+    def _send(self, status, payload, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        else:
+            body = payload.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, records):
+        """Resposta NDJSON escrita registro a registro (sem Content-Length: termina ao fechar a conexão)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+        try:
+            for r in records:
+                self.wfile.write(json.dumps(r, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # o cliente parou de ler (ex.: --limit): o gerador é fechado e a varredura para
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                self.wfile.write(json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8") + b"\n")
+            except OSError:
+                pass
+        finally:
+            records.close()
+        self.close_connection = True
+
+    def _dispatch(self, handler):
+        try:
+            self._send(200, handler())
+        except Exception as e:
+            # o traceback fica no log do daemon, não na resposta
+            traceback.print_exc()
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _authorized(self):
+        sent = self.headers.get("Authorization", "")
+        token = sent[len("Bearer "):] if sent.startswith("Bearer ") else ""
+        return hmac.compare_digest(token.encode(), self.server.token.encode())
+
+    def _allowed(self, path, post=False):
+        """Recusa (e responde) Origin de outro site, POST sem JSON e requisições sem o token."""
+        origin = self.headers.get("Origin")
+        host, port = self.server.server_address[:2]
+        if origin is not None and origin not in (f"http://{h}:{port}" for h in (host, "localhost", "127.0.0.1")):
+            self._send(403, {"error": f"origem não permitida: {origin}"})
+            return False
+        if post and self.headers.get("Content-Type", "").split(";")[0].strip().lower() != "application/json":
+            self._send(415, {"error": "o corpo deve ser application/json"})
+            return False
+        if path != "/health" and not self._authorized():
+            self._send(401, {"error": f"token ausente ou inválido (veja {token_path(port)})"})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        service = self.server.service
+        if not self._allowed(url.path):
+            return
+        routes = {
+            "/health": lambda: {"status": "ok", "pid": os.getpid(), "loaded": service.loaded(),
+                                "authorized": self._authorized()},
+            "/emails": service.emails,
+            "/transactions": lambda: service.transactions(_chunksize(query)),
+            "/correlate": lambda: service.correlate(_chunksize(query)),
+        }
+        if url.path in ("/transactions/stream", "/correlate/stream"):
+            self._stream(service.stream(url.path.split("/")[1], _chunksize(query)))
+            return
+        if url.path == "/metrics":
+            if query.get("format", [""])[0] == "json":
+                self._send(200, metrics.METRICS.snapshot())
+            else:
+                self._send(200, metrics.METRICS.to_prometheus(), content_type="text/plain; version=0.0.4")
+            return
+        if url.path not in routes:
+            self._send(404, {"error": f"rota desconhecida: {url.path}"})
+            return
+        self._dispatch(routes[url.path])
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if not self._allowed(url.path, post=True):
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "corpo JSON inválido"})
+            return
+        if not isinstance(payload, dict):
+            self._send(400, {"error": "o corpo deve ser um objeto JSON"})
+            return
+        if url.path == "/rag":
+            question = payload.get("question")
+            if not isinstance(question, str) or not question.strip():
+                self._send(400, {"error": "campo obrigatório ausente ou vazio: question (texto)"})
+                return
+            self._dispatch(lambda: self.server.service.rag(question))
+        elif url.path == "/shutdown":
+            self._send(200, {"status": "stopping"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._send(404, {"error": f"rota desconhecida: {url.path}"})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, service=None, verbose=False, token=None):
+    server = ThreadingHTTPServer((host, port), AuditHandler)
+    server.daemon_threads = True
+    server.token = token or secrets.token_urlsafe(32)
+    server.service = service or AuditService()
+    server.verbose = verbose
+    return server
+
+class DaemonClient:
+    def __init__(self, url=DAEMON_URL, timeout=None, token=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.token = token or read_token(urlparse(self.url).port or 80)
+
+    def _request(self, path, payload=None, timeout=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        req = urlrequest.Request(self.url + path, data=data, headers=headers)
+        try:
+            with urlrequest.urlopen(req, timeout=timeout or self.timeout) as resp:
+                return json.loads(resp.read())
+        except urlerror.HTTPError as e:
+            body = json.loads(e.read() or b"{}")
+            raise RuntimeError(f"daemon: {body.get('error', e.reason)}") from None
+
+    def _stream(self, path):
+        """Registros de uma rota NDJSON, um a um; fechar o gerador fecha a conexão (o daemon para a varredura)."""
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        try:
+            resp = urlrequest.urlopen(urlrequest.Request(self.url + path, headers=headers), timeout=self.timeout)
+        except urlerror.HTTPError as e:
+            body = json.loads(e.read() or b"{}")
+            raise RuntimeError(f"daemon: {body.get('error', e.reason)}") from None
+        with resp:
+            for line in resp:
+                record = json.loads(line)
+                if set(record) == {"error"}:
+                    raise RuntimeError(f"daemon: {record['error']}")
+                yield record
+
+    def health(self, timeout=0.5):
+        return self._request("/health", timeout=timeout)
+
+    def rag(self, question):
+        return self._request("/rag", {"question": question})
+
+    def emails(self):
+        return self._request("/emails")
+
+    def transactions(self, chunksize=None):
+        return self._request("/transactions" + (f"?{urlencode({'chunksize': chunksize})}" if chunksize else ""))
+
+    def correlate(self, chunksize=None):
+        return self._request("/correlate" + (f"?{urlencode({'chunksize': chunksize})}" if chunksize else ""))
+
+    def iter_violations(self, chunksize=None):
+        return self._stream("/transactions/stream" + (f"?{urlencode({'chunksize': chunksize})}" if chunksize else ""))
+
+    def iter_correlations(self, chunksize=None):
+        return self._stream("/correlate/stream" + (f"?{urlencode({'chunksize': chunksize})}" if chunksize else ""))
+
+    def metrics(self):
+        return self._request("/metrics?format=json")
+
+    def shutdown(self):
+        return self._request("/shutdown", {})
+
+def connect(url=DAEMON_URL):
+    """
+    DaemonClient se houver um daemon respondendo em `url` que aceite o token gravado por ele,
+    senão None (AUDITOR_DAEMON=0 desliga).
+    """
+    if os.getenv("AUDITOR_DAEMON", "1") == "0":
+        return None
+    client = DaemonClient(url)
+    try:
+        health = client.health()
+    except (OSError, ValueError, RuntimeError):
+        return None
+    return client if health.get("authorized") else None
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, warm=True, verbose=False):
+    # os agentes usam caminhos relativos (data/, vectorstore/)
+    os.chdir(workspace_root)
+    server = make_server(host, port, verbose=verbose)
+    # gravado depois do bind: um segundo `serve` na mesma porta falha sem trocar o token do primeiro
+    write_token(port, server.token)
+    if warm:
+        for name, err in server.service.warm().items():
+            print(f"aviso: agente '{name}' não carregado: {err}", file=sys.stderr)
+    print(f"Daemon de auditoria em http://{host}:{port} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        remove_token(port, server.token)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Daemon de auditoria (HTTP em localhost)")
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--no-warm", action="store_true", help="carrega os agentes só na primeira requisição")
+    ap.add_argument("--verbose", action="store_true", help="registra cada requisição")
+    args = ap.parse_args()
+    serve(args.host, args.port, warm=not args.no_warm, verbose=args.verbose)
@@ -16,68 +16,178 @@ from rich.table import Table
 from rich.markdown import Markdown
 from rich.syntax import Syntax
 from rich import box
-import subprocess
 import json
+import time
+from contextlib import ExitStack
+from enum import Enum
+from pathlib import Path
+from typing import Annotated, List, Optional
 
-from agents.rag_policy_agent import RAGPolicyAgent
-from agents.email_agent import EmailAgent
-from agents.transaction_agent import TransactionAgent
-from agents.correlation_agent import CorrelationAgent
+# os agentes são importados dentro de cada comando: `--help` e `transactions` não carregam
+# faiss nem o SDK do Gemini (ver scripts/bench_startup.py)
 
 app = typer.Typer(help="🔍 Dunder Auditor - Sistema de Compliance")
 console = Console()
+# mensagens de status no modo de exportação (stdout fica só com os registros)
+err_console = Console(stderr=True)
+
+class ExportFormat(str, Enum):
+    jsonl = "jsonl"
+    csv = "csv"
+    parquet = "parquet"
+
+ChunkSize = Annotated[Optional[int], typer.Option("--chunksize", help="Processa o ledger em pedaços de N linhas (memória limitada)")]
+Format = Annotated[Optional[ExportFormat], typer.Option("--format", help="Exporta os registros à medida que são produzidos, sem tabelas/painéis")]
+Out = Annotated[Optional[Path], typer.Option("--out", help="Arquivo de saída da exportação (padrão: stdout; parquet exige arquivo)")]
+Limit = Annotated[Optional[int], typer.Option("--limit", help="Exporta no máximo N registros (o processamento para ao atingir o limite)")]
+MinScore = Annotated[Optional[float], typer.Option("--min-score", help="Exporta só correlações com score ≥ X")]
+
+def _daemon(quiet=False):
+    """Cliente do daemon de auditoria (`serve`) se ele estiver rodando; senão os agentes rodam aqui mesmo."""
+    from cli.daemon import connect
+    client = connect()
+    if client is not None:
+        (err_console if quiet else console).print(f"[dim]⚡ Usando o daemon de auditoria em {client.url}[/dim]")
+    return client
+
+def _export(records, fmt, out, limit, columns):
+    """Grava os registros em streaming (core/export.py) e resume no stderr."""
+    from core.export import export_records
+    t0 = time.perf_counter()
+    try:
+        n = export_records(records, fmt.value, out=out, columns=columns, limit=limit)
+    except (ValueError, RuntimeError) as e:
+        err_console.print(f"❌ {e}", style="red")
+        raise typer.Exit(1)
+    err_console.print(f"[dim]{n} registros exportados ({fmt.value}) em {time.perf_counter() - t0:.2f}s"
+                      f"{f' para {out}' if out else ''}[/dim]")
+
+def _policy_sections_text(sections):
+    """Bloco "Política relacionada" do card de correlação (vazio sem o mapa e-mail -> política)."""
+    if not sections:
+        return ""
+    lines = "\n".join(f"  • {s['section']} (chunk {s['chunk_id']}, similaridade {s['score']:.2f})" for s in sections)
+    return f"\n[bold]Política relacionada:[/bold]\n{lines}\n"
+
+def _print_profile(snap):
+    """Resumo de core/metrics.py no stderr: spans (tempo total e próprio), chamadas remotas e contadores."""
+    from core.metrics import histogram_quantile
+    wall = snap["elapsed_seconds"] or 1e-9
+    spans = {s["path"]: s for s in snap["spans"]}
+    table = Table(title=f"⏱️  Perfil ({wall:.2f}s)", box=box.ROUNDED, show_header=True, header_style="bold cyan")
+    table.add_column("Span", style="yellow")
+    table.add_column("#", justify="right")
+    table.add_column("Total (s)", justify="right")
+    table.add_column("Próprio (s)", justify="right")
+    table.add_column("% do total", justify="right")
+    table.add_column("Média (ms)", justify="right")
+    for path, s in spans.items():
+        # tempo próprio: fora dos spans filhos (no span do comando, inclui renderização/exportação)
+        children = sum(c["seconds"] for p, c in spans.items()
+                       if p.startswith(path + "/") and "/" not in p[len(path) + 1:])
+        depth = path.count("/")
+        table.add_row("  " * depth + path.rsplit("/", 1)[-1], str(s["count"]), f"{s['seconds']:.3f}",
+                      f"{max(s['seconds'] - children, 0):.3f}", f"{100 * s['seconds'] / wall:.1f}%",
+                      f"{1000 * s['seconds'] / s['count']:.2f}")
+    err_console.print(table)
+
+    if snap["histograms"]:
+        lat = Table(title="📡 Latência", box=box.ROUNDED, show_header=True, header_style="bold cyan")
+        for col in ("Métrica", "Labels", "#", "Total (s)", "p50 ≤ (ms)", "p99 ≤ (ms)", "Máx (ms)"):
+            lat.add_column(col, justify="left" if col in ("Métrica", "Labels") else "right")
+        for h in snap["histograms"]:
+            p50, p99 = histogram_quantile(h, 0.5), histogram_quantile(h, 0.99)
+            lat.add_row(h["name"], ",".join(f"{k}={v}" for k, v in sorted(h["labels"].items())), str(h["count"]),
+                        f"{h['sum']:.3f}", f"{1000 * p50:.1f}", f"{1000 * p99:.1f}", f"{1000 * h['max']:.1f}")
+        err_console.print(lat)
+
+    if snap["counters"]:
+        counters = Table(title="🔢 Contadores", box=box.ROUNDED, show_header=True, header_style="bold cyan")
+        counters.add_column("Métrica", style="yellow")
+        counters.add_column("Labels")
+        counters.add_column("Valor", justify="right")
+        for c in snap["counters"]:
+            counters.add_row(c["name"], ",".join(f"{k}={v}" for k, v in sorted(c["labels"].items())), f"{c['value']:,}")
+        err_console.print(counters)
 
 @app.callback(invoke_without_command=True)
-def main(ctx: typer.Context):
+def main(
+    ctx: typer.Context,
+    profile: Annotated[bool, typer.Option("--profile", help="Ao final, imprime no stderr onde o tempo foi gasto (spans, chamadas remotas, contadores)")] = False,
+    metrics_out: Annotated[Optional[Path], typer.Option("--metrics-out", help="Grava as métricas ao final: .json em JSON, outra extensão em texto Prometheus")] = None,
+):
     """Menu interativo do Dunder Auditor"""
+    if profile or metrics_out:
+        from core import metrics
+        metrics.METRICS.reset()
+        stack = ExitStack()
+        # o span do comando fica aberto até o Typer fechar o contexto (inclusive em typer.Exit)
+        stack.enter_context(metrics.span(f"cli.{ctx.invoked_subcommand or 'menu'}"))
+
+        def report():
+            stack.close()
+            if profile:
+                _print_profile(metrics.METRICS.snapshot())
+            if metrics_out:
+                metrics.METRICS.write(metrics_out)
+                err_console.print(f"[dim]Métricas gravadas em {metrics_out}[/dim]")
+
+        ctx.call_on_close(report)
     if ctx.invoked_subcommand is None:
         show_menu()
 
 @app.command()
-def ingest():
-    """Ingestar todos os dados (Policy, Emails, Transactions)"""
-    python_path = os.path.join(workspace_root, ".venv", "bin", "python")
-    if not os.path.exists(python_path):
-        python_path = "python3"
-    
-    scripts = [
-        ("Policy", "scripts/ingest_policy.py"),
-        ("Emails", "scripts/ingest_emails.py"),
-        ("Transactions", "scripts/ingest_transactions.py")
-    ]
-    
+def ingest(
+    chunksize: ChunkSize = None,
+    incremental: Annotated[bool, typer.Option("--incremental", help="E-mails: embeda só chunks novos/alterados e atualiza o índice existente")] = False,
+):
+    """Ingestar todos os dados (Policy, Emails, Transactions, mapa e-mail -> política e grafo de comunicação)"""
+    from scripts.ingest_all import ingest_all
+    # roda a partir da raiz do workspace: os scripts usam caminhos relativos (data/, vectorstore/)
+    os.chdir(workspace_root)
+
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         console=console,
     ) as progress:
-        for name, script in scripts:
-            task = progress.add_task(f"Processando {name}...", total=None)
-            result = subprocess.run(
-                [python_path, script], 
-                cwd=workspace_root,
-                capture_output=True
-            )
-            progress.remove_task(task)
-            
-            if result.returncode == 0:
-                console.print(f"✅ {name} concluído", style="green")
+        tasks = {}
+
+        def on_start(stage):
+            tasks[stage["name"]] = progress.add_task(f"Processando {stage['name']}...", total=None)
+
+        def on_finish(res):
+            if res["name"] in tasks:
+                progress.remove_task(tasks.pop(res["name"]))
+            if res["ok"]:
+                console.print(f"✅ {res['name']} concluído ({res['seconds']:.2f}s)", style="green")
             else:
-                console.print(f"❌ {name} falhou", style="red")
-                console.print(result.stderr.decode(), style="red dim")
-    
-    console.print("\n✨ Ingestão completa!", style="bold green")
+                console.print(f"❌ {res['name']} falhou ({res['seconds']:.2f}s)", style="red")
+                console.print(res["error"], style="red dim")
+
+        t0 = time.perf_counter()
+        ingest_all(chunksize=chunksize, incremental=incremental, on_start=on_start, on_finish=on_finish)
+
+    console.print(f"\n✨ Ingestão completa em {time.perf_counter() - t0:.2f}s!", style="bold green")
 
 @app.command()
 def rag():
     """Responder pergunta usando RAG sobre a política de compliance"""
-    console.print("\n[bold yellow]🤔 Carregando agente RAG...[/bold yellow]")
-    agent = RAGPolicyAgent()
+    daemon = _daemon()
+    if daemon is None:
+        console.print("\n[bold yellow]🤔 Carregando agente RAG...[/bold yellow]")
+        from agents.rag_policy_agent import RAGPolicyAgent
+        agent = RAGPolicyAgent()
     console.print("\n[bold cyan]❓ Pergunta sobre a política:[/bold cyan]")
     q = input("➤ ")
     
     with console.status("[bold green]Processando pergunta...", spinner="dots"):
-        out = agent.answer(q)
+        if daemon is not None:
+            res = daemon.rag(q)
+            out, hits = res["answer"], res["hits"]
+        else:
+            out = agent.answer(q)
+            hits = agent.retrieve(q)
     
     # Parse the response to format it better
     try:
@@ -110,7 +220,6 @@ def rag():
         
         # Get the chunks used for this answer
         console.print("\n[bold cyan]📚 Chunks Utilizados:[/bold cyan]\n")
-        hits = agent.retrieve(q)
         
         # Create table for chunks
         table = Table(title="� Evidências da Base de Conhecimento", box=box.ROUNDED, show_header=True, header_style="bold yellow")
@@ -157,13 +266,26 @@ def rag():
         console.print(f"\n[dim red]Debug: {str(e)}[/dim red]")
 
 @app.command()
-def emails():
+def emails(fmt: Format = None, out: Out = None, limit: Limit = None):
     """Scan de e-mails para detectar conspirações"""
-    console.print("\n[bold yellow]📧 Carregando agente de e-mails...[/bold yellow]")
-    agent = EmailAgent()
+    if fmt is not None:
+        from agents.email_agent import EVIDENCE_COLUMNS
+        daemon = _daemon(quiet=True)
+        if daemon is not None:
+            records = daemon.emails()["evidence"]
+        else:
+            from agents.email_agent import EmailAgent
+            records = EmailAgent().iter_evidence()
+        _export(records, fmt, out, limit, EVIDENCE_COLUMNS)
+        return
+    daemon = _daemon()
+    if daemon is None:
+        console.print("\n[bold yellow]📧 Carregando agente de e-mails...[/bold yellow]")
+        from agents.email_agent import EmailAgent
+        agent = EmailAgent()
     
     with console.status("[bold green]🔍 Analisando e-mails...", spinner="dots"):
-        out = agent.detect_conspiracy()
+        out = daemon.emails() if daemon is not None else agent.detect_conspiracy()
     
     console.print("\n")
     
@@ -218,6 +340,15 @@ def emails():
                         str(email.get('subject', 'N/A'))[:30],
                         chunk_text + "..."
                     )
+                elif ev_type == "graph":
+                    table.add_row(
+                        str(i),
+                        "🕸️ Grafo",
+                        str(email.get('from', 'N/A'))[:20],
+                        str(email.get('to', 'N/A'))[:20],
+                        str(email.get('subject', 'N/A'))[:30],
+                        "Grupo: " + ", ".join(ev.get('group', []))
+                    )
             
             console.print(table)
             
@@ -248,13 +379,26 @@ def emails():
         console.print(Panel(pprint.pformat(out), title="📄 Resultado", border_style="cyan", box=box.ROUNDED))
 
 @app.command()
-def transactions():
+def transactions(chunksize: ChunkSize = None, fmt: Format = None, out: Out = None, limit: Limit = None):
     """Scan de transações bancárias (regras diretas)"""
-    console.print("\n[bold yellow]💳 Carregando agente de transações...[/bold yellow]")
-    agent = TransactionAgent()
+    if fmt is not None:
+        from agents.transaction_agent import VIOLATION_COLUMNS
+        daemon = _daemon(quiet=True)
+        if daemon is not None:
+            records = daemon.iter_violations(chunksize)
+        else:
+            from agents.transaction_agent import TransactionAgent
+            records = TransactionAgent(chunksize=chunksize).iter_violations()
+        _export(records, fmt, out, limit, VIOLATION_COLUMNS)
+        return
+    daemon = _daemon()
+    if daemon is None:
+        console.print("\n[bold yellow]💳 Carregando agente de transações...[/bold yellow]")
+        from agents.transaction_agent import TransactionAgent
+        agent = TransactionAgent(chunksize=chunksize)
     
     with console.status("[bold green]🔍 Analisando transações...", spinner="dots"):
-        out = agent.run_rules()
+        out = daemon.transactions(chunksize) if daemon is not None else agent.run_rules()
     
     console.print("\n")
     
@@ -273,7 +417,7 @@ def transactions():
                 str(violation.get('date', 'N/A'))[:10],
                 str(violation.get('description', 'N/A'))[:40],
                 f"${violation.get('amount', 0):,.2f}",
-                str(violation.get('rule_violated', 'N/A'))[:50]
+                f"{violation.get('rule_id', 'N/A')} - {violation.get('explain', '')}"[:50]
             )
         
         console.print(table)
@@ -290,13 +434,28 @@ def transactions():
         console.print(Panel(pprint.pformat(out), title="📄 Resultado", border_style="cyan", box=box.ROUNDED))
 
 @app.command()
-def correlate():
+def correlate(chunksize: ChunkSize = None, fmt: Format = None, out: Out = None, limit: Limit = None, min_score: MinScore = None):
     """Correlacionar transações com e-mails e política"""
-    console.print("\n[bold yellow]🔗 Carregando agente de correlação...[/bold yellow]")
-    agent = CorrelationAgent()
+    if fmt is not None:
+        from agents.correlation_agent import CORRELATION_COLUMNS
+        daemon = _daemon(quiet=True)
+        if daemon is not None:
+            records = daemon.iter_correlations(chunksize)
+        else:
+            from agents.correlation_agent import CorrelationAgent
+            records = CorrelationAgent(chunksize=chunksize).iter_correlations()
+        if min_score is not None:
+            records = (c for c in records if c["best_match"]["score"] >= min_score)
+        _export(records, fmt, out, limit, CORRELATION_COLUMNS)
+        return
+    daemon = _daemon()
+    if daemon is None:
+        console.print("\n[bold yellow]🔗 Carregando agente de correlação...[/bold yellow]")
+        from agents.correlation_agent import CorrelationAgent
+        agent = CorrelationAgent(chunksize=chunksize)
     
     with console.status("[bold green]🔍 Correlacionando dados...", spinner="dots"):
-        out = agent.correlate_all()
+        out = daemon.correlate(chunksize) if daemon is not None else agent.correlate_all()
     
     console.print("\n")
     
@@ -360,7 +519,8 @@ def correlate():
   • 👤 Importância Remetente: {breakdown.get('sender', 0):.0f} pts
   • 🎯 Match Beneficiário: {breakdown.get('beneficiary', 0):.0f} pts
   • 📧 Relevância Assunto: {breakdown.get('subject', 0):.0f} pts
-
+  • 🧠 Similaridade Semântica: {f"{breakdown['semantic']:.0f} pts" if breakdown.get('semantic') is not None else 'indisponível'}
+{_policy_sections_text(corr.get('policy_sections'))}
 [bold]Corpo do E-mail:[/bold]
 {(email.get('body', '') or 'Sem conteúdo')[:250]}..."""
             
@@ -458,6 +618,338 @@ def correlate():
         import pprint
         console.print(Panel(pprint.pformat(out), title="📄 Resultado", border_style="cyan", box=box.ROUNDED))
 
+@app.command()
+def audit(
+    chunksize: ChunkSize = None,
+    question: Annotated[Optional[List[str]], typer.Option("--question", "-q", help="Pergunta à política (repita para várias; padrão: perguntas de rotina)")] = None,
+    no_rag: Annotated[bool, typer.Option("--no-rag", help="Não faz perguntas à política")] = False,
+    threads: Annotated[bool, typer.Option("--threads", help="Etapas de CPU em threads em vez de processos")] = False,
+    out: Annotated[Optional[Path], typer.Option("--out", help="Grava o relatório consolidado em JSON")] = None,
+    show: Annotated[int, typer.Option("--show", help="Achados exibidos na tabela")] = 10,
+):
+    """Auditoria completa: e-mails, regras, correlação e política ao mesmo tempo, num relatório único"""
+    from agents.audit_agent import AuditAgent
+    os.chdir(workspace_root)
+    questions = [] if no_rag else question
+
+    with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), console=console) as progress:
+        task = progress.add_task("Auditando (e-mails, regras, correlação, política)...", total=None)
+
+        def on_finish(res):
+            icon = "✅" if res["ok"] else "❌"
+            console.print(f"{icon} {res['name']} ({res['seconds']:.2f}s)", style="green" if res["ok"] else "red")
+            if not res["ok"]:
+                err_console.print(res["error"], style="dim")
+
+        report = AuditAgent(chunksize=chunksize, questions=questions, processes=False if threads else None,
+                            on_finish=on_finish).run()
+        progress.remove_task(task)
+
+    summary = report["summary"]
+    verdict = summary["conspiracy"] or "Indisponível"
+    summary_text = f"""[bold cyan]Conspiração:[/bold cyan] {verdict} ({summary['evidence']} evidências: {", ".join(f"{k} {v}" for k, v in summary['evidence_by_type'].items()) or "nenhuma"})
+[bold cyan]Violações:[/bold cyan] {summary['violations']} ({", ".join(f"{k} {v}" for k, v in summary['violations_by_rule'].items()) or "nenhuma"})
+[bold cyan]Correlações:[/bold cyan] {summary['correlations']} ([red]{summary['high_risk']} alto risco[/red], [yellow]{summary['medium_risk']} médio[/yellow])
+[bold cyan]Achados:[/bold cyan] {summary['findings']} transações ({summary['findings_with_both']} com violação e e-mail correlacionado)
+[bold cyan]Tempo:[/bold cyan] {report['seconds']:.2f}s (soma das etapas: {report['stages_seconds_sum']:.2f}s)"""
+    console.print(Panel(summary_text, title="🧾 Auditoria Consolidada", border_style="cyan", box=box.DOUBLE))
+
+    if report["findings"]:
+        table = Table(title=f"🚩 Principais Achados (top {min(show, len(report['findings']))})", box=box.ROUNDED,
+                      show_header=True, header_style="bold red")
+        for col in ("Tx", "Data", "Valor", "Beneficiário", "Regras", "Score", "E-mail"):
+            table.add_column(col, justify="right" if col in ("Tx", "Valor", "Score") else "left",
+                             no_wrap=col != "E-mail", overflow="ellipsis")
+        for f in report["findings"][:show]:
+            corr = f["correlation"] or {}
+            table.add_row(str(f["tx_index"]), str(f["date"] or "")[:10], f"${float(f['amount'] or 0):,.2f}",
+                          str(f["beneficiary"] or "")[:20], ", ".join(f["rules"]) or "-",
+                          f"{corr['score']:.1f}" if corr else "-", str(corr.get("subject") or "-"))
+        console.print(table)
+
+    for qa in report["policy"]:
+        console.print(Panel(qa["answer"] or f"[red]{qa['error']}[/red]", title=f"📜 {qa['question']}",
+                            border_style="blue", box=box.ROUNDED))
+
+    if out:
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        console.print(f"[dim]Relatório gravado em {out}[/dim]")
+    if not all(s["ok"] for s in report["stages"]):
+        raise typer.Exit(1)
+
+@app.command()
+def watch(
+    drop_dir: Annotated[Optional[Path], typer.Option("--drop-dir", help="Pasta de entrada de arquivos novos (.txt de e-mails, .csv de transações)")] = None,
+    out: Annotated[Path, typer.Option("--out", help="Arquivo JSONL de alertas")] = Path("data/alerts.jsonl"),
+    interval: Annotated[float, typer.Option("--interval", help="Segundos entre rodadas")] = 1.0,
+    min_score: Annotated[Optional[float], typer.Option("--min-score", help="Score mínimo das correlações alertadas (padrão: 45, risco médio)")] = None,
+    once: Annotated[bool, typer.Option("--once", help="Processa o que estiver pendente e sai")] = False,
+):
+    """Auditoria contínua: processa só e-mails e transações acrescentados e emite alertas em JSONL"""
+    from scripts.watch import Watcher
+    from core import metrics
+    from core.metrics import histogram_quantile
+    # caminhos relativos ao diretório atual, antes de ir para a raiz do projeto
+    out = out.resolve()
+    drop_dir = drop_dir.resolve() if drop_dir else None
+    os.chdir(workspace_root)
+    colors = {"critical": "bold red", "high": "red", "medium": "yellow", "low": "dim"}
+
+    def on_alert(a):
+        if a["alert"] == "rule":
+            what = f"{a['rule_id']} tx {a['row_index']} ${float(a['amount'] or 0):,.2f} {a.get('description') or ''}"
+        elif a["alert"] == "keyword":
+            what = f"{a['email']['subject']} ({a['email']['from']}): {', '.join(dict.fromkeys(a['hits']))}"
+        elif a["source"] == "emails":
+            what = f"{a['email']['subject']} → {len(a['transactions'])} transações (melhor score {a['score']:.1f})"
+        else:
+            what = f"tx {a['tx_index']} → {a['email']['subject']} (score {a['score']:.1f})"
+        latency = f" [dim]({a['latency_ms']:.0f} ms)[/dim]" if a["latency_ms"] is not None else ""
+        console.print(f"[{colors.get(a['severity'], 'white')}]🚨 {a['alert']:<11}[/] {what}{latency}", highlight=False)
+
+    with console.status("[bold green]Carregando índice, e-mails e ledger...", spinner="dots"):
+        watcher = Watcher(out=out, drop_dir=drop_dir, min_score=min_score, on_alert=on_alert)
+    sources = "data/emails.txt, data/transacoes_bancarias.csv" + (f", {drop_dir}" if drop_dir else "")
+    console.print(f"👀 Acompanhando {sources} (alertas em {out}; Ctrl+C para sair)")
+    n = watcher.run(interval, once=once)
+    latencies = [h for h in metrics.METRICS.snapshot()["histograms"] if h["name"] == "watch_alert_latency_seconds"]
+    summary = f"{n} alertas"
+    if latencies:
+        merged = {"count": sum(h["count"] for h in latencies), "max": max(h["max"] for h in latencies),
+                  "counts": [sum(c) for c in zip(*(h["counts"] for h in latencies))], "buckets": latencies[0]["buckets"]}
+        summary += (f"; latência escrita → alerta p50 ≤ {histogram_quantile(merged, 0.5) * 1000:.0f} ms, "
+                    f"p95 ≤ {histogram_quantile(merged, 0.95) * 1000:.0f} ms")
+    console.print(f"[dim]{summary}[/dim]")
+
+@app.command()
+def graph(
+    person: Annotated[Optional[str], typer.Argument(help="Pessoa (endereço ou parte do nome, ex.: toby)")] = None,
+    start: Annotated[Optional[str], typer.Option("--start", help="Início da janela (data, inclusiva)")] = None,
+    end: Annotated[Optional[str], typer.Option("--end", help="Fim da janela (data, inclusiva)")] = None,
+    excluded: Annotated[bool, typer.Option("--excluded", help="Grupos que conversaram na janela sem a pessoa")] = False,
+):
+    """Grafo de comunicação: contatos de uma pessoa, grupos que a excluíram ou grupos conectados"""
+    from core.comm_graph import load_or_build
+    os.chdir(workspace_root)
+    g = load_or_build()
+    import scipy.sparse.csgraph  # noqa: F401 - import fora da medição da consulta
+    window = f"{start or 'início'} → {end or 'fim'}"
+    t0 = time.perf_counter()
+    try:
+        if person is None:
+            groups = [{"members": m} for m in g.components(start, end)]
+            title = f"🕸️ Grupos conectados ({window})"
+        elif excluded:
+            groups = g.excluded_groups(person, start, end)
+            title = f"🚫 Grupos sem {person} ({window})"
+        else:
+            rows = g.contacts(person, start, end)
+            title = f"📇 Contatos de {person} ({window})"
+    except KeyError as e:
+        console.print(f"❌ {e.args[0]}", style="red")
+        raise typer.Exit(1)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    if person is not None and not excluded:
+        table = Table(title=title, box=box.ROUNDED, show_header=True, header_style="bold cyan")
+        for col in ("Nome", "Endereço", "Enviou", "Recebeu"):
+            table.add_column(col, justify="right" if col in ("Enviou", "Recebeu") else "left")
+        for c in rows:
+            table.add_row(c["name"], c["person"], str(c["sent"]), str(c["received"]))
+    else:
+        table = Table(title=title, box=box.ROUNDED, show_header=True, header_style="bold cyan")
+        table.add_column("#", style="cyan", width=4)
+        table.add_column("Membros")
+        if excluded:
+            table.add_column("E-mails", justify="right")
+            table.add_column("Falam com a pessoa em outros momentos")
+        for i, grp in enumerate(groups, 1):
+            cells = [str(i), ", ".join(m["name"] for m in grp["members"])]
+            if excluded:
+                cells += [str(grp["messages"]), ", ".join(grp["knows_person"])]
+            table.add_row(*cells)
+    console.print(table)
+    console.print(f"[dim]Consulta em {elapsed:.1f} ms[/dim]")
+
+@app.command("search-emails")
+def search_emails(
+    query: Annotated[str, typer.Argument(help="Texto da busca semântica")],
+    partition: Annotated[Optional[List[str]], typer.Option("--partition", "-p", help="Partição (ex.: 2008-04, 2008-Q2, 2008); repetível")] = None,
+    k: Annotated[int, typer.Option("--k", help="Chunks retornados")] = 6,
+):
+    """Busca semântica nos e-mails, restrita aos shards das partições escolhidas"""
+    from email.utils import parseaddr
+    from agents.email_agent import EmailAgent
+    os.chdir(workspace_root)
+    agent = EmailAgent(k=k)
+    shards = agent.shards
+    if partition and shards is None:
+        console.print("[yellow]⚠️ Shards ausentes ou desatualizados (scripts/ingest_email_shards.py): "
+                      "busca no índice único filtrando a partição[/yellow]")
+    t0 = time.perf_counter()
+    results = agent.semantic_search(query, top_k=k, partitions=partition)
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    scope = ", ".join(partition) if partition else "todas as partições"
+    table = Table(title=f"🔎 {query} ({scope})", box=box.ROUNDED, show_header=True, header_style="bold cyan")
+    table.add_column("Dist.", justify="right", min_width=5, no_wrap=True)
+    table.add_column("Data", min_width=10, no_wrap=True)
+    table.add_column("De", style="green", max_width=16, overflow="ellipsis", no_wrap=True)
+    table.add_column("Assunto", max_width=16, overflow="ellipsis", no_wrap=True)
+    table.add_column("Trecho", style="dim", min_width=18)
+    for r in results:
+        email = r["email"] or r["chunks"][0]
+        snippet = " ".join((r["chunks"][0].get("text") or "").replace("Mensagem:", "").split())[:120]
+        sender = parseaddr(email.get("from") or "")
+        table.add_row(f"{r['avg_score']:.3f}", str(email.get("date") or "")[:10], sender[0] or sender[1],
+                      str(email.get("subject") or ""), snippet)
+    console.print(table)
+    searched = f"{len(shards.select(partition))}/{len(shards.keys())} shards por {shards.by}" if partition and shards is not None else "índice único"
+    console.print(f"[dim]Busca em {elapsed:.1f} ms ({searched}, inclui o embedding da consulta)[/dim]")
+
+@app.command("search-tx")
+def search_tx(
+    terms: Annotated[Optional[List[str]], typer.Argument(help="Textos procurados na descrição/beneficiário (qualquer um)")] = None,
+    match_all: Annotated[bool, typer.Option("--all", help="Exige todos os textos, não qualquer um")] = False,
+    start: Annotated[Optional[str], typer.Option("--start", help="Data inicial (YYYY-MM-DD ou YYYY-MM)")] = None,
+    end: Annotated[Optional[str], typer.Option("--end", help="Data final, inclusiva (YYYY-MM-DD ou YYYY-MM = mês inteiro)")] = None,
+    min_amount: Annotated[Optional[float], typer.Option("--min", help="Valor mínimo")] = None,
+    max_amount: Annotated[Optional[float], typer.Option("--max", help="Valor máximo")] = None,
+    employee: Annotated[Optional[List[str]], typer.Option("--funcionario", "-f", help="Funcionário (nome ou início do nome); repetível")] = None,
+    fmt: Format = None, out: Out = None, limit: Limit = None,
+):
+    """Busca no ledger por texto, data, valor e funcionário, pelo índice montado na ingestão"""
+    from core.tx_index import TxIndex, RECORD_COLUMNS
+    os.chdir(workspace_root)
+    idx = TxIndex.load()
+    if idx is None:
+        err_console.print("[yellow]⚠️ Índice de transações ausente ou desatualizado (scripts/ingest_tx_index.py): "
+                          "montando em memória[/yellow]")
+        idx = TxIndex.build()
+    t0 = time.perf_counter()
+    try:
+        rows = idx.search(terms or (), match_all=match_all, start=start, end=end, min_amount=min_amount,
+                          max_amount=max_amount, employees=employee or ())
+    except (ValueError, OverflowError) as e:
+        err_console.print(f"❌ Filtro inválido: {e}", style="red")
+        raise typer.Exit(1)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if fmt is not None:
+        _export((idx.record(i) for i in rows), fmt, out, limit, RECORD_COLUMNS)
+        return
+
+    shown = rows[:limit or 50]
+    table = Table(title=f"🔎 {' | '.join(terms) if terms else 'Transações'}", box=box.ROUNDED, show_header=True,
+                  header_style="bold cyan")
+    table.add_column("ID", max_width=10, no_wrap=True)
+    table.add_column("Data", min_width=10, no_wrap=True)
+    table.add_column("Funcionário", style="green", max_width=16, overflow="ellipsis", no_wrap=True)
+    table.add_column("Valor", justify="right", no_wrap=True)
+    table.add_column("Beneficiário", max_width=20, overflow="ellipsis", no_wrap=True)
+    table.add_column("Descrição", style="dim", min_width=18)
+    for i in shown:
+        r = idx.record(i)
+        table.add_row(r["id_transacao"] or str(r["row_index"]), r["date"] or "", r["funcionario"] or "",
+                      f"${r['amount']:,.2f}", r["beneficiary"], r["description"])
+    console.print(table)
+    more = f", exibindo {len(shown)} (--limit)" if len(shown) < len(rows) else ""
+    console.print(f"[dim]{len(rows)} transações em {elapsed:.1f} ms{more} (índice de {idx.n} linhas)[/dim]")
+
+@app.command()
+def serve(
+    port: Annotated[Optional[int], typer.Option("--port", help="Porta HTTP em localhost (padrão: AUDITOR_PORT ou 8765)")] = None,
+    warm: Annotated[bool, typer.Option("--warm/--no-warm", help="Carrega todos os agentes antes de aceitar requisições")] = True,
+    stop: Annotated[bool, typer.Option("--stop", help="Encerra o daemon em execução")] = False,
+):
+    """Daemon de auditoria: mantém os agentes carregados; os outros comandos viram clientes dele"""
+    from cli.daemon import serve as run_daemon, connect, DEFAULT_HOST, DEFAULT_PORT
+    url = f"http://{DEFAULT_HOST}:{port or DEFAULT_PORT}"
+    running = connect(url)
+    if stop:
+        if running is None:
+            console.print("Nenhum daemon em execução.", style="yellow")
+        else:
+            running.shutdown()
+            console.print("🛑 Daemon encerrado.", style="green")
+        return
+    if running is not None:
+        console.print(f"Daemon já em execução em {url}.", style="yellow")
+        return
+    console.print("[bold yellow]Carregando agentes...[/bold yellow]" if warm else "")
+    # bloqueia até Ctrl+C ou `serve --stop`
+    run_daemon(DEFAULT_HOST, port or DEFAULT_PORT, warm=warm)
+
+@app.command()
+def bench(
+    scale: Annotated[float, typer.Option("--scale", help="Fator de escala dos dados sintéticos (1 a 1000)")] = 1,
+    seed: Annotated[int, typer.Option("--seed", help="Semente do gerador")] = 0,
+    stages: Annotated[Optional[str], typer.Option("--stages", help="Etapas separadas por vírgula (dependências incluídas)")] = None,
+    queries: Annotated[int, typer.Option("--queries", help="Consultas nas etapas de busca/RAG")] = 50,
+    out: Annotated[Optional[Path], typer.Option("--out", help="Grava o relatório JSON neste arquivo")] = None,
+    compare_to: Annotated[Optional[Path], typer.Option("--compare", help="Relatório JSON anterior para comparação")] = None,
+    keep: Annotated[bool, typer.Option("--keep", help="Mantém o diretório temporário com os dados gerados")] = False,
+):
+    """Benchmark com dados sintéticos e modelos locais (sem chamadas à API)"""
+    from scripts.bench import run_bench, compare, STAGES
+    selected = [s.strip() for s in stages.split(",") if s.strip()] if stages else None
+    unknown = [s for s in selected or () if s not in STAGES]
+    if unknown:
+        console.print(f"❌ Etapas desconhecidas: {', '.join(unknown)} (use {', '.join(STAGES)})", style="red")
+        raise typer.Exit(1)
+
+    def on_finish(res):
+        if res["ok"]:
+            console.print(f"✅ {res['name']} ({res['seconds']:.2f}s)", style="green")
+        else:
+            console.print(f"❌ {res['name']} falhou ({res['seconds']:.2f}s)", style="red")
+            console.print(res["error"], style="red dim")
+
+    console.print(f"\n[bold yellow]⏱️  Benchmark em escala {scale:g}x (modelos locais)...[/bold yellow]\n")
+    report = run_bench(scale, seed, selected, queries, keep, on_finish=on_finish)
+    if compare_to is not None:
+        report["compare"] = {"baseline": str(compare_to),
+                             "stages": compare(report, json.loads(compare_to.read_text(encoding="utf-8")))}
+
+    def fmt(value, spec=".2f"):
+        return "-" if value is None else format(value, spec)
+
+    table = Table(title="📊 Resultado por Etapa", box=box.ROUNDED, show_header=True, header_style="bold cyan")
+    table.add_column("Etapa", style="yellow")
+    table.add_column("Tempo (s)", justify="right")
+    table.add_column("Registros", justify="right")
+    table.add_column("Vazão (/s)", justify="right")
+    table.add_column("p50 (ms)", justify="right")
+    table.add_column("p99 (ms)", justify="right")
+    table.add_column("Δ RSS (MB)", justify="right")
+    for s in report["stages"]:
+        if not s["ok"]:
+            table.add_row(s["stage"], fmt(s["seconds"]), "[red]falhou[/red]", "-", "-", "-", "-")
+            continue
+        table.add_row(s["stage"], fmt(s["seconds"]), f"{s['records']:,}", fmt(s["throughput_per_s"], ",.1f"),
+                      fmt(s["p50_ms"], ".3f"), fmt(s["p99_ms"], ".3f"), fmt(s["rss_growth_mb"], "+.1f"))
+    console.print()
+    console.print(table)
+    console.print(f"[dim]Δ RSS: pico durante a etapa menos o RSS no início dela; pico do processo: {report['peak_rss_mb']:.1f} MB[/dim]")
+
+    if "compare" in report:
+        delta = Table(title=f"🔁 Variação vs {compare_to}", box=box.ROUNDED, show_header=True, header_style="bold cyan")
+        delta.add_column("Etapa", style="yellow")
+        delta.add_column("Tempo", justify="right")
+        delta.add_column("Vazão", justify="right")
+        delta.add_column("p99", justify="right")
+        for row in report["compare"]["stages"]:
+            delta.add_row(row["stage"], *(fmt(row[k], "+.1f") + ("%" if row[k] is not None else "")
+                                          for k in ("seconds_pct", "throughput_pct", "p99_pct")))
+        console.print(delta)
+
+    if out is not None:
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        console.print(f"\n💾 Relatório gravado em {out}", style="green")
+    if report.get("workdir"):
+        console.print(f"[dim]Dados gerados mantidos em {report['workdir']}[/dim]")
+    if not all(s["ok"] for s in report["stages"]):
+        raise typer.Exit(1)
+
 def show_menu():
     """Display interactive menu and handle user choices"""
     while True:
@@ -471,10 +963,11 @@ def show_menu():
         console.print("  [bold green]3.[/bold green] Scan e-mails (conspiração)")
         console.print("  [bold green]4.[/bold green] Scan transações (regras diretas)")
         console.print("  [bold green]5.[/bold green] Correlacionar transações")
+        console.print("  [bold green]6.[/bold green] Auditoria completa (tudo ao mesmo tempo)")
         console.print("  [bold red]0.[/bold red] Sair\n")
         console.print("="*60, style="bold blue")
         
-        choice = typer.prompt("\nEscolha uma opção [0-5]")
+        choice = typer.prompt("\nEscolha uma opção [0-6]")
         
         try:
             if choice == "0":
@@ -490,6 +983,8 @@ def show_menu():
                 transactions()
             elif choice == "5":
                 correlate()
+            elif choice == "6":
+                audit(question=None, no_rag=False, threads=False, out=None, show=10)
             else:
                 console.print("\n❌ [bold red]Opção inválida![/bold red] Tente novamente.")
                 continue
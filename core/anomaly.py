@@ -0,0 +1,173 @@
+# core/anomaly.py
+"""
+Estatísticas online para detecção de anomalias em uma única passada:
+- RunningStats: média/variância de Welford
+- P2Quantile: quantil aproximado pelo algoritmo P² (Jain & Chlamtac), 5 marcadores
+- AnomalyScorer: estatísticas por chave hierárquica, com persistência em pickle
+Memória por chave é O(1), independente do número de transações vistas.
+"""
+import math
+import pickle
+from pathlib import Path
+
+class RunningStats:
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def zscore(self, x):
+        std = self.std
+        if std == 0.0:
+            return 0.0
+        return (x - self.mean) / std
+
+    def __getstate__(self):
+        return (self.n, self.mean, self.m2)
+
+    def __setstate__(self, state):
+        self.n, self.mean, self.m2 = state
+
+class P2Quantile:
+    """Estimador P² de um quantil p sem guardar as amostras."""
+    __slots__ = ("p", "q", "pos", "desired", "incr")
+
+    def __init__(self, p):
+        self.p = p
+        self.q = []  # alturas dos marcadores (as 5 primeiras amostras até inicializar)
+        self.pos = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.incr = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, x):
+        q = self.q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            self.pos[i] += 1
+        for i in range(5):
+            self.desired[i] += self.incr[i]
+        for i in (1, 2, 3):
+            d = self.desired[i] - self.pos[i]
+            if (d >= 1 and self.pos[i + 1] - self.pos[i] > 1) or (d <= -1 and self.pos[i - 1] - self.pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (self.pos[i + d] - self.pos[i])
+                q[i] = qp
+                self.pos[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.q, self.pos
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if not self.q:
+            return None
+        if len(self.q) < 5:
+            # poucas amostras: quantil exato por posição
+            return self.q[min(len(self.q) - 1, int(round(self.p * (len(self.q) - 1))))]
+        return self.q[2]
+
+    def __getstate__(self):
+        return (self.p, self.q, self.pos, self.desired, self.incr)
+
+    def __setstate__(self, state):
+        self.p, self.q, self.pos, self.desired, self.incr = state
+
+class AnomalyScorer:
+    """
+    Mantém RunningStats (sobre log1p do valor) + P2Quantile por chave.
+    Cada observação é pontuada contra a chave mais específica com histórico suficiente
+    (ex.: (funcionario, categoria, departamento) -> (categoria,) -> global) e só depois
+    incorporada às estatísticas (avaliação prequencial: nada "vê o futuro").
+    """
+    def __init__(self, levels, quantile=0.95, min_history=10, z_threshold=3.0):
+        self.levels = [tuple(l) for l in levels]
+        self.quantile = quantile
+        self.min_history = min_history
+        self.z_threshold = z_threshold
+        self.groups = {}  # (level, key) -> (RunningStats, P2Quantile)
+        self.offset = 0   # quantas linhas do ledger já foram consumidas
+        self.fingerprint = None
+        self.flags = []
+
+    def _group(self, level, key):
+        g = self.groups.get((level, key))
+        if g is None:
+            g = self.groups[(level, key)] = (RunningStats(), P2Quantile(self.quantile))
+        return g
+
+    def score(self, record, amount):
+        """Pontua sem atualizar. Retorna dict com zscore/quantil/nível ou None sem histórico."""
+        x = math.log1p(max(amount, 0.0))
+        for level in self.levels:
+            key = tuple(record.get(c) for c in level)
+            g = self.groups.get((level, key))
+            if g is None or g[0].n < self.min_history:
+                continue
+            stats, sketch = g
+            return {
+                "level": list(level),
+                "key": list(key),
+                "n": stats.n,
+                "zscore": round(stats.zscore(x), 3),
+                "mean": round(math.expm1(stats.mean), 2),
+                "quantile": round(math.expm1(sketch.value()), 2),
+            }
+        return None
+
+    def observe(self, record, amount):
+        """Pontua e depois atualiza. Retorna o score se a observação for anômala, senão None."""
+        s = self.score(record, amount)
+        x = math.log1p(max(amount, 0.0))
+        for level in self.levels:
+            stats, sketch = self._group(level, tuple(record.get(c) for c in level))
+            stats.update(x)
+            sketch.update(x)
+        if s and s["zscore"] >= self.z_threshold and amount > s["quantile"]:
+            return s
+        return None
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f)
+        tmp.replace(path)
+
+    @staticmethod
+    def load(path, **kwargs):
+        path = Path(path)
+        if path.exists():
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        return AnomalyScorer(**kwargs)
@@ -0,0 +1,97 @@
+# core/chunking.py
+"""
+Chunker de texto por caracteres, com a mesma semântica do RecursiveCharacterTextSplitter
+(chunk_size/chunk_overlap, prioridade de separadores ["\n\n", "\n", " ", ""], separador mantido
+no início do pedaço seguinte e chunks sem espaços nas pontas).
+Trabalha só com offsets (início, fim) sobre o texto original: como o separador fica no pedaço,
+pedaços consecutivos são contíguos e um chunk é um único fatiamento do texto, feito no final.
+"""
+from collections import deque
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+
+class TextChunker:
+    def __init__(self, chunk_size, chunk_overlap, separators=DEFAULT_SEPARATORS):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size deve ser > 0, recebido {chunk_size}")
+        if chunk_overlap < 0 or chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) deve estar entre 0 e chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+
+    def split_text(self, text):
+        return [text[a:b] for a, b in self.spans(text)]
+
+    def spans(self, text):
+        """Offsets (início, fim) de cada chunk em `text`."""
+        out = []
+        self._split(text, 0, len(text), self.separators, out)
+        return out
+
+    def _split(self, text, start, end, separators, out):
+        # primeiro separador presente no trecho; "" divide em caracteres
+        sep, rest = separators[-1], ()
+        for i, s in enumerate(separators):
+            if not s:
+                sep = s
+                break
+            if text.find(s, start, end) != -1:
+                sep, rest = s, separators[i + 1:]
+                break
+
+        good = []
+        for a, b in self._pieces(text, start, end, sep):
+            if b - a < self.chunk_size:
+                good.append((a, b))
+                continue
+            if good:
+                self._merge(text, good, out)
+                good = []
+            if rest:
+                self._split(text, a, b, rest, out)
+            else:
+                out.append((a, b))
+        if good:
+            self._merge(text, good, out)
+
+    @staticmethod
+    def _pieces(text, start, end, sep):
+        """Pedaços não vazios do trecho, cada um começando pelo separador que o precede."""
+        if not sep:
+            return [(i, i + 1) for i in range(start, end)]
+        pieces, prev = [], start
+        pos = text.find(sep, start, end)
+        while pos != -1:
+            if pos > prev:
+                pieces.append((prev, pos))
+            prev = pos
+            pos = text.find(sep, pos + len(sep), end)
+        if end > prev:
+            pieces.append((prev, end))
+        return pieces
+
+    def _merge(self, text, pieces, out):
+        """Junta pedaços contíguos em chunks de até chunk_size, repetindo até chunk_overlap do anterior."""
+        current, total = deque(), 0
+        for a, b in pieces:
+            n = b - a
+            if current and total + n > self.chunk_size:
+                self._emit(text, current[0][0], current[-1][1], out)
+                while total > self.chunk_overlap or (total + n > self.chunk_size and total > 0):
+                    ca, cb = current.popleft()
+                    total -= cb - ca
+            current.append((a, b))
+            total += n
+        if current:
+            self._emit(text, current[0][0], current[-1][1], out)
+
+    @staticmethod
+    def _emit(text, a, b, out):
+        # strip() sobre offsets: nenhuma substring intermediária é criada
+        while a < b and text[a].isspace():
+            a += 1
+        while b > a and text[b - 1].isspace():
+            b -= 1
+        if b > a:
+            out.append((a, b))
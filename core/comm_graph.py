@@ -0,0 +1,221 @@
+# core/comm_graph.py
+"""
+Grafo de comunicação (quem escreveu para quem, e quando) a partir dos e-mails parseados.
+As arestas remetente -> destinatário ficam ordenadas por dia, com um ponteiro por dia
+(`day_ptr`, como o indptr de uma matriz CSR): a matriz de adjacência de uma janela de datas é
+montada só com as arestas daqueles dias (scipy.sparse), e as consultas são operações esparsas:
+- contacts(pessoa, início, fim): quem trocou e-mails com a pessoa na janela
+- components(início, fim): grupos conectados na janela (scipy.sparse.csgraph)
+- excluded_groups(pessoa, início, fim): grupos que conversaram entre si na janela sem a pessoa,
+  embora algum membro fale com ela em outros momentos
+Listas de distribuição ("All Staff", "Grupo de Vendas", ...) são nós do grafo, mas não conectam
+grupos (todo mundo está nelas).
+Gravado em vectorstore/emails/graph.npz com a versão (mtime/tamanho) do JSONL de origem.
+"""
+import bisect
+import json
+import re
+from email.utils import getaddresses
+from pathlib import Path
+import numpy as np
+from core.dates import day_ordinal
+from core.versions import file_version
+
+PARSED_JSONL = Path("data/emails_parsed.jsonl")
+GRAPH_PATH = Path("vectorstore/emails/graph.npz")
+
+_LIST_NAME = re.compile(r"^(all|grupo|comit[eê]|todos|equipe)\b", re.I)
+_LIST_ADDRESS = re.compile(r"^(all|todos|everyone)([.@]|$)|^(managers|ppc|vendas)$", re.I)
+
+def is_list_address(name, address):
+    """Lista de distribuição (pelo nome exibido ou pelo endereço) de um domínio interno."""
+    local = address.split("@")[0]
+    return bool(_LIST_NAME.match(name or "")) or bool(_LIST_ADDRESS.match(local) and address.endswith("@dundermifflin.com"))
+
+def parse_addresses(field):
+    """[(nome, endereço em minúsculas)] de um campo From/To (destinatários separados por ',' ou ';')."""
+    if not field:
+        return []
+    return [(name.strip().strip('"'), addr.strip().lower())
+            for name, addr in getaddresses([field.replace(";", ",")]) if "@" in addr]
+
+def source_version(path=PARSED_JSONL):
+    return file_version(path)
+
+class CommGraph:
+    def __init__(self, people, names, is_list, days, day_ptr, src, dst, count, version=None):
+        self.people = list(people)          # endereço de cada nó
+        self.names = list(names)            # primeiro nome exibido visto
+        self.is_list = np.asarray(is_list, dtype=bool)
+        self.days = np.asarray(days, dtype=np.int64)        # ordinais dos dias com e-mail, crescentes
+        self.day_ptr = np.asarray(day_ptr, dtype=np.int64)  # arestas do dia i: [day_ptr[i], day_ptr[i+1])
+        self.src = np.asarray(src, dtype=np.int32)
+        self.dst = np.asarray(dst, dtype=np.int32)
+        self.count = np.asarray(count, dtype=np.int32)
+        self.version = version
+        self.node = {p: i for i, p in enumerate(self.people)}
+        self._full = None
+
+    # --- construção / persistência ---
+
+    @classmethod
+    def from_emails(cls, emails, version=None):
+        """Grafo dos e-mails parseados (dicts com "from", "to", "date"); e-mails sem data ou remetente são ignorados."""
+        node, names, is_list, edges = {}, [], [], {}
+
+        def add(name, addr):
+            if addr not in node:
+                node[addr] = len(names)
+                names.append(name or addr)
+                is_list.append(is_list_address(name, addr))
+            elif name and names[node[addr]] == addr:
+                names[node[addr]] = name
+            return node[addr]
+
+        for e in emails:
+            senders = parse_addresses(e.get("from"))
+            if not senders or not e.get("date"):
+                continue
+            try:
+                day = day_ordinal(e["date"])
+            except (ValueError, OverflowError):
+                continue
+            s = add(*senders[0])
+            for name, addr in parse_addresses(e.get("to")):
+                key = (day, s, add(name, addr))
+                edges[key] = edges.get(key, 0) + 1
+        keys = sorted(edges)
+        day_col = np.asarray([k[0] for k in keys], dtype=np.int64)
+        days = np.unique(day_col)
+        day_ptr = np.append(np.searchsorted(day_col, days), len(keys))
+        return cls(list(node), names, is_list, days, day_ptr,
+                   [k[1] for k in keys], [k[2] for k in keys], [edges[k] for k in keys], version)
+
+    @classmethod
+    def build(cls, parsed=PARSED_JSONL):
+        with open(parsed, "r", encoding="utf-8") as fo:
+            return cls.from_emails((json.loads(l) for l in fo), version=source_version(parsed))
+
+    def save(self, path=GRAPH_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, people=np.asarray(self.people), names=np.asarray(self.names),
+                            is_list=self.is_list, days=self.days, day_ptr=self.day_ptr,
+                            src=self.src, dst=self.dst, count=self.count,
+                            version=np.asarray(self.version or ""))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path=GRAPH_PATH, parsed=PARSED_JSONL):
+        """Grafo gravado, ou None se não existe ou foi construído de outra versão do JSONL."""
+        if not Path(path).exists():
+            return None
+        d = np.load(path, allow_pickle=False)
+        if str(d["version"]) != source_version(parsed):
+            return None
+        return cls(d["people"].tolist(), d["names"].tolist(), d["is_list"], d["days"], d["day_ptr"],
+                   d["src"], d["dst"], d["count"], str(d["version"]))
+
+    # --- matrizes ---
+
+    def _edge_range(self, start=None, end=None):
+        lo = 0 if start is None else bisect.bisect_left(self.days, day_ordinal(start))
+        hi = len(self.days) if end is None else bisect.bisect_right(self.days, day_ordinal(end))
+        return int(self.day_ptr[lo]), int(self.day_ptr[max(hi, lo)])
+
+    def matrix(self, start=None, end=None):
+        """Adjacência esparsa (CSR, n x n) remetente -> destinatário com o número de e-mails na janela (inclusiva)."""
+        from scipy import sparse
+        n = len(self.people)
+        if start is None and end is None and self._full is not None:
+            return self._full
+        a, b = self._edge_range(start, end)
+        m = sparse.csr_matrix((self.count[a:b], (self.src[a:b], self.dst[a:b])), shape=(n, n))
+        if start is None and end is None:
+            self._full = m
+        return m
+
+    def _undirected(self, m):
+        """Simétrica, sem as listas de distribuição (que ligariam todo mundo)."""
+        from scipy import sparse
+        keep = sparse.diags((~self.is_list).astype(np.int32), dtype=np.int32)
+        s = m + m.T
+        return keep @ s @ keep
+
+    def _id(self, person):
+        """Nó de uma pessoa pelo endereço ou por parte do nome/endereço (ex.: "toby")."""
+        key = person.strip().lower()
+        if key in self.node:
+            return self.node[key]
+        matches = [i for i, (p, n) in enumerate(zip(self.people, self.names)) if key in p or key in n.lower()]
+        if not matches:
+            raise KeyError(f"Pessoa não encontrada no grafo: {person}")
+        return matches[0]
+
+    def _label(self, i):
+        return {"person": self.people[i], "name": self.names[i]}
+
+    # --- consultas ---
+
+    def contacts(self, person, start=None, end=None):
+        """Quem trocou e-mails com `person` na janela: [{"person", "name", "sent", "received"}], mais ativos primeiro."""
+        i = self._id(person)
+        m = self.matrix(start, end)
+        # "sent"/"received" do ponto de vista do contato
+        sent = m.getcol(i).toarray().ravel()      # contato -> pessoa
+        received = m.getrow(i).toarray().ravel()  # pessoa -> contato
+        out = [dict(self._label(j), sent=int(sent[j]), received=int(received[j]))
+               for j in np.flatnonzero(sent + received) if j != i]
+        out.sort(key=lambda c: -(c["sent"] + c["received"]))
+        return out
+
+    def components(self, start=None, end=None, min_size=2):
+        """Grupos conectados (e-mails em qualquer direção) na janela, maiores primeiro."""
+        from scipy.sparse.csgraph import connected_components
+        s = self._undirected(self.matrix(start, end))
+        _, labels = connected_components(s, directed=False)
+        active = np.flatnonzero(np.asarray(s.sum(axis=1)).ravel())
+        groups = {}
+        for j in active:
+            groups.setdefault(labels[j], []).append(j)
+        out = [[self._label(j) for j in g] for g in groups.values() if len(g) >= min_size]
+        out.sort(key=len, reverse=True)
+        return out
+
+    def excluded_groups(self, person, start=None, end=None, min_size=2):
+        """
+        Grupos que trocaram e-mails entre si na janela sem `person` (nenhum membro falou com ela na janela),
+        embora algum membro fale com ela em outro momento. Cada grupo: {"members", "messages", "knows_person"}.
+        """
+        from scipy.sparse.csgraph import connected_components
+        i = self._id(person)
+        window = self.matrix(start, end)
+        s = self._undirected(window)
+        _, labels = connected_components(s, directed=False)
+        full = self._undirected(self.matrix())
+        knows = set(full.getrow(i).indices.tolist())
+        talked = set(s.getrow(i).indices.tolist())
+        active = np.flatnonzero(np.asarray(s.sum(axis=1)).ravel())
+        groups = {}
+        for j in active:
+            if j != i:
+                groups.setdefault(labels[j], []).append(j)
+        out = []
+        for members in groups.values():
+            if len(members) < min_size or talked.intersection(members) or not knows.intersection(members):
+                continue
+            sub = window[members][:, members]
+            out.append({"members": [self._label(j) for j in members], "messages": int(sub.sum()),
+                        "knows_person": [self.people[j] for j in members if j in knows]})
+        out.sort(key=lambda g: -g["messages"])
+        return out
+
+def load_or_build(path=GRAPH_PATH, parsed=PARSED_JSONL, emails=None):
+    """Grafo gravado na ingestão; se faltar ou estiver desatualizado, monta em memória (dos `emails` ou do JSONL)."""
+    g = CommGraph.load(path, parsed)
+    if g is not None:
+        return g
+    if emails is not None:
+        return CommGraph.from_emails(emails, version=source_version(parsed))
+    return CommGraph.build(parsed) if Path(parsed).exists() else CommGraph.from_emails([])
@@ -0,0 +1,102 @@
+# core/context.py
+"""
+Empacotamento do contexto do RAG: os chunks recuperados se sobrepõem (overlap do chunker) e,
+colados um a um, repetem texto no prompt. pack_context:
+- junta chunks do mesmo documento que se sobrepõem ou são vizinhos numa única passagem contígua
+  (pelos offsets "start"/"end" gravados na ingestão; sem eles, pelos chunk_ids consecutivos e pela
+  sobreposição textual entre o fim de um e o início do outro)
+- descarta passagens repetidas ou contidas em outra, passando os chunk_ids delas para a que as contém
+- inclui os chunks em ordem de prioridade (ranking da busca) enquanto couberem em `budget_tokens`
+Cada passagem mantém os chunk_ids de origem, para que as citações continuem as mesmas.
+"""
+from core.gemini import estimate_tokens
+
+def _overlap(a, b, max_overlap):
+    """Tamanho do maior sufixo de `a` que é prefixo de `b` (até `max_overlap` caracteres)."""
+    for n in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+def _stitch(chunks, max_overlap):
+    """Agrupa chunks (metas ordenados por posição) em passagens contíguas; retorna (grupos, textos)."""
+    groups, texts, ends = [], [], []
+    for m in chunks:
+        if groups:
+            prev = groups[-1][-1]
+            if "start" in m and "start" in prev:
+                # offsets: sobreposição, ou vizinhança separada só pelos espaços removidos das pontas
+                if m["start"] <= ends[-1]:
+                    groups[-1].append(m)
+                    if m["end"] > ends[-1]:
+                        texts[-1] += m["text"][ends[-1] - m["start"]:]
+                        ends[-1] = m["end"]
+                    continue
+                if m["chunk_id"] == prev["chunk_id"] + 1:
+                    groups[-1].append(m)
+                    texts[-1] += "\n" + m["text"]
+                    ends[-1] = m["end"]
+                    continue
+            elif m["chunk_id"] == prev["chunk_id"] + 1:
+                n = _overlap(texts[-1], m["text"], max_overlap)
+                groups[-1].append(m)
+                texts[-1] += m["text"][n:] if n else "\n" + m["text"]
+                continue
+        groups.append([m])
+        texts.append(m["text"])
+        ends.append(m.get("end"))
+    return groups, texts
+
+def _passages(selected, max_overlap):
+    """Passagens dos hits selecionados: [{"chunk_ids", "text", "rank", "score"}], pela melhor posição no ranking."""
+    by_source = {}
+    for rank, h in selected:
+        by_source.setdefault(h["meta"].get("source"), []).append((rank, h))
+    passages = []
+    for items in by_source.values():
+        items.sort(key=lambda it: (it[1]["meta"].get("start", 0), it[1]["meta"]["chunk_id"]))
+        rank_of = {id(h["meta"]): (rank, h["score"]) for rank, h in items}
+        groups, texts = _stitch([h["meta"] for _, h in items], max_overlap)
+        for group, text in zip(groups, texts):
+            ranks = [rank_of[id(m)] for m in group]
+            passages.append({"chunk_ids": [m["chunk_id"] for m in group], "text": text.strip(),
+                             "rank": min(r for r, _ in ranks), "score": min(s for _, s in ranks),
+                             "source": group[0].get("source")})
+    passages.sort(key=lambda p: p["rank"])
+    # trechos repetidos (ex.: mesmo texto em chunks diferentes) ou contidos numa passagem melhor:
+    # o texto sai, os chunk_ids passam para a passagem que o contém (as citações continuam válidas)
+    kept = []
+    for p in passages:
+        container = next((k for k in kept if p["text"] in k["text"]), None)
+        if container is None:
+            kept.append(p)
+            continue
+        container["chunk_ids"] += [c for c in p["chunk_ids"] if c not in container["chunk_ids"]]
+    return kept
+
+def pack_context(hits, budget_tokens=1000, max_overlap=200):
+    """
+    `hits` como retornados por FaissIndex.query (melhor primeiro). Retorna as passagens que cabem em
+    `budget_tokens`, em ordem de prioridade; o primeiro hit sempre entra (truncado se preciso).
+    """
+    selected, passages = [], []
+    for rank, h in enumerate(hits):
+        candidate = _passages(selected + [(rank, h)], max_overlap)
+        if selected and sum(estimate_tokens(p["text"]) for p in candidate) > budget_tokens:
+            # não cabe: um hit pior ainda pode caber se estender uma passagem já incluída
+            continue
+        selected.append((rank, h))
+        passages = candidate
+    if passages and estimate_tokens(passages[0]["text"]) > budget_tokens:
+        passages[0]["text"] = passages[0]["text"][:budget_tokens * 4]
+        passages[0]["truncated"] = True
+    return passages
+
+def format_passages(passages):
+    """Texto das evidências para o prompt, citando os chunk_ids de cada passagem."""
+    blocks = []
+    for i, p in enumerate(passages, 1):
+        ids = ", ".join(str(c) for c in p["chunk_ids"])
+        label = "Chunk" if len(p["chunk_ids"]) == 1 else "Chunks"
+        blocks.append(f"{label} {ids} (relevância #{i}):\n{p['text']}")
+    return "\n\n---\n".join(blocks)
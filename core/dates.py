@@ -0,0 +1,15 @@
+# core/dates.py
+"""Datas como ordinais de dia (date.toordinal), a unidade dos índices por data (grafo, índice do ledger)."""
+from datetime import date, datetime
+import numpy as np
+
+def day_ordinal(value):
+    """Ordinal do dia de uma data (str, date, datetime ou ordinal; None fica None)."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    from dateutil import parser as dtparser
+    return dtparser.parse(str(value), dayfirst=False).date().toordinal()
@@ -0,0 +1,115 @@
+# core/dedup.py
+"""
+Detecção de quase-duplicatas por MinHash + LSH.
+- MinHasher: assinatura MinHash de shingles de caracteres (vetorizada com numpy)
+- LSHIndex: buckets por banda da assinatura; candidatos são confirmados pela
+  similaridade de Jaccard estimada (fração de posições iguais nas assinaturas)
+Usado na ingestão de e-mails para não embedar de novo encaminhamentos, respostas com
+citação, assinaturas e textos padrão repetidos.
+"""
+import pickle
+import re
+from pathlib import Path
+import numpy as np
+
+_PRIME = (1 << 31) - 1
+_WS = re.compile(r"\s+")
+_QUOTE = re.compile(r"^\s*>+", re.M)
+
+def normalize_text(text):
+    # ignora diferenças que não mudam o conteúdo: caixa, espaços e marcadores de citação ("> ")
+    return _WS.sub(" ", _QUOTE.sub("", text or "")).strip().lower()
+
+class MinHasher:
+    def __init__(self, num_perm=128, shingle=5, seed=1):
+        self.num_perm = num_perm
+        self.shingle = shingle
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        """Hashes (uint32) dos shingles de `shingle` caracteres do texto normalizado."""
+        codes = np.frombuffer(normalize_text(text).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if len(codes) == 0:
+            return np.zeros(0, dtype=np.uint64)
+        k = min(self.shingle, len(codes))
+        n = len(codes) - k + 1
+        h = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            # hash polinomial das janelas de k caracteres, todas de uma vez
+            h = (h * np.uint64(1000003) + codes[j:j + n]) & np.uint64(0xFFFFFFFF)
+        return np.unique(h)
+
+    def signature(self, text):
+        sh = self.shingles(text)
+        if len(sh) == 0:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        return ((self.a[:, None] * sh[None, :] + self.b[:, None]) % np.uint64(_PRIME)).min(axis=1)
+
+def estimated_jaccard(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+class LSHIndex:
+    """
+    Índice LSH de assinaturas MinHash: bands × rows = num_perm.
+    Com 16 bandas de 8 linhas, pares com Jaccard ≳ 0.7 caem num mesmo bucket com alta probabilidade.
+    """
+    def __init__(self, hasher=None, bands=16, rows=8):
+        self.hasher = hasher or MinHasher(num_perm=bands * rows)
+        if self.hasher.num_perm != bands * rows:
+            raise ValueError("bands * rows deve ser igual a num_perm do MinHasher")
+        self.bands = bands
+        self.rows = rows
+        self.signatures = {}  # chave -> assinatura
+        self.buckets = {}     # (banda, hash da banda) -> set de chaves
+
+    def _band_keys(self, sig):
+        return [(b, sig[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+    def insert(self, key, sig):
+        self.signatures[key] = sig
+        for bk in self._band_keys(sig):
+            self.buckets.setdefault(bk, set()).add(key)
+
+    def remove(self, key):
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        for bk in self._band_keys(sig):
+            bucket = self.buckets.get(bk)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[bk]
+
+    def candidates(self, sig):
+        found = set()
+        for bk in self._band_keys(sig):
+            found |= self.buckets.get(bk, set())
+        return found
+
+    def best_match(self, sig, threshold):
+        """(chave, jaccard estimado) do candidato mais parecido acima de `threshold`, ou None."""
+        best = None
+        for key in self.candidates(sig):
+            j = estimated_jaccard(sig, self.signatures[key])
+            if j >= threshold and (best is None or j > best[1] or (j == best[1] and key < best[0])):
+                best = (key, j)
+        return best
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f)
+        tmp.replace(path)
+
+    @staticmethod
+    def load(path):
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
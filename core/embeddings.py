@@ -1,18 +1,83 @@
 # core/embeddings.py
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-load_dotenv()
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.gemini import client, backend, estimate_tokens
+from core import metrics
+from core.scheduler import get_scheduler, is_rate_limited
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 EMBED_MODEL = os.getenv("GEMINI_EMBED_MODEL","text-embedding-004")
+EMBED_BATCH = int(os.getenv("GEMINI_EMBED_BATCH","100"))     # textos por chamada
+EMBED_WORKERS = int(os.getenv("GEMINI_EMBED_WORKERS","4"))   # chamadas simultâneas
 
-def embed_text(text:str):
+_pool = None
+_pool_lock = threading.Lock()
+
+def embed_pool():
+    """Pool de threads único para chamadas de embedding, compartilhado por todas as etapas de ingestão."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+        return _pool
+
+def _record(texts, seconds, error=None):
+    """Métricas de uma chamada de embedding (core/metrics.py)."""
+    labels = {"kind": "embed", "backend": backend()}
+    status = "ok" if error is None else ("throttled" if is_rate_limited(error) else "error")
+    metrics.inc("remote_calls_total", status=status, **labels)
+    metrics.observe("remote_call_seconds", seconds, **labels)
+    if error is None:
+        metrics.inc("embedded_texts_total", len(texts), **labels)
+        metrics.inc("tokens_total", sum(estimate_tokens(t) for t in texts), direction="input", **labels)
+
+def _call_provider(texts):
+    """Uma chamada ao provedor (uma tentativa), sem agendamento."""
+    t0 = time.perf_counter()
+    try:
+        if backend() == "fake":
+            from core.fake_models import fake_embed
+            vecs = fake_embed(texts)
+        else:
+            resp = client().embed_content(
+                model=EMBED_MODEL,
+                content=texts
+            )
+            vecs = resp["embedding"]
+    except Exception as e:
+        _record(texts, time.perf_counter() - t0, error=e)
+        raise
+    _record(texts, time.perf_counter() - t0)
+    return vecs
+
+def _embed_batch(texts, priority="bulk"):
+    # toda chamada passa pelo agendador: cotas, concorrência adaptativa, backoff e prioridade
+    return get_scheduler("embed").call(lambda: _call_provider(texts),
+                                       tokens=sum(estimate_tokens(t) for t in texts), priority=priority)
+
+def embed_text(text:str, priority="interactive"):
     """
     Retorna embedding vetorial usando Gemini.
+    Consultas são interativas por padrão: passam à frente dos lotes de ingestão no agendador.
+    """
+    return _embed_batch([text], priority=priority)[0]
+
+def submit_embed(texts, priority="bulk"):
+    """Agenda um lote (até EMBED_BATCH textos) no embed_pool(); retorna um Future com os vetores."""
+    return embed_pool().submit(_embed_batch, list(texts), priority)
+
+def embed_texts(texts, batch_size=EMBED_BATCH, priority="bulk"):
+    """
+    Embeddings de vários textos: lotes de `batch_size` por chamada, lotes em paralelo no embed_pool().
+    Retorna os vetores na mesma ordem de `texts`.
     """
-    resp = genai.embed_content(
-        model=EMBED_MODEL,
-        content=text
-    )
-    return resp["embedding"]
+    texts = list(texts)
+    if not texts:
+        return []
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    futures = [embed_pool().submit(_embed_batch, b, priority) for b in batches]
+    vectors = []
+    for f in futures:
+        vectors.extend(f.result())
+    return vectors
@@ -0,0 +1,132 @@
+# core/export.py
+"""
+Exportação em streaming de registros (violações, evidências, correlações) para jsonl, csv ou parquet.
+Cada registro é gravado assim que é produzido; o parquet é escrito em row groups de `batch_size`.
+Colunas são dadas como [(caminho, tipo)], com caminho pontuado para campos aninhados
+("best_match.score") e tipo em int64/float64/string; dicts e listas viram JSON nas colunas string.
+O jsonl grava o registro completo.
+"""
+import csv
+import json
+import sys
+from pathlib import Path
+
+FORMATS = ("jsonl", "csv", "parquet")
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+def get_path(record, path):
+    value = record
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def _cell(value, kind):
+    if value is None:
+        return None
+    if kind == "int64":
+        return int(value)
+    if kind == "float64":
+        return float(value)
+    if isinstance(value, (dict, list, tuple)):
+        return _json(value)
+    return str(value)
+
+class RecordWriter:
+    def __init__(self, fmt, out=None, columns=None, batch_size=1000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato desconhecido: {fmt} (use {', '.join(FORMATS)})")
+        if fmt == "parquet" and out is None:
+            raise ValueError("--format parquet exige --out (saída binária)")
+        if fmt != "jsonl" and not columns:
+            raise ValueError(f"Formato {fmt} exige a lista de colunas")
+        self.fmt = fmt
+        self.columns = list(columns or ())
+        self.batch_size = batch_size
+        self.count = 0
+        self._batch = []
+        self._stdout = out is None or str(out) == "-"
+        self.path = None if self._stdout else Path(out)
+        self._tmp = None if self._stdout else self.path.with_name(self.path.name + ".tmp")
+        if fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("--format parquet requer pyarrow (pip install pyarrow)") from None
+            types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string()}
+            self._pa = pa
+            self._schema = pa.schema([(name, types[kind]) for name, kind in self.columns])
+            self._pq = pq.ParquetWriter(str(self._tmp), self._schema, compression="zstd")
+            self._fh = None
+        else:
+            self._fh = sys.stdout if self._stdout else open(self._tmp, "w", encoding="utf-8", newline="")
+            if fmt == "csv":
+                self._csv = csv.writer(self._fh)
+                self._csv.writerow([name for name, _ in self.columns])
+
+    def _row(self, record):
+        return [_cell(get_path(record, name), kind) for name, kind in self.columns]
+
+    def write(self, record):
+        if self.fmt == "jsonl":
+            self._fh.write(_json(record) + "\n")
+        elif self.fmt == "csv":
+            self._csv.writerow(self._row(record))
+        else:
+            self._batch.append(self._row(record))
+            if len(self._batch) >= self.batch_size:
+                self._flush_batch()
+        self.count += 1
+        if self._stdout:
+            # quem consome via pipe recebe cada registro assim que ele sai
+            self._fh.flush()
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        cols = list(zip(*self._batch))
+        arrays = [self._pa.array(list(c), type=f.type) for c, f in zip(cols, self._schema)]
+        self._pq.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._batch = []
+
+    def close(self):
+        if self.fmt == "parquet":
+            self._flush_batch()
+            self._pq.close()
+        elif not self._stdout:
+            self._fh.close()
+        if self._tmp is not None:
+            self._tmp.replace(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # saída incompleta não substitui um arquivo anterior
+        if self.fmt == "parquet":
+            self._pq.close()
+        elif not self._stdout:
+            self._fh.close()
+        if self._tmp is not None and self._tmp.exists():
+            self._tmp.unlink()
+
+def export_records(records, fmt, out=None, columns=None, limit=None):
+    """Grava `records` (iterável, consumido sob demanda) e retorna quantos foram gravados."""
+    with RecordWriter(fmt, out, columns) as writer:
+        if limit is None or limit > 0:
+            for record in records:
+                writer.write(record)
+                if limit is not None and writer.count >= limit:
+                    break
+    close = getattr(records, "close", None)
+    if close is not None:
+        # interrompe o gerador (e o trabalho restante) quando o --limit é atingido
+        close()
+    return writer.count
@@ -0,0 +1,88 @@
+# core/fake_models.py
+"""
+Substitutos locais e determinísticos do Gemini, ativados com AUDITOR_MODEL_BACKEND=fake
+(benchmarks, testes e desenvolvimento sem chave de API):
+- fake_embed: vetor "hashing trick" das palavras do texto (textos parecidos -> vetores próximos)
+- fake_chat: resposta no formato RESPOSTA/RAZÃO/EVIDÊNCIAS derivada do prompt
+AUDITOR_FAKE_LATENCY_MS simula a latência de rede de cada chamada. Para exercitar o agendador
+(core/scheduler.py), o fake também imita as cotas do provedor:
+- AUDITOR_FAKE_RPM / AUDITOR_FAKE_TPM: acima disso a chamada falha com RateLimitError (429);
+  a rajada tolerada é de AUDITOR_FAKE_BURST_S segundos de cota (padrão 1)
+- AUDITOR_FAKE_CONCURRENCY: acima de N chamadas simultâneas a latência cresce proporcionalmente
+"""
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+FAKE_DIM = int(os.getenv("AUDITOR_FAKE_DIM", "768"))
+_TOKEN = re.compile(r"\w+")
+
+_quota_lock = threading.Lock()
+_quota = {"key": None, "requests": None, "tokens": None, "in_flight": 0}
+
+def _env_float(name):
+    return float(os.getenv(name, "0") or 0)
+
+def _admit(tokens):
+    """Cotas do "servidor" fake: consome do balde ou levanta 429, sem esperar (como a API real)."""
+    from core.scheduler import TokenBucket, RateLimitError
+    rpm, tpm = _env_float("AUDITOR_FAKE_RPM"), _env_float("AUDITOR_FAKE_TPM")
+    if not rpm and not tpm:
+        return
+    burst = _env_float("AUDITOR_FAKE_BURST_S") or 1.0
+    with _quota_lock:
+        if _quota["key"] != (rpm, tpm, burst):
+            _quota.update(key=(rpm, tpm, burst),
+                          requests=TokenBucket(rpm, capacity=max(1.0, rpm / 60 * burst) if rpm else None),
+                          tokens=TokenBucket(tpm, capacity=max(1.0, tpm / 60 * burst) if tpm else None))
+        if _quota["requests"].wait_time(1) > 0 or _quota["tokens"].wait_time(tokens) > 0:
+            raise RateLimitError(f"429 (fake): cota excedida (rpm={rpm:g}, tpm={tpm:g})")
+        _quota["requests"].take(1)
+        _quota["tokens"].take(tokens)
+
+def _call(tokens):
+    """Aplica cota e latência simuladas de uma chamada."""
+    _admit(tokens)
+    ms = _env_float("AUDITOR_FAKE_LATENCY_MS")
+    if ms <= 0:
+        return
+    capacity = _env_float("AUDITOR_FAKE_CONCURRENCY")
+    with _quota_lock:
+        _quota["in_flight"] += 1
+        in_flight = _quota["in_flight"]
+    try:
+        # o provedor "enfileira": acima da capacidade, cada chamada demora proporcionalmente mais
+        time.sleep(ms / 1000 * (max(1.0, in_flight / capacity) if capacity > 0 else 1.0))
+    finally:
+        with _quota_lock:
+            _quota["in_flight"] -= 1
+
+def _vector(text, dim):
+    tokens = _TOKEN.findall((text or "").lower())
+    vec = np.zeros(dim, dtype=np.float32)
+    if tokens:
+        h = np.array([zlib.crc32(t.encode("utf-8")) for t in tokens], dtype=np.uint64)
+        sign = np.where(h & np.uint64(1 << 31), -1.0, 1.0).astype(np.float32)
+        np.add.at(vec, (h % np.uint64(dim)).astype(np.int64), sign)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+    return vec.tolist()
+
+def fake_embed(texts, dim=FAKE_DIM):
+    """Um vetor por texto (uma "chamada" por lote, como no embed_content)."""
+    from core.gemini import estimate_tokens
+    _call(sum(estimate_tokens(t) for t in texts))
+    return [_vector(t, dim) for t in texts]
+
+def fake_chat(prompt):
+    from core.gemini import estimate_tokens
+    _call(estimate_tokens(prompt))
+    question = next((l[len("Pergunta:"):].strip() for l in prompt.splitlines() if l.startswith("Pergunta:")), "")
+    chunks = [c for ids in re.findall(r"^Chunks? ([\d, ]+)", prompt, re.M) for c in ids.replace(",", " ").split()]
+    return (f"RESPOSTA: Resposta simulada para \"{question[:80]}\".\n"
+            f"RAZÃO: Gerada localmente (backend fake) a partir de {len(prompt)} caracteres de contexto.\n"
+            f"EVIDÊNCIAS:\n" + "\n".join(f"- chunk {c}" for c in chunks))
@@ -0,0 +1,31 @@
+# core/gemini.py
+"""
+Acesso preguiçoso ao SDK do Gemini: `google.generativeai` só é importado e configurado na
+primeira chamada de client(), para que comandos que não usam embeddings/LLM não paguem o import.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+_genai = None
+_lock = threading.Lock()
+
+def backend():
+    """"gemini" (padrão) ou "fake" (core/fake_models.py, sem rede), via AUDITOR_MODEL_BACKEND."""
+    return os.getenv("AUDITOR_MODEL_BACKEND", "gemini")
+
+def estimate_tokens(text):
+    """Estimativa de tokens (~4 caracteres por token) quando a API não informa a contagem."""
+    return max(1, (len(text or "") + 3) // 4)
+
+def client():
+    """Módulo google.generativeai já configurado com GOOGLE_API_KEY."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _genai = genai
+    return _genai
@@ -1,27 +1,49 @@
 # core/llm.py
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-load_dotenv()
+import time
+from core.gemini import client, backend, estimate_tokens
+from core import metrics
+from core.scheduler import get_scheduler, is_rate_limited
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 MODEL_NAME = os.getenv("GEMINI_CHAT_MODEL","gemini-1.5-flash")
 
-def chat_completion(messages, temperature=0.0, max_tokens=800):
+def _call_provider(prompt, temperature, max_tokens):
+    """Uma chamada ao provedor (uma tentativa), com métricas e sem agendamento."""
+    labels = {"kind": "chat", "backend": backend()}
+    t0 = time.perf_counter()
+    try:
+        if backend() == "fake":
+            from core.fake_models import fake_chat
+            text, usage = fake_chat(prompt), None
+        else:
+            model = client().GenerativeModel(MODEL_NAME)
+            resp = model.generate_content(
+                prompt,
+                generation_config={
+                    "temperature": temperature,
+                    "max_output_tokens": max_tokens
+                }
+            )
+            text, usage = resp.text, getattr(resp, "usage_metadata", None)
+    except Exception as e:
+        metrics.inc("remote_calls_total", status="throttled" if is_rate_limited(e) else "error", **labels)
+        metrics.observe("remote_call_seconds", time.perf_counter() - t0, **labels)
+        raise
+    metrics.inc("remote_calls_total", status="ok", **labels)
+    metrics.observe("remote_call_seconds", time.perf_counter() - t0, **labels)
+    # contagem da API quando disponível, senão estimativa
+    metrics.inc("tokens_total", getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt), direction="input", **labels)
+    metrics.inc("tokens_total", getattr(usage, "candidates_token_count", None) or estimate_tokens(text), direction="output", **labels)
+    return text
+
+def chat_completion(messages, temperature=0.0, max_tokens=800, priority="interactive"):
     """
     Mensagens: lista de dicts {role, content}
+    A chamada passa pelo agendador (core/scheduler.py); `priority="bulk"` para gerações em lote.
     """
     history = []
     for m in messages:
         history.append(m["content"])
     prompt = "\n".join(history)
-
-    model = genai.GenerativeModel(MODEL_NAME)
-    resp = model.generate_content(
-        prompt,
-        generation_config={
-            "temperature": temperature,
-            "max_output_tokens": max_tokens
-        }
-    )
-    return resp.text
+    return get_scheduler("chat").call(lambda: _call_provider(prompt, temperature, max_tokens),
+                                      tokens=estimate_tokens(prompt), priority=priority)
@@ -0,0 +1,226 @@
+# core/metrics.py
+"""
+Rastreamento leve de onde o tempo vai: spans por etapa, contadores e histogramas, num registro
+global em memória (METRICS), seguro entre threads.
+- span("correlate.score")      -> tempo acumulado por caminho ("correlate/correlate.score"), aninhado por thread
+- inc("remote_calls_total", kind="embed")       -> contador com labels
+- observe("remote_call_seconds", 0.42, kind="chat") -> histograma com buckets fixos
+O custo é um lock e uma soma por registro: os agentes instrumentam etapas e lotes, não cada par.
+`--profile` no CLI imprime o resumo; `--metrics-out` grava em texto Prometheus (.prom/.txt) ou JSON.
+"""
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+# buckets (segundos) dos histogramas de latência: de chamadas locais (FAISS) a chamadas remotas lentas
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "auditor_"
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._t0 = time.perf_counter()
+            self._counters = {}    # (nome, labels) -> valor
+            self._histograms = {}  # (nome, labels) -> {"buckets", "counts", "count", "sum", "max"}
+            self._spans = {}       # caminho -> {"count", "seconds", "max"}
+
+    def detach(self):
+        """Num processo filho (fork): zera o registro e a pilha de spans herdada do pai."""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    # --- contadores e histogramas ---
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"buckets": tuple(buckets), "counts": [0] * len(buckets),
+                                             "count": 0, "sum": 0.0, "max": 0.0}
+            for i, b in enumerate(h["buckets"]):
+                if value <= b:
+                    h["counts"][i] += 1
+                    break
+            h["count"] += 1
+            h["sum"] += value
+            h["max"] = max(h["max"], value)
+
+    # --- spans ---
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name):
+        """Mede o bloco; spans abertos dentro dele (na mesma thread) ficam aninhados no caminho."""
+        stack = self._stack()
+        stack.append(name)
+        path = "/".join(stack)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self._add_span(path, time.perf_counter() - t0)
+
+    def record_span(self, name, seconds):
+        """Registra um span já medido (ex.: tempo acumulado num laço) sob o span aberto atual."""
+        self._add_span("/".join(self._stack() + [name]), seconds)
+
+    def _add_span(self, path, seconds):
+        with self._lock:
+            s = self._spans.get(path)
+            if s is None:
+                s = self._spans[path] = {"count": 0, "seconds": 0.0, "max": 0.0}
+            s["count"] += 1
+            s["seconds"] += seconds
+            s["max"] = max(s["max"], seconds)
+
+    def timed(self, name):
+        """Decorador: cada chamada da função vira um span `name`."""
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def merge(self, snap, under=None):
+        """
+        Soma um snapshot de outro processo (ex.: um worker do pool de `audit`); os spans dele ficam sob
+        o span aberto atual + `under`.
+        """
+        prefix = "/".join(self._stack() + ([under] if under else []))
+        with self._lock:
+            for c in snap["counters"]:
+                key = _key(c["name"], c["labels"])
+                self._counters[key] = self._counters.get(key, 0) + c["value"]
+            for h in snap["histograms"]:
+                key = _key(h["name"], h["labels"])
+                mine = self._histograms.get(key)
+                if mine is None:
+                    self._histograms[key] = {"buckets": tuple(h["buckets"]), "counts": list(h["counts"]),
+                                             "count": h["count"], "sum": h["sum"], "max": h["max"]}
+                    continue
+                if mine["buckets"] != tuple(h["buckets"]):
+                    continue  # buckets diferentes não se somam
+                mine["counts"] = [a + b for a, b in zip(mine["counts"], h["counts"])]
+                mine["count"] += h["count"]
+                mine["sum"] += h["sum"]
+                mine["max"] = max(mine["max"], h["max"])
+            for s in snap["spans"]:
+                path = f"{prefix}/{s['path']}" if prefix else s["path"]
+                mine = self._spans.setdefault(path, {"count": 0, "seconds": 0.0, "max": 0.0})
+                mine["count"] += s["count"]
+                mine["seconds"] += s["seconds"]
+                mine["max"] = max(mine["max"], s["max"])
+
+    # --- exportação ---
+
+    def snapshot(self):
+        """Cópia serializável do estado atual."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed_seconds": time.perf_counter() - self._t0,
+                "spans": [{"path": p, **s} for p, s in sorted(self._spans.items())],
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())],
+                "histograms": [{"name": n, "labels": dict(l), **{k: (list(v) if isinstance(v, (list, tuple)) else v)
+                                                                  for k, v in h.items()}}
+                               for (n, l), h in sorted(self._histograms.items())],
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Formato de texto de exposição do Prometheus (spans viram auditor_span_seconds_total/_count)."""
+        snap = self.snapshot()
+        lines = []
+
+        def labels(d):
+            if not d:
+                return ""
+            esc = lambda v: str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in sorted(d.items())) + "}"
+
+        def typed(name, kind, seen):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        seen = set()
+        for c in snap["counters"]:
+            name = METRIC_PREFIX + c["name"]
+            typed(name, "counter", seen)
+            lines.append(f"{name}{labels(c['labels'])} {c['value']}")
+        for h in snap["histograms"]:
+            name = METRIC_PREFIX + h["name"]
+            typed(name, "histogram", seen)
+            cumulative = 0
+            for b, n in zip(h["buckets"], h["counts"]):
+                cumulative += n
+                lines.append(f"{name}_bucket{labels({**h['labels'], 'le': repr(float(b))})} {cumulative}")
+            lines.append(f"{name}_bucket{labels({**h['labels'], 'le': '+Inf'})} {h['count']}")
+            lines.append(f"{name}_sum{labels(h['labels'])} {h['sum']}")
+            lines.append(f"{name}_count{labels(h['labels'])} {h['count']}")
+        if snap["spans"]:
+            typed(METRIC_PREFIX + "span_seconds_total", "counter", seen)
+            typed(METRIC_PREFIX + "span_count", "counter", seen)
+            for s in snap["spans"]:
+                lines.append(f"{METRIC_PREFIX}span_seconds_total{labels({'span': s['path']})} {s['seconds']}")
+                lines.append(f"{METRIC_PREFIX}span_count{labels({'span': s['path']})} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt=None):
+        """Grava as métricas; o formato vem de `fmt` ("json"/"prometheus") ou da extensão do arquivo."""
+        path = Path(path)
+        fmt = fmt or ("json" if path.suffix == ".json" else "prometheus")
+        text = self.to_json() if fmt == "json" else self.to_prometheus()
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        tmp.replace(path)
+        return path
+
+def histogram_quantile(h, q):
+    """Quantil aproximado de um histograma do snapshot (limite superior do bucket, como no Prometheus)."""
+    if not h["count"]:
+        return None
+    target = q * h["count"]
+    cumulative = 0
+    for b, n in zip(h["buckets"], h["counts"]):
+        cumulative += n
+        if cumulative >= target:
+            return min(b, h["max"])
+    return h["max"] if math.isfinite(h["max"]) else None
+
+METRICS = Metrics()
+span = METRICS.span
+record_span = METRICS.record_span
+timed = METRICS.timed
+inc = METRICS.inc
+observe = METRICS.observe
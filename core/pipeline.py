@@ -0,0 +1,71 @@
+# core/pipeline.py
+"""
+Executor de etapas em DAG, no mesmo processo.
+Cada etapa é um dict {"name", "fn", "deps" (opcional), "kwargs" (opcional)} e roda numa
+thread assim que todas as suas dependências terminam com sucesso; etapas independentes
+rodam em paralelo. Falha numa etapa não derruba as outras: apenas as que dependem dela
+são puladas.
+"""
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from core import metrics
+
+def _run_stage(stage):
+    t0 = time.perf_counter()
+    try:
+        with metrics.span(stage["name"]):
+            out = stage["fn"](**stage.get("kwargs", {}))
+        return {"name": stage["name"], "ok": True, "seconds": time.perf_counter() - t0, "result": out, "error": None}
+    except Exception:
+        return {"name": stage["name"], "ok": False, "seconds": time.perf_counter() - t0, "result": None, "error": traceback.format_exc()}
+
+def run_pipeline(stages, max_workers=None, on_start=None, on_finish=None):
+    """
+    Executa `stages` respeitando "deps". `on_start(stage)` / `on_finish(result)` são chamados
+    a cada transição (útil para barras de progresso).
+    Retorna um dict de resultado por etapa ({"name", "ok", "seconds", "result", "error"}),
+    na ordem de declaração.
+    """
+    by_name = {s["name"]: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.get("deps", ()) if d not in by_name]
+        if missing:
+            raise ValueError(f"Etapa '{s['name']}' depende de etapas inexistentes: {missing}")
+
+    results = {}
+    pending = [s["name"] for s in stages]
+    running = {}
+
+    def finish(res):
+        results[res["name"]] = res
+        if on_finish:
+            on_finish(res)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(stages), 1), thread_name_prefix="stage") as pool:
+        while pending or running:
+            ready = [n for n in pending if all(d in results for d in by_name[n].get("deps", ()))]
+            for name in ready:
+                pending.remove(name)
+                stage = by_name[name]
+                failed = [d for d in stage.get("deps", ()) if not results[d]["ok"]]
+                if failed:
+                    finish({"name": name, "ok": False, "seconds": 0.0, "result": None,
+                            "error": f"pulada: dependência falhou ({', '.join(failed)})"})
+                else:
+                    if on_start:
+                        on_start(stage)
+                    running[pool.submit(_run_stage, stage)] = name
+            if ready and not running:
+                continue
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                running.pop(fut)
+                finish(fut.result())
+
+    # o que sobrou em `pending` depende de um ciclo
+    for name in pending:
+        finish({"name": name, "ok": False, "seconds": 0.0, "result": None, "error": "pulada: dependência circular"})
+    return [results[s["name"]] for s in stages]
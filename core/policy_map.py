@@ -0,0 +1,114 @@
+# core/policy_map.py
+"""
+Mapa e-mail -> política: para cada chunk de e-mail indexado, as `k` seções da política mais
+parecidas (cosseno entre os vetores já gravados em vectorstore/emails e vectorstore/policy),
+calculadas com um produto de matrizes em blocos, sem nenhuma chamada remota.
+Quase-duplicatas ligadas a um chunk canônico herdam o mapa dele.
+O mapa (vectorstore/emails/policy_map.npz) guarda as versões (mtime/tamanho) dos dois índices:
+se algum deles mudar depois, load_policy_map() o ignora até a etapa rodar de novo.
+"""
+import re
+from pathlib import Path
+import numpy as np
+from core.vectors import unit_rows
+from core.versions import file_version
+
+EMAIL_INDEX = Path("vectorstore/emails/emails.index")
+EMAIL_META = Path("vectorstore/emails/emails.meta.pkl")
+POLICY_INDEX = Path("vectorstore/policy/policy.index")
+POLICY_META = Path("vectorstore/policy/policy.meta.pkl")
+MAP_PATH = Path("vectorstore/emails/policy_map.npz")
+TOP_K = 3
+BLOCK_ROWS = 50_000  # linhas de e-mail por bloco do produto de matrizes (memória limitada)
+
+_HEADING = re.compile(r"^\s*(SEÇÃO\s+\d+:[^\n]*|\d+\.\d+\.\s[^\n]*|PREFÁCIO\b[^\n]*)", re.M)
+
+def index_versions():
+    """Versão dos arquivos de que o mapa depende."""
+    return file_version(EMAIL_INDEX, EMAIL_META, POLICY_INDEX, POLICY_META)
+
+def section_titles(metas):
+    """
+    Título da seção de cada chunk da política: a subseção (1.2.) ou seção do chunk, senão a do anterior;
+    antes do primeiro título, a primeira linha do chunk (cabeçalho do documento).
+    """
+    titles, current = [], ""
+    for m in metas:
+        headings = [h.strip() for h in _HEADING.findall(m["text"])]
+        sub = [h for h in headings if h[0].isdigit()]
+        first = next((l.strip() for l in m["text"].splitlines() if l.strip().strip("=")), "")
+        title = (sub or headings or [current or first])[0]
+        titles.append(title[:90])
+        if headings:
+            current = headings[-1]
+    return titles
+
+def top_k_similarity(emails, policy, k=TOP_K, block_rows=BLOCK_ROWS):
+    """(índices, scores) das k colunas de maior cosseno por linha de `emails`, ordenadas por score."""
+    k = min(k, len(policy))
+    P = unit_rows(policy.astype("float32")).T
+    idx = np.empty((len(emails), k), dtype=np.int32)
+    score = np.empty((len(emails), k), dtype=np.float32)
+    for start in range(0, len(emails), block_rows):
+        S = unit_rows(emails[start:start + block_rows].astype("float32")) @ P
+        part = np.argpartition(-S, k - 1, axis=1)[:, :k] if k < S.shape[1] else np.tile(np.arange(k), (len(S), 1))
+        vals = np.take_along_axis(S, part, axis=1)
+        order = np.argsort(-vals, axis=1)
+        idx[start:start + len(S)] = np.take_along_axis(part, order, axis=1)
+        score[start:start + len(S)] = np.take_along_axis(vals, order, axis=1)
+    return idx, score
+
+def build_policy_map(k=TOP_K):
+    from core.vectorstore import FaissIndex
+    emails = FaissIndex(0, EMAIL_INDEX, EMAIL_META)
+    policy = FaissIndex(0, POLICY_INDEX, POLICY_META)
+    if emails.index is None or policy.index is None:
+        raise RuntimeError("Índices de e-mail e política são necessários. Execute a ingestão de ambos primeiro.")
+    if emails.index.d != policy.index.d:
+        raise RuntimeError(f"Dimensões diferentes (e-mails {emails.index.d}, política {policy.index.d}): "
+                           "os dois índices precisam do mesmo modelo de embedding.")
+    live = [i for i in range(len(emails.meta)) if i not in emails.deleted]
+    idx, score = top_k_similarity(emails.all_vectors()[live], policy.all_vectors(), k)
+
+    # linhas do mapa: cada chunk indexado e as quase-duplicatas ligadas a ele (mesmo texto, mesmo mapa)
+    rows, email_ids, chunk_ids = [], [], []
+    for pos, r in enumerate(live):
+        meta = emails.meta[r]
+        for m in [meta] + list(meta.get("duplicates", ())):
+            rows.append(pos)
+            email_ids.append(str(m["email_id"]))
+            chunk_ids.append(int(m["chunk_id"]))
+    rows = np.asarray(rows, dtype=np.int64)
+    titles = section_titles(policy.meta)
+    np.savez_compressed(
+        MAP_PATH.with_suffix(".tmp.npz"),
+        email_id=np.asarray(email_ids), chunk_id=np.asarray(chunk_ids, dtype=np.int32),
+        policy_row=idx[rows], score=score[rows],
+        policy_chunk_id=np.asarray([m["chunk_id"] for m in policy.meta], dtype=np.int32),
+        policy_section=np.asarray(titles),
+        versions=np.asarray(index_versions()),
+    )
+    MAP_PATH.with_suffix(".tmp.npz").replace(MAP_PATH)
+    return {"rows": len(rows), "policy_chunks": len(policy.meta), "k": int(idx.shape[1])}
+
+def load_policy_map(path=MAP_PATH):
+    """
+    {email_id: [{"chunk_id", "section", "score"}, ...]} com as seções mais parecidas com qualquer chunk
+    do e-mail (melhor score por seção), ou None se o mapa não existe ou está desatualizado.
+    """
+    if not Path(path).exists():
+        return None
+    data = np.load(path, allow_pickle=False)
+    if str(data["versions"]) != index_versions():
+        return None
+    best = {}
+    sections, policy_ids = data["policy_section"], data["policy_chunk_id"]
+    for eid, prow, sc in zip(data["email_id"].tolist(), data["policy_row"], data["score"]):
+        per = best.setdefault(eid, {})
+        for p, s in zip(prow.tolist(), sc.tolist()):
+            if s > per.get(p, -1.0):
+                per[p] = s
+    k = data["policy_row"].shape[1]
+    return {eid: [{"chunk_id": int(policy_ids[p]), "section": str(sections[p]), "score": round(float(s), 4)}
+                  for p, s in sorted(per.items(), key=lambda x: -x[1])[:k]]
+            for eid, per in best.items()}
@@ -0,0 +1,227 @@
+# core/scheduler.py
+"""
+Agendador único das chamadas ao provedor (embeddings e LLM), um por tipo de chamada ("embed", "chat"):
+- token buckets de requisições/minuto e tokens/minuto, com rajada curta (a chamada espera o balde
+  encher, em vez de tomar 429)
+- concorrência adaptativa (AIMD): +1 a cada janela de sucessos com latência estável; metade em 429;
+  -1 quando a latência média passa de LATENCY_FACTOR x a menor recente (fila no provedor). A latência é
+  medida por token e por prioridade (uma consulta interativa de 1 texto não vira a referência dos lotes
+  de 100), e a menor vale por LATENCY_MIN_WINDOW segundos; no máximo um ajuste por janela de sucessos
+- backoff exponencial com jitter ("full jitter") em 429/5xx, pausando todas as chamadas do tipo
+- prioridade: consultas interativas (RAG, busca) passam à frente do bulk (ingestão) na fila
+Limites via ambiente: AUDITOR_{EMBED,CHAT}_RPM, AUDITOR_{EMBED,CHAT}_TPM (0 = sem limite) e
+AUDITOR_{EMBED,CHAT}_CONCURRENCY (máximo de chamadas simultâneas).
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from core import metrics
+
+PRIORITIES = {"interactive": 0, "bulk": 1}
+LATENCY_FACTOR = 2.0
+EWMA_ALPHA = 0.2
+LATENCY_MIN_WINDOW = 60.0  # segundos: a menor latência é a da janela atual ou da anterior
+
+# limites padrão por tipo de chamada (cotas pagas do Gemini; ajuste pelo ambiente)
+DEFAULT_LIMITS = {
+    "embed": {"rpm": 1500, "tpm": 1_000_000, "concurrency": 8},
+    "chat": {"rpm": 1000, "tpm": 1_000_000, "concurrency": 4},
+}
+
+class RateLimitError(RuntimeError):
+    """429 do provedor (o fake de core/fake_models.py também levanta esta exceção)."""
+    code = 429
+
+def is_rate_limited(exc):
+    # google.api_core.exceptions.ResourceExhausted tem code == 429
+    return getattr(exc, "code", None) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+def is_retryable(exc):
+    return (is_rate_limited(exc) or getattr(exc, "code", None) in (500, 502, 503, 504)
+            or type(exc).__name__ in ("ServiceUnavailable", "DeadlineExceeded", "InternalServerError"))
+
+class TokenBucket:
+    """Balde de `per_minute` unidades por minuto, com rajada de até `capacity` (padrão: um minuto de cota)."""
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0 if per_minute else None
+        self.capacity = float(capacity or per_minute or 0)
+        self.level = self.capacity
+        self.t = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.t) * self.rate)
+        self.t = now
+
+    def wait_time(self, amount):
+        """Segundos até haver `amount` unidades (0 se já há). Não é thread-safe: o Scheduler segura o lock."""
+        if self.rate is None:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)  # uma chamada maior que o balde passaria a esperar para sempre
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.rate is not None:
+            self.level -= min(amount, self.capacity)
+
+class Scheduler:
+    def __init__(self, name="default", rpm=0, tpm=0, max_concurrency=8, min_concurrency=1,
+                 max_retries=6, base_delay=0.5, max_delay=30.0, burst_seconds=1.0):
+        self.name = name
+        # rajada de `burst_seconds` de cota: o ritmo fica uniforme em vez de gastar o minuto de uma vez
+        self.requests = TokenBucket(rpm, capacity=max(1.0, rpm / 60 * burst_seconds) if rpm else None)
+        self.tokens = TokenBucket(tpm, capacity=max(1.0, tpm / 60 * burst_seconds) if tpm else None)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = self.max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._queue = []           # heap de (prioridade, ordem de chegada)
+        self._seq = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0   # backoff compartilhado após um 429
+        self._successes = 0        # sucessos desde o último ajuste de concorrência
+        # latência por token de cada prioridade: {"ewma", "min", "prev_min", "since"}
+        self._latency = {}
+        self.throttled = 0
+        self.retries = 0
+
+    # --- fila ---
+
+    def _acquire(self, tokens, priority, seq):
+        ticket = (PRIORITIES[priority], seq)
+        t0 = time.perf_counter()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == ticket and self._active < self.limit:
+                        wait = max(self._paused_until - time.monotonic(),
+                                   self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if wait <= 0:
+                            break
+                    self._cond.wait(wait)
+                heapq.heappop(self._queue)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self._active += 1
+                # o próximo da fila pode ter vaga também
+                self._cond.notify_all()
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+        metrics.observe("scheduler_wait_seconds", time.perf_counter() - t0, scheduler=self.name, priority=priority)
+
+    def _observe_latency(self, latency, tokens, priority):
+        """Atualiza a média e a menor latência por token da prioridade; retorna (média, menor recente)."""
+        value = latency / max(1, tokens)
+        now = time.monotonic()
+        st = self._latency.get(priority)
+        if st is None:
+            st = self._latency[priority] = {"ewma": None, "min": value, "prev_min": None, "since": now}
+        if now - st["since"] >= LATENCY_MIN_WINDOW:
+            # a menor latência de uma janela antiga deixa de valer (o provedor pode ter ficado mais lento)
+            st.update(prev_min=st["min"], min=value, since=now)
+        st["min"] = min(st["min"], value)
+        st["ewma"] = value if st["ewma"] is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * st["ewma"]
+        floor = st["min"] if st["prev_min"] is None else min(st["min"], st["prev_min"])
+        return st["ewma"], floor
+
+    def _release(self, latency=None, throttled=False, tokens=1, priority="bulk"):
+        with self._cond:
+            self._active -= 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                self._successes = 0
+            elif latency is not None:
+                ewma, floor = self._observe_latency(latency, tokens, priority)
+                self._successes += 1
+                # um ajuste por janela de `limit` sucessos: as chamadas do limite anterior terminam antes do próximo
+                if self._successes >= self.limit:
+                    if ewma > LATENCY_FACTOR * floor and self.limit > self.min_concurrency:
+                        # latência subindo sem 429: o provedor está enfileirando, menos chamadas em voo
+                        self.limit -= 1
+                        self._successes = 0
+                        # a média volta a ser medida com o novo limite
+                        self._latency[priority]["ewma"] = None
+                    elif ewma <= LATENCY_FACTOR * floor and self.limit < self.max_concurrency:
+                        self.limit += 1
+                        self._successes = 0
+            self._cond.notify_all()
+
+    def _backoff(self, attempt):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    # --- API ---
+
+    def call(self, fn, tokens=1, priority="bulk"):
+        """Executa `fn()` respeitando cotas, concorrência e prioridade; refaz com backoff em 429/5xx."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridade desconhecida: {priority} (use {', '.join(PRIORITIES)})")
+        attempt = 0
+        # a mesma posição na fila vale para as novas tentativas
+        seq = next(self._seq)
+        while True:
+            self._acquire(tokens, priority, seq)
+            t0 = time.perf_counter()
+            try:
+                out = fn()
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                self._release(throttled=throttled)
+                if throttled:
+                    metrics.inc("scheduler_throttled_total", scheduler=self.name)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                self.retries += 1
+                metrics.inc("scheduler_retries_total", scheduler=self.name)
+                continue
+            self._release(latency=time.perf_counter() - t0, tokens=tokens, priority=priority)
+            return out
+
+    def stats(self):
+        with self._cond:
+            return {"name": self.name, "limit": self.limit, "active": self._active, "queued": len(self._queue),
+                    "throttled": self.throttled, "retries": self.retries,
+                    "latency_per_token": {p: {"ewma": st["ewma"], "min": st["min"]} for p, st in self._latency.items()}}
+
+_schedulers = {}
+_lock = threading.Lock()
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+def get_scheduler(kind):
+    """Scheduler compartilhado do processo para `kind` ("embed" ou "chat"), configurado pelo ambiente."""
+    with _lock:
+        if kind not in _schedulers:
+            limits = DEFAULT_LIMITS[kind]
+            prefix = f"AUDITOR_{kind.upper()}_"
+            _schedulers[kind] = Scheduler(
+                name=kind,
+                rpm=_env_int(prefix + "RPM", limits["rpm"]),
+                tpm=_env_int(prefix + "TPM", limits["tpm"]),
+                max_concurrency=_env_int(prefix + "CONCURRENCY", limits["concurrency"]),
+            )
+        return _schedulers[kind]
+
+def reset_schedulers():
+    """Descarta os schedulers (para recriá-los com outro ambiente, ex.: no benchmark)."""
+    with _lock:
+        _schedulers.clear()
@@ -0,0 +1,108 @@
+# core/semantic_cache.py
+"""
+Cache semântico de respostas: perguntas já respondidas ficam num pequeno índice FAISS de
+produto interno (vetores normalizados = similaridade de cosseno), cada uma com a resposta e os
+chunk_ids recuperados. Uma pergunta nova reaproveita a resposta quando a mais parecida tem
+cosseno ≥ `threshold` E a recuperação atual trouxe o mesmo conjunto de chunks.
+O cache é descartado quando o índice de origem muda (`fingerprint`, ex.: mtime/tamanho dos arquivos).
+"""
+import pickle
+import threading
+import unicodedata
+from pathlib import Path
+import numpy as np
+from core.vectors import unit_rows
+
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(text.split())
+
+class SemanticCache:
+    def __init__(self, path, fingerprint, threshold=0.92, max_entries=1000):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.entries = []   # {"question", "answer", "chunk_ids"} alinhados às linhas de self.vectors
+        self.vectors = None
+        self.index = None
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        # índice de origem reconstruído: as respostas podem citar chunks que mudaram
+        if state.get("fingerprint") != self.fingerprint:
+            return
+        self.entries = state["entries"]
+        self.vectors = state["vectors"]
+        self._rebuild()
+
+    def _rebuild(self):
+        import faiss
+        self.index = None
+        if self.vectors is not None and len(self.vectors):
+            self.index = faiss.IndexFlatIP(self.vectors.shape[1])
+            self.index.add(self.vectors)
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump({"fingerprint": self.fingerprint, "entries": self.entries, "vectors": self.vectors}, f)
+        tmp.replace(self.path)
+
+    def vector_for(self, question):
+        """Vetor já calculado de uma pergunta idêntica (após normalização), para não embedá-la de novo."""
+        key = normalize_question(question)
+        with self._lock:
+            for i, e in enumerate(self.entries):
+                if e["question"] == key:
+                    return self.vectors[i]
+        return None
+
+    def lookup(self, vector, chunk_ids):
+        """Entrada da pergunta mais parecida se cosseno ≥ threshold e os chunks recuperados forem os mesmos."""
+        with self._lock:
+            if self.index is None:
+                return None
+            D, I = self.index.search(unit_rows(np.reshape(vector, (1, -1))), 1)
+            if I[0][0] < 0 or D[0][0] < self.threshold:
+                return None
+            entry = self.entries[I[0][0]]
+            if set(entry["chunk_ids"]) != set(chunk_ids):
+                return None
+            return dict(entry, similarity=float(D[0][0]))
+
+    def store(self, question, vector, chunk_ids, answer):
+        v = unit_rows(np.reshape(vector, (1, -1)))
+        with self._lock:
+            self.entries.append({"question": normalize_question(question), "answer": answer,
+                                 "chunk_ids": list(chunk_ids)})
+            self.vectors = v if self.vectors is None else np.vstack([self.vectors, v])
+            if len(self.entries) > self.max_entries:
+                # descarta as mais antigas
+                drop = len(self.entries) - self.max_entries
+                self.entries = self.entries[drop:]
+                self.vectors = self.vectors[drop:]
+                self._rebuild()
+            elif self.index is None:
+                self._rebuild()
+            else:
+                self.index.add(v)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self.entries, self.vectors, self.index = [], None, None
+            if self.path.exists():
+                self.path.unlink()
+
+    def __len__(self):
+        return len(self.entries)
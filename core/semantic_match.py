@@ -0,0 +1,173 @@
+# core/semantic_match.py
+"""
+Similaridade semântica transação x e-mail, usada pela correlação:
+- descrições das transações embedadas uma única vez por texto distinto, em lotes (embed_texts), com cache
+  em vectorstore/transactions/desc_vectors.npz (hash do texto -> vetor): na próxima ingestão só as
+  descrições novas vão ao provedor; o cache é descartado se o modelo de embedding mudar
+- cópia normalizada dos vetores dos chunks de e-mail (vectorstore/emails/chunk_vectors.npz, com a versão
+  do índice), para a correlação ler só com numpy, sem faiss e sem chamadas remotas
+- na correlação, um produto matriz-vetor por transação com os chunks dos e-mails da janela; o score de
+  cada e-mail é o maior cosseno entre os seus chunks
+Quase-duplicatas ligadas a um chunk canônico usam o vetor dele (como no mapa e-mail -> política).
+"""
+import hashlib
+from pathlib import Path
+import numpy as np
+from core.vectors import unit_rows
+from core.versions import file_version
+
+EMAIL_INDEX = Path("vectorstore/emails/emails.index")
+EMAIL_META = Path("vectorstore/emails/emails.meta.pkl")
+DESC_CACHE = Path("vectorstore/transactions/desc_vectors.npz")
+CHUNK_VECTORS = Path("vectorstore/emails/chunk_vectors.npz")
+
+def index_versions():
+    """Versão do índice de e-mails de que a cópia dos vetores depende."""
+    return file_version(EMAIL_INDEX, EMAIL_META)
+
+def model_key():
+    from core.gemini import backend
+    from core.embeddings import EMBED_MODEL
+    return f"{backend()}:{EMBED_MODEL}"
+
+def tx_text(tx):
+    """Texto embedado de uma transação: a descrição, ou o beneficiário quando ela está vazia."""
+    for col in ("description", "descricao", "beneficiary"):
+        value = tx.get(col)
+        if value is not None and value == value and str(value).strip() and str(value).strip().lower() != "unknown":
+            return " ".join(str(value).split())
+    return ""
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class DescriptionVectors:
+    """Cache texto -> vetor normalizado das descrições de transações."""
+
+    def __init__(self, keys=(), vectors=None, model=None):
+        self.model = model
+        self.rows = {k: i for i, k in enumerate(keys)}
+        self.vectors = vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def load(cls, path=DESC_CACHE, model=None):
+        """Cache gravado; vazio se não existe ou foi calculado com outro modelo (model=None: aceita qualquer um)."""
+        if not Path(path).exists():
+            return cls(model=model)
+        data = np.load(path, allow_pickle=False)
+        if model is not None and str(data["model"]) != model:
+            return cls(model=model)
+        return cls(data["keys"].tolist(), data["vectors"], str(data["model"]))
+
+    def save(self, path=DESC_CACHE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        keys = sorted(self.rows, key=self.rows.get)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, keys=np.asarray(keys, dtype="U40"), vectors=self.vectors, model=np.asarray(self.model or ""))
+        tmp.replace(path)
+
+    def get(self, text):
+        row = self.rows.get(text_key(text)) if text else None
+        return None if row is None else self.vectors[row]
+
+    def embed(self, texts, batch_size=None, priority="bulk"):
+        """Embeda (em lotes) os textos distintos que ainda não estão no cache; retorna quantos foram embedados."""
+        from core.embeddings import embed_texts, EMBED_BATCH
+        missing = {}
+        for t in texts:
+            if t:
+                k = text_key(t)
+                if k not in self.rows:
+                    missing.setdefault(k, t)
+        if not missing:
+            return 0
+        new = unit_rows(np.asarray(embed_texts(list(missing.values()), batch_size=batch_size or EMBED_BATCH,
+                                           priority=priority), dtype=np.float32))
+        if len(self.rows) and new.shape[1] != self.vectors.shape[1]:
+            raise RuntimeError(f"Dimensão dos embeddings mudou ({self.vectors.shape[1]} -> {new.shape[1]}): "
+                               f"apague {DESC_CACHE} e rode a etapa de novo.")
+        start = len(self.rows)
+        for i, k in enumerate(missing):
+            self.rows[k] = start + i
+        self.vectors = np.vstack([self.vectors, new]) if start else new
+        return len(missing)
+
+def build_chunk_vectors(path=CHUNK_VECTORS, emails=None):
+    """
+    Grava os vetores normalizados dos chunks de e-mail indexados, com o id do e-mail de cada linha.
+    `emails`: FaissIndex já carregado (e gravado), ex.: o do `watch` depois de anexar e-mails novos.
+    """
+    if emails is None:
+        from core.vectorstore import FaissIndex
+        emails = FaissIndex(0, EMAIL_INDEX, EMAIL_META)
+    if emails.index is None:
+        raise RuntimeError(f"{EMAIL_INDEX} não encontrado. Execute scripts/ingest_emails.py primeiro.")
+    live = [i for i in range(len(emails.meta)) if i not in emails.deleted]
+    vectors = unit_rows(emails.all_vectors()[live].astype(np.float32))
+
+    # linhas por e-mail: cada chunk indexado e as quase-duplicatas ligadas a ele (mesmo texto, mesmo vetor)
+    rows, email_ids = [], []
+    for pos, r in enumerate(live):
+        meta = emails.meta[r]
+        for m in [meta] + list(meta.get("duplicates", ())):
+            rows.append(pos)
+            email_ids.append(str(m["email_id"]))
+    path = Path(path)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, vectors=vectors, row=np.asarray(rows, dtype=np.int64), email_id=np.asarray(email_ids),
+             versions=np.asarray(index_versions()))
+    tmp.replace(path)
+    return {"chunks": len(live), "rows": len(rows), "dim": int(vectors.shape[1]) if len(live) else 0}
+
+class SemanticMatcher:
+    def __init__(self, vectors, rows_by_email, descriptions):
+        self.vectors = vectors
+        self.rows_by_email = rows_by_email
+        self.descriptions = descriptions
+        self._window = (None, None, None, None)
+
+    def vector(self, tx):
+        """Vetor da descrição da transação, ou None se ela não foi embedada (ex.: linha anexada pelo `watch`)."""
+        return self.descriptions.get(tx_text(tx))
+
+    def similarities(self, vector, email_ids):
+        """Maior cosseno entre `vector` e os chunks de cada e-mail (0.0 para e-mails sem chunks indexados)."""
+        email_ids = tuple(email_ids)
+        key, chunks, starts, present = self._window
+        if key != email_ids:
+            # transações em ordem de data repetem a janela: a matriz dos chunks dela é montada uma vez
+            parts = [self.rows_by_email.get(str(e)) for e in email_ids]
+            present = [i for i, p in enumerate(parts) if p is not None]
+            sizes = [len(parts[i]) for i in present]
+            chunks = self.vectors[np.concatenate([parts[i] for i in present])] if present else None
+            starts = np.cumsum([0] + sizes[:-1]) if present else None
+            self._window = (email_ids, chunks, starts, present)
+        out = [0.0] * len(email_ids)
+        if not present:
+            return out
+        best = np.maximum.reduceat(chunks @ vector, starts)
+        for i, s in zip(present, best.tolist()):
+            out[i] = s
+        return out
+
+def load_matcher(chunk_path=CHUNK_VECTORS, desc_path=DESC_CACHE):
+    """
+    Matcher com a cópia dos vetores de e-mail e o cache de descrições, ou None se algum falta, se a cópia
+    está desatualizada (o índice de e-mails mudou depois dela) ou se as dimensões não batem.
+    """
+    if not Path(chunk_path).exists() or not Path(desc_path).exists():
+        return None
+    data = np.load(chunk_path, allow_pickle=False)
+    if str(data["versions"]) != index_versions():
+        return None
+    descriptions = DescriptionVectors.load(desc_path, model=model_key())
+    vectors = data["vectors"]
+    if not descriptions.rows or descriptions.vectors.shape[1] != vectors.shape[1]:
+        return None
+    order = np.argsort(data["email_id"], kind="stable")
+    ids, rows = data["email_id"][order], data["row"][order]
+    uniq, first = np.unique(ids, return_index=True)
+    bounds = list(first) + [len(ids)]
+    rows_by_email = {str(e): rows[bounds[i]:bounds[i + 1]] for i, e in enumerate(uniq.tolist())}
+    return SemanticMatcher(vectors, rows_by_email, descriptions)
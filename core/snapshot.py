@@ -0,0 +1,68 @@
+# core/snapshot.py
+"""
+Ligação entre o snapshot Parquet das transações e o CSV normalizado de que ele foi gerado:
+scripts/ingest_transactions.py grava nos metadados do Parquet o tamanho, o mtime e o hash do CSV que
+escreveu junto, e quem lê o snapshot (TransactionAgent, índice de busca) confere esses valores com o CSV
+atual em vez de comparar o mtime do CSV com o do snapshot:
+- tamanho diferente: desatualizado, sem ler o CSV
+- mesmo tamanho e mesmo mtime: em dia, sem ler o CSV (o caso comum, logo depois da ingestão)
+- mesmo tamanho e mtime diferente (cópia, checkout, `touch`, edição sem mudar o tamanho): o hash do CSV
+  decide (calculado uma vez por versão mtime/tamanho do arquivo no processo)
+Snapshot sem os metadados (versões antigas da ingestão) conta como desatualizado.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+SOURCE_KEY = b"auditor.source_csv"
+_digests = {}  # (caminho, mtime_ns, tamanho) -> hash
+
+class SourceHash:
+    """Tamanho e sha256 acumulados dos bytes escritos no CSV (o mtime vem do arquivo pronto, em metadata())."""
+    def __init__(self):
+        self.size = 0
+        self._h = hashlib.sha256()
+
+    def update(self, data):
+        self.size += len(data)
+        self._h.update(data)
+
+    def metadata(self, path):
+        source = {"size": self.size, "mtime_ns": Path(path).stat().st_mtime_ns, "sha256": self._h.hexdigest()}
+        return {SOURCE_KEY: json.dumps(source).encode("utf-8")}
+
+def file_digest(path, block=1 << 20):
+    path = Path(path)
+    st = path.stat()
+    key = (str(path.resolve()), st.st_mtime_ns, st.st_size)
+    if key not in _digests:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(block), b""):
+                h.update(data)
+        _digests[key] = h.hexdigest()
+    return _digests[key]
+
+def source_of(snapshot):
+    """{"size", "mtime_ns", "sha256"} do CSV de origem gravado no snapshot, ou None."""
+    import pyarrow.parquet as pq
+    meta = pq.read_metadata(snapshot).metadata or {}
+    raw = meta.get(SOURCE_KEY)
+    return json.loads(raw) if raw else None
+
+def is_fresh(snapshot, csv):
+    """O snapshot corresponde ao CSV atual? (sem CSV, vale o snapshot; sem pyarrow, False)"""
+    if not Path(snapshot).exists():
+        return False
+    if not Path(csv).exists():
+        return True
+    try:
+        source = source_of(snapshot)
+    except ImportError:
+        return False
+    st = Path(csv).stat()
+    if not source or source.get("size") != st.st_size:
+        return False
+    if source.get("mtime_ns") == st.st_mtime_ns:
+        return True
+    return source.get("sha256") == file_digest(csv)
@@ -0,0 +1,271 @@
+# core/tx_index.py
+"""
+Índice de busca do ledger, montado na ingestão, para consultas combinadas sem varrer as transações:
+- texto: índice invertido de trigramas sobre descrição + beneficiário (minúsculas, sem acentos);
+  um termo vira a interseção das listas dos seus trigramas e os candidatos são conferidos no texto
+- data e valor: linhas ordenadas pelo valor da coluna e a coluna já ordenada (intervalo = busca binária + fatia)
+- funcionário: nomes distintos ordenados, com as linhas de cada um (igualdade ou prefixo do nome)
+Os filtros viram conjuntos de linhas (posição no ledger, como row_index/tx_index dos agentes),
+intersectados do menor para o maior. As colunas exibidas ficam no próprio índice (textos num buffer
+UTF-8 com offsets), então a consulta não lê o ledger.
+Gravado em vectorstore/transactions/tx_index.npz com a versão (mtime/tamanho) do CSV/snapshot normalizados.
+"""
+import bisect
+import re
+import unicodedata
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+from core.dates import day_ordinal
+from core.versions import file_version
+
+DATA_CSV = Path("data/transacoes_normalizadas.csv")
+SNAPSHOT = Path("data/transacoes_normalizadas.parquet")
+INDEX_PATH = Path("vectorstore/transactions/tx_index.npz")
+
+# colunas guardadas para exibir os resultados
+DISPLAY_COLUMNS = ("id_transacao", "description", "beneficiary", "categoria")
+# colunas de exportação (core/export.py) de cada resultado de record()
+RECORD_COLUMNS = [
+    ("row_index","int64"), ("id_transacao","string"), ("date","string"), ("funcionario","string"),
+    ("amount","float64"), ("description","string"), ("beneficiary","string"), ("categoria","string"),
+]
+_NO_DATE = np.iinfo(np.int64).min
+_MONTH = re.compile(r"^(\d{4})-(\d{2})$")
+
+def normalize(text):
+    """Minúsculas, sem acentos e com espaços simples ("Câmeras  WUPHF" -> "cameras wuphf")."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(text.lower().split())
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def source_version():
+    return file_version(DATA_CSV, SNAPSHOT)
+
+def _pack(values):
+    """Textos -> (buffer UTF-8, offsets): o i-ésimo texto é buffer[offsets[i]:offsets[i + 1]]."""
+    encoded = [("" if v is None or v != v else str(v)).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def date_bounds(start=None, end=None):
+    """Ordinais (inclusivos) de uma janela; "2008-04" vale pelo mês inteiro (início no dia 1, fim no último dia)."""
+    lo = hi = None
+    if start is not None:
+        m = _MONTH.match(str(start))
+        lo = date(int(m.group(1)), int(m.group(2)), 1).toordinal() if m else day_ordinal(start)
+    if end is not None:
+        m = _MONTH.match(str(end))
+        if m:
+            y, mo = int(m.group(1)), int(m.group(2))
+            hi = (date(y + mo // 12, mo % 12 + 1, 1) - timedelta(days=1)).toordinal()
+        else:
+            hi = day_ordinal(end)
+    return lo, hi
+
+class TxIndex:
+    def __init__(self, arrays, version=None):
+        self.a = arrays
+        self.version = version
+        self.n = len(arrays["amount"])
+        self.names = arrays["func_names"].tolist()   # nomes normalizados, ordenados
+        self._text_cache = {}
+
+    # --- construção / persistência ---
+
+    @classmethod
+    def from_frame(cls, df, version=None):
+        """Índice de um ledger normalizado (colunas date, amount, funcionario, description/descricao, beneficiary)."""
+        import pandas as pd
+        n = len(df)
+        col = lambda name: df[name].tolist() if name in df.columns else [None] * n
+        desc = col("description") if "description" in df.columns else col("descricao")
+        benef = col("beneficiary")
+        arrays = {}
+
+        # texto: pares (trigrama, linha) ordenados por trigrama e linha (listas no formato CSR)
+        grams, rows = [], []
+        for i, (d, b) in enumerate(zip(desc, benef)):
+            g = trigrams(f" {normalize(d)} | {normalize(b)} ")
+            grams.extend(g)
+            rows.extend([i] * len(g))
+        keys, inverse = np.unique(np.asarray(grams, dtype="U3"), return_inverse=True)
+        rows = np.asarray(rows, dtype=np.int32)
+        order = np.lexsort((rows, inverse))
+        arrays["tri_keys"] = keys
+        arrays["tri_ptr"] = np.searchsorted(inverse[order], np.arange(len(keys) + 1)).astype(np.int64)
+        arrays["tri_rows"] = rows[order]
+
+        # data e valor: valores por linha + ordem das linhas pelo valor
+        dates = pd.to_datetime(df["date"], errors="coerce") if "date" in df.columns else pd.Series(pd.NaT, index=df.index)
+        missing = dates.isna().to_numpy()
+        days = np.full(n, _NO_DATE, dtype=np.int64)
+        days[~missing] = dates.to_numpy()[~missing].astype("datetime64[D]").astype(np.int64) + date(1970, 1, 1).toordinal()
+        amounts = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+        arrays["day"], arrays["amount"] = days, amounts
+        arrays["day_order"] = np.argsort(days, kind="stable").astype(np.int32)
+        arrays["amount_order"] = np.argsort(amounts, kind="stable").astype(np.int32)
+        # colunas na ordem acima, gravadas prontas: a consulta só faz a busca binária
+        arrays["day_sorted"] = days[arrays["day_order"]]
+        arrays["amount_sorted"] = amounts[arrays["amount_order"]]
+
+        # funcionário: nomes distintos (normalizados, ordenados) e as linhas de cada um
+        func = col("funcionario")
+        norm = [normalize(f) for f in func]
+        names = sorted(set(norm))
+        code = {nm: i for i, nm in enumerate(names)}
+        codes = np.asarray([code[nm] for nm in norm], dtype=np.int32)
+        order = np.argsort(codes, kind="stable")
+        arrays["func_names"] = np.asarray(names, dtype=str)
+        arrays["func_ptr"] = np.searchsorted(codes[order], np.arange(len(names) + 1)).astype(np.int64)
+        arrays["func_rows"] = order.astype(np.int32)
+        arrays["func_buf"], arrays["func_off"] = _pack(func)
+
+        for name in DISPLAY_COLUMNS:
+            values = desc if name == "description" else col(name)
+            arrays[f"{name}_buf"], arrays[f"{name}_off"] = _pack(values)
+        return cls(arrays, version)
+
+    @classmethod
+    def build(cls):
+        """Índice do ledger normalizado (snapshot Parquet se ele é do CSV atual, senão o CSV)."""
+        import pandas as pd
+        from core.snapshot import is_fresh
+        cols = ["date", "amount", "funcionario", *DISPLAY_COLUMNS]
+        fresh = is_fresh(SNAPSHOT, DATA_CSV)
+        if fresh:
+            import pyarrow.parquet as pq
+            names = pq.read_schema(SNAPSHOT).names
+        else:
+            names = list(pd.read_csv(DATA_CSV, nrows=0).columns)
+        # 'descricao' tem o mesmo texto de 'description': só é lida na falta dela
+        if "description" not in names:
+            cols.append("descricao")
+        cols = [c for c in dict.fromkeys(cols) if c in names]
+        if fresh:
+            df = pd.read_parquet(SNAPSHOT, columns=cols)
+        else:
+            df = pd.read_csv(DATA_CSV, usecols=cols)
+        return cls.from_frame(df, version=source_version())
+
+    def save(self, path=INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, version=np.asarray(self.version or ""), **self.a)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """Índice gravado, ou None se não existe, foi montado de outra versão do ledger ou num formato antigo."""
+        if not Path(path).exists():
+            return None
+        d = np.load(path, allow_pickle=False)
+        if str(d["version"]) != source_version() or not {"day_sorted", "amount_sorted"} <= set(d.files):
+            return None
+        return cls({k: d[k] for k in d.files if k != "version"}, str(d["version"]))
+
+    # --- filtros (cada um devolve as linhas, ordenadas) ---
+
+    def _text(self, name, i):
+        return bytes(self.a[f"{name}_buf"][self.a[f"{name}_off"][i]:self.a[f"{name}_off"][i + 1]]).decode("utf-8")
+
+    def _postings(self, gram):
+        keys = self.a["tri_keys"]
+        j = int(np.searchsorted(keys, gram))
+        if j == len(keys) or keys[j] != gram:
+            return np.zeros(0, dtype=np.int32)
+        return self.a["tri_rows"][self.a["tri_ptr"][j]:self.a["tri_ptr"][j + 1]]
+
+    def _searchable(self, i):
+        t = self._text_cache.get(i)
+        if t is None:
+            t = self._text_cache[i] = f" {normalize(self._text('description', i))} | {normalize(self._text('beneficiary', i))} "
+        return t
+
+    def match_text(self, term):
+        """Linhas cuja descrição/beneficiário contém `term` (sem diferenciar maiúsculas e acentos)."""
+        term = normalize(term)
+        if not term:
+            return np.arange(self.n, dtype=np.int32)
+        if len(term) < 3:
+            # curto demais para trigramas: confere todas as linhas
+            candidates = range(self.n)
+        else:
+            lists = sorted((self._postings(g) for g in trigrams(term)), key=len)
+            candidates = lists[0]
+            for p in lists[1:]:
+                if not len(candidates):
+                    break
+                candidates = np.intersect1d(candidates, p, assume_unique=True)
+        return np.asarray([i for i in candidates if term in self._searchable(int(i))], dtype=np.int32)
+
+    def _range(self, sorted_values, order, lo, hi):
+        a = 0 if lo is None else int(np.searchsorted(sorted_values, lo, side="left"))
+        b = len(order) if hi is None else int(np.searchsorted(sorted_values, hi, side="right"))
+        return np.sort(order[a:max(a, b)])
+
+    def match_dates(self, start=None, end=None):
+        lo, hi = date_bounds(start, end)
+        # linhas sem data ficam no começo da ordem (menor inteiro): só entram numa janela aberta no início
+        lo = _NO_DATE + 1 if lo is None else lo
+        return self._range(self.a["day_sorted"], self.a["day_order"], lo, hi)
+
+    def match_amount(self, low=None, high=None):
+        return self._range(self.a["amount_sorted"], self.a["amount_order"], low, high)
+
+    def match_employee(self, name):
+        """Linhas do funcionário: nome igual ou começando por `name` (ex.: "michael" -> "Michael Scott")."""
+        key = normalize(name)
+        a = bisect.bisect_left(self.names, key)
+        b = bisect.bisect_left(self.names, key + "\uffff")
+        ptr = self.a["func_ptr"]
+        return np.sort(self.a["func_rows"][ptr[a]:ptr[b]]) if b > a else np.zeros(0, dtype=np.int32)
+
+    # --- consulta ---
+
+    def search(self, terms=(), match_all=False, start=None, end=None, min_amount=None, max_amount=None,
+               employees=()):
+        """
+        Linhas que casam com todos os filtros: textos (qualquer um, ou todos com match_all),
+        janela de datas (inclusiva; aceita "2008-04"), faixa de valor e funcionários (qualquer um).
+        Filtros de índice ordenado primeiro; os textos só conferem os candidatos que sobraram.
+        """
+        sets = []
+        if start is not None or end is not None:
+            sets.append(self.match_dates(start, end))
+        if min_amount is not None or max_amount is not None:
+            sets.append(self.match_amount(min_amount, max_amount))
+        if employees:
+            sets.append(np.unique(np.concatenate([self.match_employee(e) for e in employees])))
+        if terms:
+            texts = [self.match_text(t) for t in terms]
+            if match_all:
+                sets.extend(texts)
+            else:
+                sets.append(np.unique(np.concatenate(texts)))
+        if not sets:
+            return np.arange(self.n, dtype=np.int32)
+        sets.sort(key=len)
+        rows = sets[0]
+        for s in sets[1:]:
+            rows = np.intersect1d(rows, s, assume_unique=True)
+        return rows
+
+    def record(self, i):
+        """Transação `i` a partir das colunas guardadas no índice."""
+        i = int(i)
+        day = int(self.a["day"][i])
+        return {"row_index": i, "id_transacao": self._text("id_transacao", i) or None,
+                "date": date.fromordinal(day).isoformat() if day != _NO_DATE else None,
+                "funcionario": self._text("func", i) or None, "amount": float(self.a["amount"][i]),
+                "description": self._text("description", i), "beneficiary": self._text("beneficiary", i),
+                "categoria": self._text("categoria", i) or None}
+
+def load_or_build(path=INDEX_PATH):
+    """Índice gravado na ingestão; se faltar ou estiver desatualizado (ex.: `watch` anexou linhas), monta em memória."""
+    idx = TxIndex.load(path)
+    return idx if idx is not None else TxIndex.build()
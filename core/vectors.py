@@ -0,0 +1,10 @@
+# core/vectors.py
+"""Operações comuns sobre matrizes de embeddings (numpy)."""
+import numpy as np
+
+def unit_rows(arr):
+    """Linhas normalizadas (norma L2 = 1); linhas nulas ficam como estão."""
+    arr = np.asarray(arr, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
@@ -1,9 +1,19 @@
 # core/vectorstore.py
 import faiss
+import hashlib
+import heapq
+import json
 import numpy as np
+import os
 import pickle
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict
+from core import metrics
+from core.versions import file_version  # versão da origem gravada no manifesto dos shards
 
 class FaissIndex:
     def __init__(self, dim:int, index_path:Path, meta_path:Path):
@@ -12,6 +22,8 @@ class FaissIndex:
         self.meta_path = Path(meta_path)
         self.index = None
         self.meta = []
+        # linhas removidas logicamente (meta["deleted"]): ignoradas nas buscas até o compact()
+        self.deleted = set()
         if self.index_path.exists() and self.meta_path.exists():
             self._load()
 
@@ -19,6 +31,7 @@ class FaissIndex:
         self.index = faiss.read_index(str(self.index_path))
         with open(self.meta_path, "rb") as f:
             self.meta = pickle.load(f)
+        self.deleted = {i for i, m in enumerate(self.meta) if m.get("deleted")}
 
     def save(self):
         faiss.write_index(self.index, str(self.index_path))
@@ -30,8 +43,69 @@ class FaissIndex:
         self.index = faiss.IndexFlatL2(self.dim)
         self.index.add(arr)
         self.meta = metas
+        self.deleted = set()
         self.save()
 
+    def reset(self):
+        """Esvazia o índice em memória (para reconstruí-lo com append(); nada é gravado até o save())."""
+        self.index = None
+        self.meta = []
+        self.deleted = set()
+
+    def append(self, vectors:List[List[float]], metas:List[Dict], save=True):
+        """
+        Adiciona vários vetores de uma vez. Retorna as linhas novas.
+        save=False adia a gravação em disco (útil ao anexar muitos lotes seguidos).
+        """
+        if len(vectors) == 0:
+            return []
+        arr = np.array(vectors).astype("float32")
+        if self.index is None:
+            self.index = faiss.IndexFlatL2(arr.shape[1])
+        first = self.index.ntotal
+        self.index.add(arr)
+        self.meta.extend(metas)
+        if save:
+            self.save()
+        return list(range(first, first + len(metas)))
+
+    def vectors(self, rows):
+        """Recupera os vetores armazenados nas linhas `rows`."""
+        rows = list(rows)
+        if not rows:
+            return np.zeros((0, self.index.d if self.index is not None else self.dim), dtype="float32")
+        return np.vstack([self.index.reconstruct(int(r)) for r in rows])
+
+    def all_vectors(self):
+        """Todos os vetores do índice (inclusive linhas removidas logicamente), na ordem das linhas."""
+        if self.index is None or self.index.ntotal == 0:
+            return np.zeros((0, self.index.d if self.index is not None else self.dim), dtype="float32")
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    def tombstone(self, rows):
+        """Remove logicamente as linhas `rows` (o vetor continua no índice até o compact())."""
+        for r in rows:
+            self.meta[r]["deleted"] = True
+            self.deleted.add(r)
+        self.save()
+
+    def compact(self):
+        """
+        Remove fisicamente as linhas marcadas como removidas, reconstruindo o índice.
+        Retorna {linha_antiga: linha_nova} para as linhas mantidas.
+        """
+        live = [i for i in range(len(self.meta)) if i not in self.deleted]
+        remap = {old: new for new, old in enumerate(live)}
+        dim = self.index.d if self.index is not None else self.dim
+        vecs = self.vectors(live) if live else np.zeros((0, dim), dtype="float32")
+        self.index = faiss.IndexFlatL2(dim)
+        if len(live):
+            self.index.add(vecs)
+        self.meta = [self.meta[i] for i in live]
+        self.deleted = set()
+        self.save()
+        return remap
+
     def add(self, vector, meta):
         if self.index is None:
             self.index = faiss.IndexFlatL2(len(vector))
@@ -42,9 +116,214 @@ class FaissIndex:
     def query(self, vector, k=5):
         if self.index is None:
             return []
-        D, I = self.index.search(np.array([vector]).astype("float32"), k)
+        # busca a mais para compensar as linhas removidas logicamente
+        fetch = min(k + len(self.deleted), self.index.ntotal) if self.deleted else k
+        with metrics.span("faiss.search"):
+            D, I = self.index.search(np.array([vector]).astype("float32"), fetch)
         results = []
         for dist, idx in zip(D[0], I[0]):
-            if idx < 0 or idx >= len(self.meta): continue
+            if idx < 0 or idx >= len(self.meta) or idx in self.deleted: continue
             results.append({"score": float(dist), "meta": self.meta[idx]})
+            if len(results) == k: break
         return results
+
+# --- shards por partição ---
+
+SHARD_MANIFEST = "manifest.json"
+SHARD_WORKERS = int(os.getenv("AUDITOR_SHARD_WORKERS", "4"))
+# resultados a mais pedidos a cada shard: o mesmo chunk pode estar em vários (quase-duplicatas)
+SHARD_FETCH_MARGIN = int(os.getenv("AUDITOR_SHARD_MARGIN", "5"))
+PARTITIONS = ("month", "quarter", "year")
+
+_QUARTER = re.compile(r"^(\d{4})-Q([1-4])$")
+_MONTH = re.compile(r"^(\d{4})-(\d{2})$")
+_pool = None
+_pool_lock = threading.Lock()
+
+def _shard_pool():
+    # um pool por processo, compartilhado por todos os índices com shards
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="faiss-shard")
+        return _pool
+
+def partition_key(meta, by="month"):
+    """Partição de um chunk pela data do e-mail: mês ("2008-04"), trimestre ("2008-Q2") ou ano ("2008")."""
+    if by not in PARTITIONS:
+        raise ValueError(f"Partição desconhecida: {by} (use {', '.join(PARTITIONS)})")
+    try:
+        from dateutil import parser as dtparser
+        d = dtparser.parse(str(meta.get("date")), dayfirst=False)
+    except (ValueError, OverflowError):
+        return "sem-data"
+    if by == "month":
+        return f"{d.year:04d}-{d.month:02d}"
+    if by == "quarter":
+        return f"{d.year:04d}-Q{(d.month - 1) // 3 + 1}"
+    return f"{d.year:04d}"
+
+def partition_matches(key, spec):
+    """
+    `spec` seleciona a partição `key`: igual, prefixo ("2008" -> "2008-04", "2008-Q2") ou trimestre
+    sobre meses ("2008-Q2" -> "2008-04".."2008-06").
+    """
+    spec = spec.strip().lower()
+    key = key.lower()
+    if key == spec or key.startswith(spec + "-"):
+        return True
+    q, m = _QUARTER.match(spec.upper()), _MONTH.match(key)
+    return bool(q and m and q.group(1) == m.group(1) and (int(m.group(2)) - 1) // 3 + 1 == int(q.group(2)))
+
+def _digest(vectors, metas):
+    """Hash do conteúdo de um shard (identificação, texto, duplicatas e vetor de cada chunk)."""
+    h = hashlib.sha1()
+    for vec, meta in zip(vectors, metas):
+        dups = ",".join(f"{d.get('email_id')}:{d.get('chunk_id')}" for d in meta.get("duplicates", ()))
+        h.update(f"{meta.get('email_id')}:{meta.get('chunk_id')}\x1f{meta.get('text', '')}\x1f{dups}\x1e".encode("utf-8"))
+        h.update(np.ascontiguousarray(vec, dtype="float32").tobytes())
+    return h.hexdigest()
+
+class ShardedFaissIndex:
+    """
+    Conjunto de FaissIndex, um por partição (mês, trimestre ou ano), descrito por um manifesto
+    (`<root>/manifest.json`: partição, dimensão, versão da origem e, por shard, arquivos, linhas e hash).
+    - build_shard()/drop_shard() gravam ou removem um shard sem tocar nos outros
+    - sync() reparte vetores + metadados por partição e regrava só os shards cujo conteúdo mudou
+      (um chunk com quase-duplicatas de outras partições entra nos shards delas também)
+    - query(vetor, k, partitions) busca só nos shards selecionados, em paralelo (pool de threads;
+      o faiss libera o GIL na busca), e junta os top-k pela distância L2, sem repetir (email_id, chunk_id)
+    Os shards são carregados sob demanda, na primeira busca que os usa.
+    """
+
+    def __init__(self, root:Path, dim:int, by:str="month"):
+        self.root = Path(root)
+        self.dim = dim
+        self.manifest_path = self.root / SHARD_MANIFEST
+        self.manifest = {"by": by, "dim": dim, "source": None, "shards": {}}
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            self.dim = self.manifest["dim"]
+        self._shards = {}
+
+    @property
+    def by(self):
+        return self.manifest["by"]
+
+    def keys(self):
+        return sorted(self.manifest["shards"])
+
+    def __len__(self):
+        return sum(s["count"] for s in self.manifest["shards"].values())
+
+    def save_manifest(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+        tmp.replace(self.manifest_path)
+
+    # --- construção ---
+
+    def build_shard(self, key, vectors, metas, digest=None, save=True):
+        """Grava (ou substitui) o shard `key`; os outros shards não são lidos nem regravados."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        entry = {"index": f"{key}.index", "meta": f"{key}.meta.pkl", "count": len(metas),
+                 "digest": digest or _digest(vectors, metas),
+                 "updated": datetime.now().isoformat(timespec="seconds")}
+        # grava ao lado e troca: quem está lendo o shard antigo não vê arquivos pela metade
+        tmp = FaissIndex(self.dim, self.root / f"{key}.index.tmp", self.root / f"{key}.meta.pkl.tmp")
+        tmp.build(vectors, list(metas))
+        tmp.index_path.replace(self.root / entry["index"])
+        tmp.meta_path.replace(self.root / entry["meta"])
+        self.manifest["shards"][key] = entry
+        self._shards.pop(key, None)
+        if save:
+            self.save_manifest()
+        return entry
+
+    def drop_shard(self, key, save=True):
+        entry = self.manifest["shards"].pop(key, None)
+        self._shards.pop(key, None)
+        if entry:
+            for name in (entry["index"], entry["meta"]):
+                (self.root / name).unlink(missing_ok=True)
+        if save:
+            self.save_manifest()
+
+    def sync(self, vectors, metas, by=None, source=None):
+        """
+        Reparte (vetores, metadados) por partição e atualiza o conjunto: só os shards novos ou com
+        conteúdo diferente são gravados; partições que sumiram são removidas. Trocar `by` refaz todos.
+        Retorna {"built", "kept", "dropped"} (chaves dos shards).
+        """
+        by = by or self.by
+        if by != self.by:
+            for key in self.keys():
+                self.drop_shard(key, save=False)
+            self.manifest["by"] = by
+        vectors = np.asarray(vectors, dtype="float32")
+        groups = {}
+        for row, meta in enumerate(metas):
+            # o chunk entra também nas partições das suas quase-duplicatas (meta["duplicates"])
+            for key in {partition_key(m, by) for m in [meta, *meta.get("duplicates", ())]}:
+                groups.setdefault(key, []).append(row)
+        out = {"built": [], "kept": [], "dropped": []}
+        for key, rows in sorted(groups.items()):
+            vecs = vectors[rows]
+            part = [metas[r] for r in rows]
+            digest = _digest(vecs, part)
+            current = self.manifest["shards"].get(key)
+            if current and current["digest"] == digest and (self.root / current["index"]).exists():
+                out["kept"].append(key)
+                continue
+            self.build_shard(key, vecs, part, digest=digest, save=False)
+            out["built"].append(key)
+        for key in self.keys():
+            if key not in groups:
+                self.drop_shard(key, save=False)
+                out["dropped"].append(key)
+        self.manifest["source"] = source
+        self.save_manifest()
+        return out
+
+    # --- busca ---
+
+    def select(self, partitions=None):
+        """Shards selecionados por `partitions` (chaves, prefixos ou trimestres; None = todos)."""
+        if not partitions:
+            return self.keys()
+        if isinstance(partitions, str):
+            partitions = [partitions]
+        return [k for k in self.keys() if any(partition_matches(k, p) for p in partitions)]
+
+    def shard(self, key):
+        s = self._shards.get(key)
+        if s is None:
+            entry = self.manifest["shards"][key]
+            s = self._shards[key] = FaissIndex(self.dim, self.root / entry["index"], self.root / entry["meta"])
+        return s
+
+    def query(self, vector, k=5, partitions=None):
+        """
+        Top-k (menor distância L2 primeiro) nos shards selecionados; cada resultado traz "shard".
+        Um chunk presente em vários shards aparece uma vez, com a menor distância.
+        """
+        keys = self.select(partitions)
+        if not keys:
+            return []
+        shards = [self.shard(key) for key in keys]  # carga na thread atual, antes do pool
+        with metrics.span("faiss.sharded_search"):
+            if len(shards) == 1:
+                found = [shards[0].query(vector, k)]
+            else:
+                fetch = k + SHARD_FETCH_MARGIN
+                found = list(_shard_pool().map(lambda s: s.query(vector, fetch), shards))
+        metrics.inc("faiss_shard_searches_total", len(keys))
+        best = {}
+        for key, res in zip(keys, found):
+            for h in res:
+                chunk = (h["meta"].get("email_id"), h["meta"].get("chunk_id"))
+                if chunk not in best or h["score"] < best[chunk]["score"]:
+                    best[chunk] = dict(h, shard=key)
+        return heapq.nsmallest(k, best.values(), key=lambda h: h["score"])
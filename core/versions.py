@@ -0,0 +1,24 @@
+# core/versions.py
+"""
+Versão dos arquivos de origem de um artefato derivado (índice, mapa, grafo, cópia de vetores, cache):
+o artefato grava a versão de quando foi montado e, na carga, compara com a atual para saber se está
+desatualizado. Só lê metadados (mtime e tamanho), nunca o conteúdo.
+"""
+import json
+from pathlib import Path
+
+def _entry(path):
+    p = Path(path)
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        return [str(p), None, None]
+    return [str(p), st.st_mtime_ns, st.st_size]
+
+def file_version(*paths):
+    """
+    JSON com (caminho, mtime_ns, tamanho) de cada arquivo; (caminho, None, None) se não existe.
+    Um caminho: a entrada dele; vários: a lista das entradas.
+    """
+    entries = [_entry(p) for p in paths]
+    return json.dumps(entries[0] if len(entries) == 1 else entries)
@@ -0,0 +1,311 @@
+# scripts/bench.py
+"""
+Benchmark ponta a ponta com dados sintéticos e modelos locais (AUDITOR_MODEL_BACKEND=fake):
+gera ledger/e-mails na escala pedida (scripts/synthetic_data.py) num diretório temporário, roda
+ingestão, regras, buscas, RAG e correlação, e produz um relatório JSON por etapa com tempo,
+vazão, latência p50/p99 e quanto o RSS subiu durante a etapa (pico da etapa menos o RSS no início dela),
+além do pico de RSS do processo inteiro. Relatórios de versões diferentes podem ser comparados
+com --compare.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+import contextlib, json, platform, resource, shutil, subprocess, tempfile, threading, time
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from core.pipeline import run_pipeline
+from core import metrics
+
+STAGES = ("generate", "ingest_transactions", "ingest_emails", "ingest_policy", "policy_map", "rules",
+          "rag_retrieve", "email_search", "rag_answer", "rag_answer_cached", "correlate")
+QUERIES = [
+    "Qual o limite para despesas sem PO?", "Itens proibidos pela política", "Regras para reembolso de refeição",
+    "Quem aprova despesas acima de 500 dólares?", "Uso do cartão corporativo", "Despesas na categoria outros",
+    "pagamento pela conta alternativa", "dividir a compra em parcelas", "apagar o recibo", "operação fênix",
+]
+
+def peak_rss_mb():
+    """Pico de RSS do processo desde o início (marca d'água: não diz qual etapa a atingiu)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def current_rss_mb():
+    """RSS atual lido de /proc/self/statm (Linux); None onde não existe."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class RssSampler:
+    """
+    Amostra o RSS atual numa thread enquanto uma etapa roda (a cada `interval` s) e guarda o valor
+    no início e o pico; picos mais curtos que o intervalo podem escapar.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start = self.peak = current_rss_mb()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        return False
+
+    def report(self):
+        if self.start is None:
+            return {"rss_start_mb": None, "rss_peak_mb": None, "rss_growth_mb": None}
+        return {"rss_start_mb": round(self.start, 1), "rss_peak_mb": round(self.peak, 1),
+                "rss_growth_mb": round(self.peak - self.start, 1)}
+
+def _timed_iter(records):
+    """Consome um gerador guardando o intervalo até cada registro (latência por registro)."""
+    latencies, t = [], time.perf_counter()
+    for _ in records:
+        now = time.perf_counter()
+        latencies.append(now - t)
+        t = now
+    return latencies
+
+def _timed_calls(fn, queries):
+    latencies = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - t)
+    return latencies
+
+def _count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+def build_stages(scale, seed, queries):
+    """Etapas do benchmark; cada uma retorna {"records", "latencies" (s, opcional), "unit"}."""
+    qs = [QUERIES[i % len(QUERIES)] for i in range(queries)]
+
+    def generate():
+        from scripts.synthetic_data import generate as gen
+        counts = gen("data", scale, seed)
+        # os scripts de ingestão criam estes diretórios no import, que pode ter ocorrido em outro cwd
+        for d in ("emails", "policy", "transactions"):
+            Path("vectorstore", d).mkdir(parents=True, exist_ok=True)
+        shutil.copy(Path(workspace_root) / "data" / "politica_compliance.txt", "data/politica_compliance.txt")
+        return {"records": counts["transactions"] + counts["emails"], "unit": "registros", **counts}
+
+    def ingest_transactions():
+        from scripts.ingest_transactions import ingest_transactions as run
+        run(chunksize=100_000 if scale > 10 else None)
+        return {"records": _count_lines("data/transacoes_normalizadas.csv") - 1, "unit": "transações"}
+
+    def ingest_emails():
+        from scripts.ingest_emails import ingest_emails as run
+        run()
+        return {"records": _count_lines("data/emails_parsed.jsonl"), "unit": "e-mails"}
+
+    def ingest_policy():
+        from scripts.ingest_policy import ingest_policy as run
+        run()
+        return {"records": 1, "unit": "documentos"}
+
+    def policy_map():
+        from core.policy_map import build_policy_map
+        return {"records": build_policy_map()["rows"], "unit": "chunks"}
+
+    def rules():
+        from agents.transaction_agent import TransactionAgent
+        agent = TransactionAgent(chunksize=100_000 if scale > 10 else None)
+        lat = _timed_iter(agent.iter_violations())
+        return {"records": len(lat), "latencies": lat, "unit": "violações"}
+
+    def rag_retrieve():
+        from agents.rag_policy_agent import RAGPolicyAgent
+        agent = RAGPolicyAgent()
+        return {"records": len(qs), "latencies": _timed_calls(agent.retrieve, qs), "unit": "consultas"}
+
+    def email_search():
+        from agents.email_agent import EmailAgent
+        agent = EmailAgent()
+        return {"records": len(qs), "latencies": _timed_calls(agent.semantic_search, qs), "unit": "consultas"}
+
+    def rag_answer():
+        # sem o cache de respostas: as consultas se repetem e, com ele, quase todas seriam hits
+        from agents.rag_policy_agent import RAGPolicyAgent
+        agent = RAGPolicyAgent(cache=False)
+        return {"records": len(qs), "latencies": _timed_calls(agent.answer, qs), "unit": "consultas"}
+
+    def rag_answer_cached():
+        # com o cache (padrão do agente), começando vazio: mede os hits das consultas repetidas
+        from agents.rag_policy_agent import RAGPolicyAgent, ANSWER_CACHE
+        ANSWER_CACHE.unlink(missing_ok=True)
+        agent = RAGPolicyAgent(cache=True)
+        return {"records": len(qs), "latencies": _timed_calls(agent.answer, qs), "unit": "consultas"}
+
+    def correlate():
+        from agents.correlation_agent import CorrelationAgent
+        agent = CorrelationAgent(chunksize=100_000 if scale > 10 else None)
+        lat = _timed_iter(agent.iter_correlations())
+        return {"records": len(lat), "latencies": lat, "unit": "correlações"}
+
+    fns = {name: fn for name, fn in locals().items() if name in STAGES}
+    deps = {
+        "ingest_transactions": ["generate"], "ingest_emails": ["generate"], "ingest_policy": ["generate"],
+        "rules": ["ingest_transactions"], "rag_retrieve": ["ingest_policy"], "email_search": ["ingest_emails"],
+        "policy_map": ["ingest_emails", "ingest_policy"],
+        "rag_answer": ["ingest_policy"], "rag_answer_cached": ["ingest_policy"], "correlate": ["ingest_transactions", "ingest_emails", "policy_map"],
+    }
+    return fns, deps
+
+def _with_rss(fn):
+    def run():
+        with RssSampler() as rss:
+            out = fn()
+        out.update(rss.report())
+        return out
+    return run
+
+def summarize(res):
+    """Resultado do run_pipeline -> entrada do relatório."""
+    entry = {"stage": res["name"], "ok": res["ok"], "seconds": round(res["seconds"], 4)}
+    if not res["ok"]:
+        entry["error"] = res["error"]
+        return entry
+    out = dict(res["result"])
+    lat = out.pop("latencies", None)
+    entry.update(out)
+    entry["throughput_per_s"] = round(out["records"] / res["seconds"], 2) if res["seconds"] > 0 else None
+    if lat:
+        ms = np.asarray(lat) * 1000
+        entry["p50_ms"] = round(float(np.percentile(ms, 50)), 3)
+        entry["p99_ms"] = round(float(np.percentile(ms, 99)), 3)
+    else:
+        entry["p50_ms"] = entry["p99_ms"] = None
+    return entry
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=workspace_root)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_bench(scale=1, seed=0, stages=None, queries=50, keep=False, on_finish=None):
+    """
+    Executa o benchmark num diretório temporário (os caminhos do projeto são relativos ao cwd)
+    e retorna o relatório. `stages` restringe as etapas (as dependências entram automaticamente).
+    """
+    fns, deps = build_stages(scale, seed, queries)
+    wanted = set(stages or STAGES)
+    # inclui as dependências das etapas pedidas
+    pending = list(wanted)
+    while pending:
+        for d in deps.get(pending.pop(), ()):
+            if d not in wanted:
+                wanted.add(d)
+                pending.append(d)
+    selected = [{"name": n, "fn": _with_rss(fns[n]), "deps": [d for d in deps.get(n, ()) if d in wanted]}
+                for n in STAGES if n in wanted]
+
+    env_before = {k: os.environ.get(k) for k in ("AUDITOR_MODEL_BACKEND",)}
+    os.environ["AUDITOR_MODEL_BACKEND"] = "fake"
+    metrics.METRICS.reset()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="auditor-bench-")
+    os.chdir(workdir)
+    try:
+        # max_workers=1: as etapas rodam uma de cada vez para que tempo e RSS não se misturem
+        # o que as etapas imprimem vai para o stderr: o stdout pode ser o relatório JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run_pipeline(selected, max_workers=1, on_finish=on_finish)
+    finally:
+        os.chdir(cwd)
+        for k, v in env_before.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "seed": seed,
+        "queries": queries,
+        "backend": "fake",
+        "workdir": workdir if keep else None,
+        "stages": [summarize(r) for r in results],
+        "peak_rss_mb": peak_rss_mb(),
+        # spans/contadores de core/metrics.py (onde o tempo de cada etapa foi gasto)
+        "metrics": metrics.METRICS.snapshot(),
+    }
+
+def compare(report, baseline):
+    """Variação percentual de tempo e vazão por etapa em relação a um relatório anterior."""
+    base = {s["stage"]: s for s in baseline.get("stages", []) if s.get("ok")}
+    rows = []
+    for s in report["stages"]:
+        b = base.get(s["stage"])
+        if not s.get("ok") or b is None:
+            continue
+        def delta(key):
+            if not b.get(key) or s.get(key) is None:
+                return None
+            return round((s[key] - b[key]) / b[key] * 100, 1)
+        rows.append({"stage": s["stage"], "seconds_pct": delta("seconds"),
+                     "throughput_pct": delta("throughput_per_s"), "p99_pct": delta("p99_ms")})
+    return rows
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Benchmark com dados sintéticos e modelos locais")
+    ap.add_argument("--scale", type=float, default=1, help="fator de escala dos dados (1 a 1000)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stages", default=None, help=f"etapas separadas por vírgula ({','.join(STAGES)})")
+    ap.add_argument("--queries", type=int, default=50, help="consultas nas etapas de busca/RAG")
+    ap.add_argument("--out", default=None, help="grava o relatório JSON neste arquivo (padrão: stdout)")
+    ap.add_argument("--compare", default=None, help="relatório JSON anterior para comparação")
+    ap.add_argument("--keep", action="store_true", help="mantém o diretório temporário com os dados gerados")
+    args = ap.parse_args(argv)
+    stages = args.stages.split(",") if args.stages else None
+    unknown = [s for s in stages or () if s not in STAGES]
+    if unknown:
+        ap.error(f"etapas desconhecidas: {', '.join(unknown)}")
+    report = run_bench(args.scale, args.seed, stages, args.queries, args.keep)
+    if args.compare:
+        report["compare"] = {"baseline": args.compare,
+                             "stages": compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0 if all(s["ok"] for s in report["stages"]) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# scripts/bench_chunker.py
+"""
+Compara core.chunking.TextChunker com o RecursiveCharacterTextSplitter do langchain:
+- confere que os chunks são idênticos na política (800/120) e nos corpos de e-mail (600/80)
+- mede o tempo de import de cada um (num processo novo) e o tempo de chunking
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+import json, subprocess, time
+from pathlib import Path
+from core.chunking import TextChunker
+
+POLICY = Path("data/politica_compliance.txt")
+PARSED = Path("data/emails_parsed.jsonl")
+CASES = [("política", 800, 120), ("e-mails", 600, 80)]
+
+def load_corpus():
+    bodies = []
+    if PARSED.exists():
+        with PARSED.open("r", encoding="utf-8") as fo:
+            bodies = [json.loads(l).get("body") or "" for l in fo]
+    return {"política": [POLICY.read_text(encoding="utf-8")], "e-mails": bodies}
+
+def import_seconds(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=workspace_root)
+    return float(out.stdout) if out.returncode == 0 else None
+
+def chunk_seconds(split, texts, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            split(t)
+    return (time.perf_counter() - t0) / repeat
+
+def main(repeat=20):
+    corpus = load_corpus()
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        RecursiveCharacterTextSplitter = None
+        print("langchain_text_splitters não instalado: só o chunker nativo será medido")
+
+    t = import_seconds("core.chunking")
+    print(f"import core.chunking: {t * 1000:.1f} ms")
+    if RecursiveCharacterTextSplitter:
+        t = import_seconds("langchain_text_splitters")
+        print(f"import langchain_text_splitters: {t * 1000:.1f} ms")
+
+    ok = True
+    for name, size, overlap in CASES:
+        texts = corpus[name]
+        native = TextChunker(size, overlap)
+        n_chunks = sum(len(native.split_text(t)) for t in texts)
+        line = f"{name} ({size}/{overlap}, {len(texts)} textos, {n_chunks} chunks): nativo {chunk_seconds(native.split_text, texts, repeat) * 1000:.2f} ms"
+        if RecursiveCharacterTextSplitter:
+            ref = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
+            same = all(ref.split_text(t) == native.split_text(t) for t in texts)
+            ok &= same
+            line += f", langchain {chunk_seconds(ref.split_text, texts, repeat) * 1000:.2f} ms, idênticos: {'sim' if same else 'NÃO'}"
+        print(line)
+    return ok
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Benchmark do chunker nativo contra o RecursiveCharacterTextSplitter")
+    ap.add_argument("--repeat", type=int, default=20, help="repetições de cada medição de chunking")
+    args = ap.parse_args()
+    sys.exit(0 if main(repeat=args.repeat) else 1)
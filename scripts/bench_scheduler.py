@@ -0,0 +1,116 @@
+# scripts/bench_scheduler.py
+"""
+Exercita o agendador (core/scheduler.py) contra o provedor fake com cotas configuráveis
+(AUDITOR_FAKE_RPM/TPM/CONCURRENCY em core/fake_models.py), sem rede:
+- carga bulk (lotes de ingestão em várias threads) e, ao mesmo tempo, consultas interativas
+- compara chamadas diretas (sem agendador: 429 viram falhas) com o agendador, com a cota
+  conhecida (--rpm) ou desconhecida (só backoff + concorrência adaptativa)
+Mostra vazão, 429 recebidos, falhas e latência p50/p99 das consultas interativas.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core.fake_models import fake_embed
+from core.scheduler import Scheduler, is_rate_limited
+
+TEXT = "Pagamento ao fornecedor pela conta alternativa, dividir a compra em parcelas menores. " * 4
+
+def run(mode, bulk, interactive, workers, batch, rpm, concurrency):
+    """mode: "direct" (sem agendador) ou "scheduler". Retorna o resumo da rodada."""
+    sched = Scheduler("bench", rpm=rpm, max_concurrency=concurrency, base_delay=0.05, max_delay=2.0)
+    counts = {"ok": 0, "failed": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    def provider(texts):
+        try:
+            return fake_embed(texts)
+        except Exception as e:
+            if is_rate_limited(e):
+                with lock:
+                    counts["throttled"] += 1
+            raise
+
+    def call(texts, priority):
+        try:
+            if mode == "direct":
+                provider(texts)
+            else:
+                sched.call(lambda: provider(texts), priority=priority)
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            counts["ok" if ok else "failed"] += 1
+        return ok
+
+    latencies = []
+
+    def interactive_loop():
+        # consultas espaçadas, como um auditor usando o RAG enquanto a ingestão roda
+        for _ in range(interactive):
+            t = time.perf_counter()
+            if call([TEXT], "interactive"):
+                latencies.append(time.perf_counter() - t)
+            time.sleep(0.05)
+
+    t0 = time.perf_counter()
+    probe = threading.Thread(target=interactive_loop)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(call, [TEXT] * batch, "bulk") for _ in range(bulk)]
+        probe.start()
+        for f in futures:
+            f.result()
+    probe.join()
+    wall = time.perf_counter() - t0
+    ms = np.asarray(latencies) * 1000
+    return {
+        "mode": mode if mode == "direct" else f"scheduler (rpm={rpm or 'desconhecido'})",
+        "seconds": wall,
+        "calls_ok": counts["ok"],
+        "failed": counts["failed"],
+        "throttled": counts["throttled"],
+        "throughput": counts["ok"] / wall,
+        "interactive_p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+        "interactive_p99_ms": float(np.percentile(ms, 99)) if len(ms) else None,
+        "final_concurrency": sched.limit if mode != "direct" else workers,
+    }
+
+def main(bulk=120, interactive=20, workers=16, batch=20, fake_rpm=1200, fake_concurrency=4, latency_ms=30, concurrency=8):
+    os.environ.update({
+        "AUDITOR_FAKE_RPM": str(fake_rpm),
+        "AUDITOR_FAKE_CONCURRENCY": str(fake_concurrency),
+        "AUDITOR_FAKE_LATENCY_MS": str(latency_ms),
+    })
+    print(f"Provedor fake: {fake_rpm} req/min, capacidade {fake_concurrency} chamadas, {latency_ms} ms por chamada")
+    print(f"Carga: {bulk} lotes bulk de {batch} textos em {workers} threads + {interactive} consultas interativas\n")
+    rows = []
+    for mode, rpm in (("direct", 0), ("scheduler", 0), ("scheduler", fake_rpm)):
+        # espera o balde do fake encher de novo entre as rodadas
+        time.sleep(1.0)
+        rows.append(run(mode, bulk, interactive, workers, batch, rpm, concurrency))
+    fmt = lambda v: "-" if v is None else f"{v:.1f}"
+    print(f"{'modo':<32}{'tempo(s)':>9}{'ok':>6}{'falhas':>8}{'429':>6}{'chamadas/s':>12}{'p50 int.(ms)':>14}{'p99 int.(ms)':>14}{'conc.':>7}")
+    for r in rows:
+        print(f"{r['mode']:<32}{r['seconds']:>9.2f}{r['calls_ok']:>6}{r['failed']:>8}{r['throttled']:>6}"
+              f"{r['throughput']:>12.1f}{fmt(r['interactive_p50_ms']):>14}{fmt(r['interactive_p99_ms']):>14}{r['final_concurrency']:>7}")
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Agendador de chamadas contra o provedor fake com cotas")
+    ap.add_argument("--bulk", type=int, default=120, help="lotes da carga bulk")
+    ap.add_argument("--interactive", type=int, default=20, help="consultas interativas durante a carga")
+    ap.add_argument("--workers", type=int, default=16, help="threads da carga bulk")
+    ap.add_argument("--batch", type=int, default=20, help="textos por lote")
+    ap.add_argument("--fake-rpm", type=int, default=1200, help="cota de requisições/minuto do provedor fake")
+    ap.add_argument("--fake-concurrency", type=int, default=4, help="chamadas simultâneas antes de a latência do fake crescer")
+    ap.add_argument("--latency-ms", type=float, default=30, help="latência de cada chamada do fake")
+    ap.add_argument("--concurrency", type=int, default=8, help="concorrência máxima do agendador")
+    args = ap.parse_args()
+    main(args.bulk, args.interactive, args.workers, args.batch, args.fake_rpm, args.fake_concurrency,
+         args.latency_ms, args.concurrency)
@@ -0,0 +1,83 @@
+# scripts/bench_startup.py
+"""
+Latência de inicialização a frio de cada comando do CLI, medida com `python -X importtime`:
+para cada comando, um processo novo importa cli/run.py e tudo o que o comando carrega antes
+de começar a trabalhar (agente, SDK do Gemini quando usado). Mostra o tempo total de import,
+o tempo de parede do processo e os imports mais pesados.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+import json, subprocess, time
+
+# comando -> código executado depois de `import cli.run` (o que o comando importa ao rodar)
+COMMANDS = {
+    "help": "",  # run.py --help (só o CLI)
+    "ingest": "from scripts.ingest_all import build_stages; build_stages(); from core.gemini import client; client()",
+    "rag": "from agents.rag_policy_agent import RAGPolicyAgent; import core.vectorstore; from core.gemini import client; client()",
+    "emails": "from agents.email_agent import EmailAgent; import core.vectorstore; from core.gemini import client; client()",
+    "transactions": "from agents.transaction_agent import TransactionAgent",
+    "correlate": "from agents.correlation_agent import CorrelationAgent",
+}
+WATCH = ("google.generativeai", "faiss", "pandas", "numpy", "dateutil", "pyarrow")
+
+def parse_importtime(stderr):
+    """Linhas de -X importtime -> lista de (módulo, self_us, cumulativo_us, nível)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        level = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), level))
+    return rows
+
+def measure(command, code):
+    script = "import cli.run" + (f"; {code}" if code else "")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                         capture_output=True, text=True, cwd=workspace_root)
+    wall = time.perf_counter() - t0
+    if out.returncode != 0:
+        raise RuntimeError(f"{command}: falhou\n{out.stderr[-2000:]}")
+    rows = parse_importtime(out.stderr)
+    # o nível mínimo é o dos imports de topo (a indentação do -X importtime começa em 1)
+    top = min((r[3] for r in rows), default=0)
+    top_rows = [r for r in rows if r[3] == top]
+    loaded = {r[0] for r in rows}
+    return {
+        "command": command,
+        "import_ms": round(sum(r[2] for r in top_rows) / 1000, 1),
+        "wall_ms": round(wall * 1000, 1),
+        "heaviest": [[r[0], round(r[2] / 1000, 1)] for r in sorted(top_rows, key=lambda r: -r[2])[:5]],
+        "loads": [m for m in WATCH if m in loaded],
+    }
+
+def main(repeat=3, commands=None, as_json=False):
+    report = []
+    for command in commands or COMMANDS:
+        # melhor de `repeat` execuções (a primeira costuma pagar cache de disco/.pyc)
+        runs = [measure(command, COMMANDS[command]) for _ in range(repeat)]
+        report.append(min(runs, key=lambda r: r["import_ms"]))
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return report
+    for r in report:
+        print(f"{r['command']:<13} import {r['import_ms']:>8.1f} ms   processo {r['wall_ms']:>8.1f} ms   "
+              f"carrega: {', '.join(r['loads']) or '-'}")
+        print("              mais pesados: " + ", ".join(f"{m} {ms:.0f} ms" for m, ms in r["heaviest"]))
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Mede o tempo de import a frio de cada comando do CLI")
+    ap.add_argument("commands", nargs="*", metavar="COMANDO", help=f"comandos a medir (padrão: todos): {', '.join(COMMANDS)}")
+    ap.add_argument("--repeat", type=int, default=3, help="execuções por comando (vale a melhor)")
+    ap.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = ap.parse_args()
+    unknown = [c for c in args.commands if c not in COMMANDS]
+    if unknown:
+        ap.error(f"comandos desconhecidos: {', '.join(unknown)}")
+    main(repeat=args.repeat, commands=args.commands or None, as_json=args.json)
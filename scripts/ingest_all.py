@@ -0,0 +1,51 @@
+# scripts/ingest_all.py
+"""
+Pipeline de ingestão completo, num único processo: política, e-mails e transações rodam
+em paralelo (não dependem entre si) e compartilham o mesmo cliente/pool de embeddings.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from core.pipeline import run_pipeline
+
+def build_stages(chunksize=None, incremental=False):
+    """Etapas da ingestão e suas dependências (DAG)."""
+    from scripts.ingest_policy import ingest_policy
+    from scripts.ingest_emails import ingest_emails
+    from scripts.ingest_transactions import ingest_transactions
+    from scripts.ingest_policy_map import ingest_policy_map
+    from scripts.ingest_graph import ingest_graph
+    from scripts.ingest_email_shards import ingest_email_shards
+    from scripts.ingest_tx_index import ingest_tx_index
+    from scripts.ingest_tx_semantic import ingest_tx_semantic
+    return [
+        {"name": "Policy", "fn": ingest_policy},
+        {"name": "Emails", "fn": ingest_emails, "kwargs": {"incremental": incremental}},
+        {"name": "Transactions", "fn": ingest_transactions, "kwargs": {"chunksize": chunksize}},
+        # só lê os vetores já indexados: nenhuma chamada remota
+        {"name": "PolicyMap", "fn": ingest_policy_map, "deps": ["Policy", "Emails"]},
+        {"name": "Graph", "fn": ingest_graph, "deps": ["Emails"]},
+        {"name": "EmailShards", "fn": ingest_email_shards, "deps": ["Emails"]},
+        {"name": "TxIndex", "fn": ingest_tx_index, "deps": ["Transactions"]},
+        # embeda só as descrições fora do cache
+        {"name": "TxSemantic", "fn": ingest_tx_semantic, "deps": ["Transactions", "Emails"]},
+    ]
+
+def ingest_all(chunksize=None, incremental=False, on_start=None, on_finish=None):
+    return run_pipeline(build_stages(chunksize, incremental), on_start=on_start, on_finish=on_finish)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Ingestão completa (política, e-mails, transações, mapa e-mail -> política, grafo de comunicação, shards de e-mail, índice e vetores de transações)")
+    ap.add_argument("--chunksize", type=int, default=None, help="processa o CSV de transações em pedaços de N linhas")
+    ap.add_argument("--incremental", action="store_true", help="e-mails: embeda só chunks novos/alterados")
+    args = ap.parse_args()
+    results = ingest_all(chunksize=args.chunksize, incremental=args.incremental)
+    for r in results:
+        status = "OK" if r["ok"] else "FALHOU"
+        print(f"{r['name']}: {status} ({r['seconds']:.2f}s)")
+        if not r["ok"]:
+            print(r["error"], file=sys.stderr)
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
@@ -0,0 +1,37 @@
+# scripts/ingest_email_shards.py
+"""
+Etapa da ingestão que depende de Emails: reparte o índice de e-mails em shards por partição
+(core/vectorstore.py, ShardedFaissIndex) em vectorstore/emails/shards/, a partir dos vetores já
+indexados (sem chamadas remotas). Só os shards cujo conteúdo mudou são regravados: e-mails de um
+mês novo geram um shard novo sem reconstruir os outros.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from core.vectorstore import FaissIndex, ShardedFaissIndex, PARTITIONS
+from core.versions import file_version
+from agents.email_agent import VSTORE_INDEX as EMAIL_INDEX, VSTORE_META as EMAIL_META, SHARD_DIR, SHARD_BY
+
+def ingest_email_shards(by=SHARD_BY):
+    if by == "none":
+        print("Shards de e-mail desligados (AUDITOR_EMAIL_SHARD_BY=none)")
+        return {"shards": 0}
+    if not EMAIL_INDEX.exists():
+        raise RuntimeError(f"{EMAIL_INDEX} não encontrado. Execute scripts/ingest_emails.py primeiro.")
+    store = FaissIndex(1536, EMAIL_INDEX, EMAIL_META)
+    live = [i for i in range(len(store.meta)) if i not in store.deleted]
+    vectors = store.vectors(live) if len(live) < len(store.meta) else store.all_vectors()
+    shards = ShardedFaissIndex(SHARD_DIR, store.index.d, by=by)
+    out = shards.sync(vectors, [store.meta[i] for i in live], by=by, source=file_version(EMAIL_INDEX))
+    print(f"Shards de e-mail por {by}: {len(shards.keys())} shards, {len(out['built'])} gravados, "
+          f"{len(out['kept'])} mantidos, {len(out['dropped'])} removidos -> {SHARD_DIR}")
+    return {"shards": len(shards.keys()), **{k: len(v) for k, v in out.items()}}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Shards do índice de e-mails por partição (mês, trimestre, ano)")
+    ap.add_argument("--by", default=SHARD_BY, choices=PARTITIONS + ("none",), help="chave de partição dos shards")
+    args = ap.parse_args()
+    ingest_email_shards(args.by)
@@ -2,6 +2,11 @@
 """
 Faz o parsing de data/emails.txt para JSONL e indexa corpos de e-mail em vectorstore/emails.
 Pressupõe que os e-mails em emails.txt estão separados por linhas começando com '----' ou blocos "De:".
+Modo incremental (--incremental): cada e-mail recebe um id derivado do conteúdo e um manifesto
+guarda o hash de cada chunk indexado; só chunks novos/alterados são embedados e anexados ao
+índice, chunks que sumiram são marcados como removidos e uma compactação periódica os elimina.
+Quase-duplicatas (encaminhamentos, citações, textos padrão) são detectadas por MinHash/LSH: o chunk
+não é embedado de novo, fica ligado ao chunk canônico (meta["duplicates"]) e a busca o expande.
 """
 import sys, os
 # Adiciona a raiz do workspace ao path do Python
@@ -9,10 +14,13 @@ workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, workspace_root)
 
 from pathlib import Path
-import re, json
-from core.embeddings import embed_text
+import re, json, hashlib, mmap
+from collections import deque
+from core.embeddings import embed_texts, submit_embed, EMBED_BATCH, EMBED_WORKERS
 from core.vectorstore import FaissIndex
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from core.dedup import LSHIndex
+from core.chunking import TextChunker
+from core import metrics
 
 DATA_DIR = Path("data")
 RAW = DATA_DIR / "emails.txt"  # uploaded as emails.txt. :contentReference[oaicite:2]{index=2}
@@ -21,66 +29,323 @@ VSTORE_DIR = Path("vectorstore/emails")
 VSTORE_DIR.mkdir(parents=True, exist_ok=True)
 INDEX_PATH = VSTORE_DIR / "emails.index"
 META_PATH = VSTORE_DIR / "emails.meta.pkl"
+MANIFEST_PATH = VSTORE_DIR / "emails.manifest.json"
+LSH_PATH = VSTORE_DIR / "emails.lsh.pkl"
+DEDUP_THRESHOLD = 0.85  # Jaccard estimado (shingles de 5 caracteres) a partir do qual o chunk é duplicata
+COMPACT_RATIO = 0.25  # compacta quando mais de 25% das linhas do índice estão removidas
+MAX_IN_FLIGHT = 2 * EMBED_WORKERS  # lotes de embedding pendentes enquanto o parsing continua
 
-def parse_raw_emails(raw_text):
-    # Divide por padrão: De: (dataset em Português). Vamos criar seções por ocorrências de 'De:'.
-    parts = re.split(r"\n-{3,}\n", raw_text)
-    emails = []
-    fallback_id = 0
+def email_uid(e):
+    """Id estável derivado do conteúdo (cabeçalhos + corpo)."""
+    key = "\x1f".join(str(e.get(k) or "") for k in ("from", "to", "date", "subject", "body"))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def chunk_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# separador entre mensagens e cabeçalhos (no início da linha), compilados uma única vez
+SEPARATOR = re.compile(rb"\n-{3,}\n")
+HEADER = re.compile(r"^(De|Para|Data|Assunto):[ \t]*(.*)(?:\n|$)", re.M)
+HEADER_FIELDS = {"De": "from", "Para": "to", "Data": "date", "Assunto": "subject"}
+
+def parse_email(part):
+    """
+    Uma mensagem (texto entre separadores) -> dict sem id.
+    Cabeçalhos e corpo numa única passada: cada linha de cabeçalho casada é extraída
+    (vale a primeira ocorrência de cada campo) e o corpo é o texto entre elas.
+    """
+    email = {"id": None, "from": None, "to": None, "date": None, "subject": None}
+    body, pos = [], 0
+    for m in HEADER.finditer(part):
+        field = HEADER_FIELDS[m.group(1)]
+        if email[field] is None:
+            email[field] = m.group(2).strip() or None
+        body.append(part[pos:m.start()])
+        pos = m.end()
+    body.append(part[pos:])
+    email["body"] = "".join(body).strip()
+    return email
+
+def _with_ids(parts):
+    seen = {}
     for part in parts:
         part = part.strip()
         if not part:
             continue
-        # Extrai cabeçalhos: De:, Para:, Data:, Assunto:
-        m_from = re.search(r"De:\s*(.*)", part)
-        m_to = re.search(r"Para:\s*(.*)", part)
-        m_date = re.search(r"Data:\s*(.*)", part)
-        m_subject = re.search(r"Assunto:\s*(.*)", part)
-        # corpo é tudo após a primeira linha em branco seguindo a linha de Assunto
-        # extração simples do corpo:
-        body = part
-        # remove linhas de cabeçalho
-        body = re.sub(r"De:.*\n", "", body)
-        body = re.sub(r"Para:.*\n", "", body)
-        body = re.sub(r"Data:.*\n", "", body)
-        body = re.sub(r"Assunto:.*\n", "", body)
-        body = body.strip()
-        email = {
-            "id": fallback_id,
-            "from": m_from.group(1).strip() if m_from else None,
-            "to": m_to.group(1).strip() if m_to else None,
-            "date": m_date.group(1).strip() if m_date else None,
-            "subject": m_subject.group(1).strip() if m_subject else None,
-            "body": body
-        }
-        emails.append(email)
-        fallback_id += 1
-    return emails
-
-def ingest_emails():
-    raw = RAW.read_text(encoding="utf-8")
-    emails = parse_raw_emails(raw)
-    # escreve jsonl
-    with PARSED.open("w", encoding="utf-8") as fo:
-        for e in emails:
-            fo.write(json.dumps(e, ensure_ascii=False) + "\n")
-    # cria embeddings por chunk do corpo (divide corpos longos)
-    vectors = []
-    metas = []
-    splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=80)
+        email = parse_email(part)
+        uid = email_uid(email)
+        # e-mails idênticos repetidos no dump recebem sufixo pela ordem de ocorrência
+        seen[uid] = seen.get(uid, 0) + 1
+        email["id"] = uid if seen[uid] == 1 else f"{uid}-{seen[uid]}"
+        yield email
+
+def iter_raw_parts(path):
+    """Gera o texto de cada mensagem do dump lendo o arquivo via mmap (sem carregá-lo inteiro)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            for m in SEPARATOR.finditer(mm):
+                yield mm[pos:m.start()].decode("utf-8")
+                pos = m.end()
+            yield mm[pos:].decode("utf-8")
+
+def iter_raw_emails(path):
+    """Gera os e-mails parseados de um dump, um por vez, em memória limitada."""
+    yield from _with_ids(iter_raw_parts(path))
+
+def parse_raw_emails(raw_text):
+    # Divide por padrão: linhas de '---' entre as mensagens (dataset em Português).
+    parts = SEPARATOR.split(raw_text.encode("utf-8"))
+    return list(_with_ids(p.decode("utf-8") for p in parts))
+
+def iter_chunks(emails):
+    """Divide os corpos em chunks; gera os metadados de cada chunk (sem vetor)."""
+    splitter = TextChunker(chunk_size=600, chunk_overlap=80)
     for e in emails:
         chunks = splitter.split_text(e["body"] or "")
         for i, chunk in enumerate(chunks):
-            vec = embed_text(chunk)
-            vectors.append(vec)
-            metas.append({"source":"emails.txt","email_id":e["id"],"chunk_id":i,"text":chunk,"subject":e.get("subject"),"from":e.get("from"),"date":e.get("date")})
-    if len(vectors)==0:
+            yield {"source":"emails.txt","email_id":e["id"],"chunk_id":i,"text":chunk,"subject":e.get("subject"),"from":e.get("from"),"date":e.get("date")}
+
+def chunk_emails(emails):
+    return list(iter_chunks(emails))
+
+def write_parsed(emails):
+    """Repassa os e-mails adiante gravando o JSONL no caminho; o arquivo só é trocado no fim."""
+    tmp = PARSED.with_suffix(".jsonl.tmp")
+    with tmp.open("w", encoding="utf-8") as fo:
+        for e in emails:
+            fo.write(json.dumps(e, ensure_ascii=False) + "\n")
+            yield e
+    tmp.replace(PARSED)
+
+def _chunk_key(meta):
+    return f"{meta['email_id']}:{meta['chunk_id']}"
+
+def link_duplicate(canonical, meta, h):
+    """Liga o chunk `meta` (não indexado) ao chunk canônico; o hash permite detectar se a cópia mudou."""
+    canonical.setdefault("duplicates", []).append(
+        {"email_id": meta["email_id"], "chunk_id": meta["chunk_id"], "subject": meta.get("subject"),
+         "from": meta.get("from"), "date": meta.get("date"), "hash": h})
+
+def unlink_duplicate(canonical, key):
+    dups = [d for d in canonical.get("duplicates", []) if _chunk_key(d) != key]
+    if dups:
+        canonical["duplicates"] = dups
+    else:
+        canonical.pop("duplicates", None)
+
+def manifest_from_meta(fi):
+    """
+    Manifesto {chave do chunk: {"row", "hash"}} reconstruído dos metadados; duplicatas apontam para a
+    linha do canônico e levam "dup_of" com a chave dele.
+    """
+    manifest = {}
+    for i, m in enumerate(fi.meta):
+        if i in fi.deleted:
+            continue
+        key = _chunk_key(m)
+        manifest[key] = {"row": i, "hash": chunk_hash(m["text"])}
+        for d in m.get("duplicates", ()):
+            manifest[_chunk_key(d)] = {"row": i, "hash": d["hash"], "dup_of": key}
+    return manifest
+
+def load_manifest(fi):
+    """Manifesto salvo, ou reconstruído dos metadados se o arquivo não existir ou não bater com o índice."""
+    if MANIFEST_PATH.exists():
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))["chunks"]
+        if sum(1 for e in manifest.values() if "dup_of" not in e) == len(fi.meta) - len(fi.deleted):
+            return manifest
+    return manifest_from_meta(fi)
+
+def save_manifest(manifest):
+    tmp = MANIFEST_PATH.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"version": 1, "chunks": manifest}, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(MANIFEST_PATH)
+
+def load_lsh(fi):
+    """Índice LSH dos chunks canônicos vivos; reconstruído dos textos se não houver um salvo."""
+    lsh = LSHIndex.load(LSH_PATH)
+    if lsh is None or len(lsh.signatures) != len(fi.meta) - len(fi.deleted):
+        lsh = LSHIndex()
+        for i, m in enumerate(fi.meta):
+            if i not in fi.deleted:
+                lsh.insert(_chunk_key(m), lsh.hasher.signature(m["text"]))
+    return lsh
+
+def update_index(metas, compact=False):
+    """
+    Sincroniza o índice existente com `metas`: embeda só chunks novos/alterados (reaproveitando
+    vetores de textos idênticos já indexados e ligando quase-duplicatas ao canônico), anexa-os e
+    marca como removidos os que sumiram.
+    """
+    fi = FaissIndex(0, INDEX_PATH, META_PATH)
+    manifest = load_manifest(fi)
+    lsh = load_lsh(fi)
+    current = {_chunk_key(m): m for m in metas}
+    hashes = {k: chunk_hash(m["text"]) for k, m in current.items()}
+
+    stale = {k for k, entry in manifest.items() if hashes.get(k) != entry["hash"]}
+    fresh = {k for k in current if k not in manifest or manifest[k]["hash"] != hashes[k]}
+    live_by_hash = {e["hash"]: e["row"] for e in manifest.values() if "dup_of" not in e}
+
+    stale_rows = []
+    for k in stale:
+        entry = manifest.pop(k)
+        if "dup_of" in entry:
+            if entry["dup_of"] not in stale:
+                unlink_duplicate(fi.meta[entry["row"]], k)
+            continue
+        stale_rows.append(entry["row"])
+        lsh.remove(k)
+        # cópias que continuam iguais perdem o canônico e voltam a ser processadas
+        for d in fi.meta[entry["row"]].get("duplicates", ()):
+            dk = _chunk_key(d)
+            if dk not in stale:
+                manifest.pop(dk, None)
+                fresh.add(dk)
+
+    # ordem do dump, para que o canônico seja sempre a primeira ocorrência
+    linked, reuse, to_embed = {}, [], []
+    for k in (k for k in current if k in fresh):
+        sig = lsh.hasher.signature(current[k]["text"])
+        match = lsh.best_match(sig, DEDUP_THRESHOLD)
+        if match:
+            linked[k] = match[0]
+            continue
+        lsh.insert(k, sig)
+        (reuse if hashes[k] in live_by_hash else to_embed).append(k)
+
+    vectors = list(fi.vectors([live_by_hash[hashes[k]] for k in reuse]))
+    vectors += embed_texts([current[k]["text"] for k in to_embed])
+    rows = fi.append(vectors, [current[k] for k in reuse + to_embed], save=False)
+    for k, row in zip(reuse + to_embed, rows):
+        manifest[k] = {"row": row, "hash": hashes[k]}
+    for k, canon in linked.items():
+        row = manifest[canon]["row"]
+        link_duplicate(fi.meta[row], current[k], hashes[k])
+        manifest[k] = {"row": row, "hash": hashes[k], "dup_of": canon}
+    if stale_rows:
+        fi.tombstone(stale_rows)
+    else:
+        fi.save()
+
+    compacted = False
+    if fi.meta and (compact or len(fi.deleted) > COMPACT_RATIO * len(fi.meta)):
+        remap = fi.compact()
+        manifest = {k: dict(e, row=remap[e["row"]]) for k, e in manifest.items()}
+        compacted = True
+    save_manifest(manifest)
+    lsh.save(LSH_PATH)
+    metrics.inc("cache_hits_total", len(reuse), cache="email_embeddings")
+    metrics.inc("cache_misses_total", len(to_embed), cache="email_embeddings")
+    metrics.inc("dedup_linked_total", len(linked))
+    print(f"Incremental: {len(to_embed)} chunks embedados, {len(reuse)} reaproveitados, "
+          f"{len(linked)} ligados a duplicatas, {len(stale_rows)} removidos"
+          f"{' (índice compactado)' if compacted else ''}; "
+          f"{len(fi.meta) - len(fi.deleted)} chunks ativos em {INDEX_PATH}")
+
+def append_chunks(metas, fi, manifest, lsh, priority="bulk"):
+    """
+    Anexa ao índice só chunks novos (e-mails acrescentados ao dump, ex.: `watch`), com o índice,
+    o manifesto e o LSH já carregados: quase-duplicatas são ligadas ao canônico, textos idênticos
+    reaproveitam o vetor e o resto é embedado. Grava índice, manifesto e LSH.
+    Retorna {"embedded", "reused", "linked"}.
+    """
+    live_by_hash = {e["hash"]: e["row"] for e in manifest.values() if "dup_of" not in e}
+    linked, reuse, to_embed = {}, [], []
+    for meta in metas:
+        k, h = _chunk_key(meta), chunk_hash(meta["text"])
+        if k in manifest:
+            continue
+        sig = lsh.hasher.signature(meta["text"])
+        match = lsh.best_match(sig, DEDUP_THRESHOLD)
+        if match:
+            linked[k] = (match[0], meta, h)
+            continue
+        lsh.insert(k, sig)
+        (reuse if h in live_by_hash else to_embed).append((k, meta, h))
+    vectors = list(fi.vectors([live_by_hash[h] for _, _, h in reuse]))
+    vectors += embed_texts([m["text"] for _, m, _ in to_embed], priority=priority)
+    rows = fi.append(vectors, [m for _, m, _ in reuse + to_embed], save=False)
+    for (k, _, h), row in zip(reuse + to_embed, rows):
+        manifest[k] = {"row": row, "hash": h}
+    for k, (canon, meta, h) in linked.items():
+        row = manifest[canon]["row"]
+        link_duplicate(fi.meta[row], meta, h)
+        manifest[k] = {"row": row, "hash": h, "dup_of": canon}
+    fi.save()
+    save_manifest(manifest)
+    lsh.save(LSH_PATH)
+    metrics.inc("cache_hits_total", len(reuse), cache="email_embeddings")
+    metrics.inc("cache_misses_total", len(to_embed), cache="email_embeddings")
+    metrics.inc("dedup_linked_total", len(linked))
+    return {"embedded": len(to_embed), "reused": len(reuse), "linked": len(linked)}
+
+def build_index(metas):
+    """
+    Reconstrói o índice em pipeline: enquanto o parsing/chunking avança, lotes de EMBED_BATCH
+    chunks são embedados no embed_pool() (no máximo MAX_IN_FLIGHT lotes pendentes) e
+    anexados ao índice na ordem em que foram gerados. Quase-duplicatas de um chunk já visto
+    não entram nos lotes: ficam ligadas ao canônico. Retorna (índice, LSH, nº de duplicatas).
+    """
+    fi = FaissIndex(0, INDEX_PATH, META_PATH)
+    fi.reset()
+    lsh = LSHIndex()
+    canonical = {}
+    pending = deque()
+
+    def drain():
+        batch, future = pending.popleft()
+        fi.append(future.result(), batch, save=False)
+
+    batch, n_dups = [], 0
+    for meta in metas:
+        sig = lsh.hasher.signature(meta["text"])
+        match = lsh.best_match(sig, DEDUP_THRESHOLD)
+        if match:
+            # o dict do canônico é o mesmo que vai para fi.meta, mesmo que o lote ainda esteja pendente
+            link_duplicate(canonical[match[0]], meta, chunk_hash(meta["text"]))
+            n_dups += 1
+            continue
+        key = _chunk_key(meta)
+        lsh.insert(key, sig)
+        canonical[key] = meta
+        batch.append(meta)
+        if len(batch) == EMBED_BATCH:
+            pending.append((batch, submit_embed([m["text"] for m in batch])))
+            batch = []
+            while len(pending) > MAX_IN_FLIGHT:
+                drain()
+    if batch:
+        pending.append((batch, submit_embed([m["text"] for m in batch])))
+    while pending:
+        drain()
+    return fi, lsh, n_dups
+
+def ingest_emails(incremental=False, compact=False):
+    # parsing em streaming: o dump é lido via mmap e cada e-mail segue direto para o JSONL e o chunking
+    emails = write_parsed(iter_raw_emails(RAW))
+    # cria embeddings por chunk do corpo (divide corpos longos)
+    if incremental and INDEX_PATH.exists() and META_PATH.exists():
+        update_index(chunk_emails(emails), compact=compact)
+        return
+    fi, lsh, n_dups = build_index(iter_chunks(emails))
+    if len(fi.meta)==0:
         print("Nenhum texto de e-mail encontrado para indexar.")
         return
-    dim = len(vectors[0])
-    fi = FaissIndex(dim, INDEX_PATH, META_PATH)
-    fi.build(vectors, metas)
-    print(f"Ingeridos {len(vectors)} chunks de e-mail em {INDEX_PATH}, JSONL parseado em {PARSED}")
+    fi.save()
+    save_manifest(manifest_from_meta(fi))
+    lsh.save(LSH_PATH)
+    metrics.inc("dedup_linked_total", n_dups)
+    print(f"Ingeridos {len(fi.meta)} chunks de e-mail em {INDEX_PATH} ({n_dups} quase-duplicatas ligadas "
+          f"ao chunk canônico), JSONL parseado em {PARSED}")
 
 if __name__ == "__main__":
-    ingest_emails()
+    import argparse
+    ap = argparse.ArgumentParser(description="Parseia data/emails.txt e indexa os chunks em vectorstore/emails")
+    ap.add_argument("--incremental", action="store_true", help="embeda só chunks novos/alterados e atualiza o índice existente")
+    ap.add_argument("--compact", action="store_true", help="força a compactação do índice (remove fisicamente os chunks removidos)")
+    args = ap.parse_args()
+    ingest_emails(incremental=args.incremental, compact=args.compact)
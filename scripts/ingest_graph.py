@@ -0,0 +1,24 @@
+# scripts/ingest_graph.py
+"""
+Etapa da ingestão que depende de Emails: monta o grafo de comunicação (core/comm_graph.py)
+a partir de data/emails_parsed.jsonl e grava vectorstore/emails/graph.npz.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from core.comm_graph import CommGraph, GRAPH_PATH, PARSED_JSONL
+
+def ingest_graph():
+    if not PARSED_JSONL.exists():
+        raise RuntimeError(f"{PARSED_JSONL} não encontrado. Execute scripts/ingest_emails.py primeiro.")
+    g = CommGraph.build(PARSED_JSONL)
+    g.save(GRAPH_PATH)
+    print(f"Grafo de comunicação: {len(g.people)} pessoas/listas, {len(g.src)} arestas em {len(g.days)} dias -> {GRAPH_PATH}")
+    return {"people": len(g.people), "edges": len(g.src), "days": len(g.days)}
+
+if __name__ == "__main__":
+    import argparse
+    argparse.ArgumentParser(description="Grafo de comunicação (quem escreveu para quem, por dia)").parse_args()
+    ingest_graph()
@@ -8,9 +8,9 @@ workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, workspace_root)
 
 from pathlib import Path
-from core.embeddings import embed_text
+from core.embeddings import embed_texts
 from core.vectorstore import FaissIndex
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from core.chunking import TextChunker
 import os, pickle
 
 DATA_DIR = Path("data")
@@ -19,20 +19,21 @@ VSTORE_DIR = Path("vectorstore/policy")
 VSTORE_DIR.mkdir(parents=True, exist_ok=True)
 INDEX_PATH = VSTORE_DIR / "policy.index"
 META_PATH = VSTORE_DIR / "policy.meta.pkl"
+ANSWER_CACHE = VSTORE_DIR / "answers.cache.pkl"
 
 def ingest_policy():
     text = POLICY.read_text(encoding="utf-8")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=120)
-    chunks = splitter.split_text(text)
-    vectors = []
-    metas = []
-    for i, chunk in enumerate(chunks):
-        vec = embed_text(chunk)
-        vectors.append(vec)
-        metas.append({"source":"politica_compliance.txt","chunk_id":i,"text":chunk})
+    spans = TextChunker(chunk_size=800, chunk_overlap=120).spans(text)
+    chunks = [text[a:b] for a, b in spans]
+    vectors = embed_texts(chunks)
+    # offsets no documento: o RAG junta chunks sobrepostos/vizinhos numa passagem só (core/context.py)
+    metas = [{"source":"politica_compliance.txt","chunk_id":i,"text":chunk,"start":a,"end":b}
+             for i, (chunk, (a, b)) in enumerate(zip(chunks, spans))]
     dim = len(vectors[0])
     fi = FaissIndex(dim, INDEX_PATH, META_PATH)
     fi.build(vectors, metas)
+    # respostas em cache citam os chunks antigos (o agente também confere a versão do índice)
+    ANSWER_CACHE.unlink(missing_ok=True)
     print(f"Ingeridos {len(chunks)} chunks em {INDEX_PATH}")
 
 if __name__ == "__main__":
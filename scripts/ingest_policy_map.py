@@ -0,0 +1,24 @@
+# scripts/ingest_policy_map.py
+"""
+Etapa da ingestão que depende de Policy e Emails: calcula o mapa chunk de e-mail x chunk da
+política (core/policy_map.py) a partir dos vetores já indexados, sem chamadas remotas.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from core.policy_map import build_policy_map, MAP_PATH, TOP_K
+
+def ingest_policy_map(k=TOP_K):
+    out = build_policy_map(k)
+    print(f"Mapa e-mail -> política: {out['rows']} chunks de e-mail x {out['policy_chunks']} chunks da política "
+          f"(top-{out['k']}) em {MAP_PATH}")
+    return out
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Mapa de similaridade chunk de e-mail x chunk da política")
+    ap.add_argument("--k", type=int, default=TOP_K, help="seções da política por chunk de e-mail")
+    args = ap.parse_args()
+    ingest_policy_map(args.k)
@@ -1,7 +1,10 @@
 # scripts/ingest_transactions.py
 """
-Carregador CSV simples que normaliza as transações e escreve um CSV limpo para os agentes.
-Pressupõe que o CSV contém pelo menos: date, description, beneficiary, amount
+Normaliza data/transacoes_bancarias.csv (ledger bruto, nunca é sobrescrito) e escreve
+data/transacoes_normalizadas.csv para os agentes, com as colunas canônicas
+date, description, beneficiary, amount ao lado das colunas originais.
+Também grava um snapshot colunar tipado (Parquet) que o TransactionAgent carrega no lugar do CSV.
+A etapa é idempotente: rodar de novo sobre o mesmo bruto produz a mesma saída.
 """
 import sys, os
 # Adiciona a raiz do workspace ao path do Python
@@ -11,57 +14,222 @@ sys.path.insert(0, workspace_root)
 from pathlib import Path
 import pandas as pd
 import re
+from core.snapshot import SourceHash
 
 DATA_DIR = Path("data")
 IN_CSV = DATA_DIR / "transacoes_bancarias.csv"
-OUT_CSV = DATA_DIR / "transacoes_bancarias.csv"
-
-def normalize_amount(x):
-    if pd.isna(x): return 0.0
-    x = str(x).replace("$", "").replace(",", "").strip()
-    try:
-        return float(x)
-    except:
-        # tenta formato europeu
-        x = x.replace(".", "").replace(",", ".")
-        try:
-            return float(x)
-        except:
-            return 0.0
+OUT_CSV = DATA_DIR / "transacoes_normalizadas.csv"
+SNAPSHOT = DATA_DIR / "transacoes_normalizadas.parquet"
+
+# colunas de baixa cardinalidade: gravadas como dicionário (category no pandas)
+CATEGORICAL_COLUMNS = ["funcionario", "cargo", "categoria", "departamento", "beneficiary"]
+# colunas produzidas por esta etapa; se aparecerem no bruto (execuções antigas escreviam sobre ele),
+# só são usadas como fonte quando não há outra coluna candidata
+CANONICAL = ("date", "description", "beneficiary", "amount")
+
+# formatos de número sem ambiguidade: "1.234,56" / "12,5" (europeu) e "1,234.56" / "12.5" (americano)
+EU_NUMBER = r"-?(?:\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+,\d+)"
+US_NUMBER = r"-?(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+\.\d+)"
+
+def detect_amount_format(text):
+    """'eu', 'us' ou None (sem evidência) para uma coluna de valores em texto, por votação."""
+    eu = int(text.str.fullmatch(EU_NUMBER).sum())
+    us = int(text.str.fullmatch(US_NUMBER).sum())
+    if eu == us == 0:
+        return None
+    return "eu" if eu > us else "us"
+
+def parse_amounts(col, fmt=None):
+    """
+    Converte uma coluna de valores para float de forma vetorizada.
+    `fmt` ('us'/'eu') força o formato; senão ele é detectado pela coluna.
+    Retorna (valores, formato usado).
+    """
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(float).fillna(0.0), fmt
+    text = col.astype("string").str.replace(r"[^\d,.\-]", "", regex=True)
+    fmt = fmt or detect_amount_format(text)
+    if fmt == "eu":
+        text = text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        text = text.str.replace(",", "", regex=False)
+    return pd.to_numeric(text, errors="coerce").fillna(0.0).astype(float), fmt
+
+SLASH_DATE = r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})"
+
+def date_order_votes(col):
+    """(dia primeiro, mês primeiro): datas com barra cuja 1ª / 2ª parte só pode ser o dia (> 12)."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return 0, 0
+    parts = col.astype("string").str.strip().str.extract(SLASH_DATE).astype(float)
+    return int((parts[0] > 12).sum()), int((parts[1] > 12).sum())
+
+def decide_date_order(dayfirst, monthfirst):
+    """'dayfirst', 'monthfirst' ou None (sem evidência), por votação."""
+    if dayfirst == monthfirst == 0:
+        return None
+    return "dayfirst" if dayfirst > monthfirst else "monthfirst"
+
+def detect_date_order(path, col, chunksize=100_000):
+    """Ordem dia/mês da coluna de datas do arquivo inteiro (só essa coluna, em pedaços)."""
+    dayfirst = monthfirst = 0
+    for chunk in pd.read_csv(path, usecols=lambda c: c.strip().lower() == col, dtype=str, chunksize=chunksize):
+        d, m = date_order_votes(chunk.iloc[:, 0])
+        dayfirst, monthfirst = dayfirst + d, monthfirst + m
+    return decide_date_order(dayfirst, monthfirst)
+
+def parse_dates(col, order=None):
+    """
+    ISO (AAAA-MM-DD[ HH:MM]) vetorizado; datas com barra usam `order` ('dayfirst'/'monthfirst'),
+    decidida para a coluna inteira (detect_columns); sem ela, a ordem é votada nesta coluna.
+    Retorna (datas, ordem usada).
+    """
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col, order
+    text = col.astype("string").str.strip()
+    out = pd.to_datetime(text, format="ISO8601", errors="coerce")
+    rest = out.isna() & text.notna()
+    if rest.any():
+        order = order or decide_date_order(*date_order_votes(text[rest]))
+        fmt = "%d/%m/%Y" if order == "dayfirst" else "%m/%d/%Y"
+        normalized = text[rest].str.replace(r"[.-]", "/", regex=True).str.slice(0, 10)
+        out[rest] = pd.to_datetime(normalized, format=fmt, errors="coerce")
+    return out, order
+
+def _pick(columns, *needles):
+    found = [c for c in columns if any(n in c for n in needles)]
+    # colunas de fonte primeiro, canônicas (derivadas) por último
+    found.sort(key=lambda c: c in CANONICAL)
+    return found[0] if found else None
 
-def ingest_transactions():
-    df = pd.read_csv(IN_CSV)
+def detect_columns(df, path=None):
+    """
+    Escolhe, pelo cabeçalho (e tipos do primeiro pedaço), as colunas de valor, data, descrição e beneficiário.
+    Com `path`, a ordem dia/mês das datas com barra é votada na coluna de datas do arquivo inteiro
+    (uma vez, antes dos pedaços); sem ele, no primeiro pedaço com evidência, como o formato do valor.
+    """
     # heurística de normalização de colunas
-    # nomes de colunas em minúsculas
-    df.columns = [c.strip().lower() for c in df.columns]
     # colunas obrigatórias: date, description, beneficiary, amount
-    # tenta encontrar coluna tipo amount
-    amount_cols = [c for c in df.columns if 'amount' in c or 'valor' in c or 'amount' in c or 'value' in c]
-    if len(amount_cols)==0:
+    amount_col = _pick(df.columns, 'valor', 'amount', 'value')
+    if amount_col is None:
         # tenta adivinhar coluna numérica
         numeric_cols = df.select_dtypes(include='number').columns
         amount_col = numeric_cols[0] if len(numeric_cols)>0 else df.columns[-1]
-    else:
-        amount_col = amount_cols[0]
-    df['amount'] = df[amount_col].apply(normalize_amount)
-    date_cols = [c for c in df.columns if 'date' in c or 'data' in c]
-    if len(date_cols)>0:
-        df['date'] = pd.to_datetime(df[date_cols[0]], errors='coerce')
+    date_col = _pick(df.columns, 'data', 'date')
+    return {
+        "amount": amount_col,
+        "amount_format": None,
+        "date": date_col,
+        "date_order": detect_date_order(path, date_col) if path is not None and date_col else None,
+        "description": _pick(df.columns, 'descri', 'histor', 'memo'),
+        # heurísticas de beneficiário
+        "beneficiary": _pick(df.columns, 'benef', 'supplier', 'payee', 'destinatario'),
+    }
+
+def normalize_transactions(df, cols):
+    # nomes de colunas em minúsculas
+    df.columns = [c.strip().lower() for c in df.columns]
+    df['amount'], fmt = parse_amounts(df[cols["amount"]], cols["amount_format"])
+    # formato decidido no primeiro pedaço com evidência vale para o resto da coluna
+    cols["amount_format"] = cols["amount_format"] or fmt
+    if cols["date"]:
+        df['date'], order = parse_dates(df[cols["date"]], cols.get("date_order"))
+        cols["date_order"] = cols.get("date_order") or order
     else:
         df['date'] = pd.to_datetime('today')
-    # heurísticas de beneficiário
-    beneficiary_cols = [c for c in df.columns if 'benef' in c or 'supplier' in c or 'payee' in c or 'destinatario' in c]
-    if len(beneficiary_cols)>0:
-        df['beneficiary'] = df[beneficiary_cols[0]]
+    if cols["description"]:
+        df['description'] = df[cols["description"]].astype("string").str.strip()
+    if cols["beneficiary"]:
+        df['beneficiary'] = df[cols["beneficiary"]].astype("string").fillna('unknown')
     else:
-        # tenta dividir descrição
-        if 'description' in df.columns:
-            df['beneficiary'] = df['description'].apply(lambda x: str(x).split()[0])
-        else:
-            df['beneficiary'] = 'unknown'
-    # salva CSV limpo
-    df.to_csv(OUT_CSV, index=False)
-    print(f"Transações normalizadas escritas em {OUT_CSV}")
+        df['beneficiary'] = 'unknown'
+    return df
+
+def snapshot_table(df):
+    """Converte um pedaço normalizado em tabela Arrow com tipos estáveis entre pedaços."""
+    import pyarrow as pa
+    df = df.copy()
+    for c in CATEGORICAL_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype("string").astype("category")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if field.name in CATEGORICAL_COLUMNS:
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif field.name == "amount":
+            field = field.with_type(pa.float64())
+        elif field.name == "date":
+            field = field.with_type(pa.timestamp("ns"))
+        elif pa.types.is_large_string(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    # descarta os metadados do pandas: dependem do pedaço e o schema deve ser idêntico entre eles
+    return table.cast(pa.schema(fields))
+
+class SnapshotWriter:
+    """Grava o snapshot Parquet pedaço a pedaço; sem pyarrow instalado, vira no-op (o agente usa o CSV)."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmp = self.path.with_suffix(".parquet.tmp")
+        self.writer = None
+        try:
+            import pyarrow.parquet as pq
+            self.pq = pq
+        except ImportError:
+            self.pq = None
+            print("pyarrow não instalado: snapshot Parquet não será gerado.")
+
+    def write(self, df):
+        if self.pq is None:
+            return
+        table = snapshot_table(df)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.tmp, table.schema, compression="zstd")
+        self.writer.write_table(table, row_group_size=64_000)
+
+    def close(self, source=None, csv=None):
+        """`source`: SourceHash do CSV `csv` escrito junto (já no lugar), gravado nos metadados para o leitor conferir."""
+        if self.writer is None:
+            return
+        if source is not None:
+            self.writer.add_key_value_metadata(source.metadata(csv))
+        self.writer.close()
+        self.tmp.replace(self.path)
+        print(f"Snapshot colunar escrito em {self.path}")
+
+def ingest_transactions(chunksize=None):
+    # escreve em arquivo temporário e troca no final: quem lê OUT_CSV nunca vê um arquivo pela metade
+    tmp = OUT_CSV.with_suffix(".csv.tmp")
+    snapshot = SnapshotWriter(SNAPSHOT)
+    header = pd.read_csv(IN_CSV, nrows=100)
+    header.columns = [c.strip().lower() for c in header.columns]
+    cols = detect_columns(header, IN_CSV)
+    # o bruto pode ainda trazer colunas canônicas de execuções antigas: são recalculadas, não copiadas
+    derived = [c for c in CANONICAL if c in header.columns and c not in cols.values()]
+    raw = [cols[c] for c in CANONICAL if cols.get(c) and cols[c] != c]
+    # modo streaming: lê, normaliza e escreve pedaço a pedaço (memória limitada)
+    chunks = pd.read_csv(IN_CSV, chunksize=chunksize) if chunksize else [pd.read_csv(IN_CSV)]
+    rows = 0
+    # tamanho e hash dos bytes escritos: o snapshot registra de qual CSV ele é
+    source = SourceHash()
+    with open(tmp, "wb") as f:
+        for chunk in chunks:
+            chunk.columns = [c.strip().lower() for c in chunk.columns]
+            chunk = normalize_transactions(chunk.drop(columns=derived), cols)
+            data = chunk.to_csv(index=False, header=rows == 0).encode("utf-8")
+            f.write(data)
+            source.update(data)
+            # o snapshot leva só as colunas canônicas, sem as de origem de que elas saíram (ex.: descricao, valor, data)
+            snapshot.write(chunk.drop(columns=raw))
+            rows += len(chunk)
+    tmp.replace(OUT_CSV)
+    print(f"{rows} transações normalizadas escritas em {OUT_CSV}")
+    snapshot.close(source, OUT_CSV)
 
 if __name__ == "__main__":
-    ingest_transactions()
+    import argparse
+    ap = argparse.ArgumentParser(description="Normaliza data/transacoes_bancarias.csv em data/transacoes_normalizadas.csv")
+    ap.add_argument("--chunksize", type=int, default=None, help="processa o CSV em pedaços de N linhas")
+    args = ap.parse_args()
+    ingest_transactions(chunksize=args.chunksize)
@@ -0,0 +1,27 @@
+# scripts/ingest_tx_index.py
+"""
+Etapa da ingestão que depende de Transactions: monta o índice de busca do ledger normalizado
+(core/tx_index.py) em vectorstore/transactions/tx_index.npz, usado pelo comando `search-tx`.
+Só lê o CSV/snapshot normalizado: nenhuma chamada remota.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from core.tx_index import TxIndex, DATA_CSV, SNAPSHOT, INDEX_PATH
+
+def ingest_tx_index():
+    if not DATA_CSV.exists() and not SNAPSHOT.exists():
+        raise RuntimeError(f"{DATA_CSV} não encontrado. Execute scripts/ingest_transactions.py primeiro.")
+    idx = TxIndex.build()
+    idx.save()
+    print(f"Índice de transações: {idx.n} linhas, {len(idx.a['tri_keys'])} trigramas, "
+          f"{len(idx.names)} funcionários -> {INDEX_PATH}")
+    return {"rows": idx.n, "trigrams": len(idx.a["tri_keys"]), "employees": len(idx.names)}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Índice de busca do ledger (texto, data, valor, funcionário)")
+    ap.parse_args()
+    ingest_tx_index()
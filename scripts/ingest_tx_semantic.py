@@ -0,0 +1,39 @@
+# scripts/ingest_tx_semantic.py
+"""
+Etapa da ingestão que depende de Transactions e Emails: prepara o score semântico da correlação
+(core/semantic_match.py):
+- embeda, em lotes, as descrições distintas do ledger que ainda não estão no cache de vetores
+- copia os vetores normalizados dos chunks de e-mail para vectorstore/emails/chunk_vectors.npz
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from core.semantic_match import DescriptionVectors, build_chunk_vectors, model_key, tx_text, DESC_CACHE, CHUNK_VECTORS
+from core.tx_index import DATA_CSV
+
+def ingest_tx_semantic(batch_size=None):
+    import pandas as pd
+    if not DATA_CSV.exists():
+        raise RuntimeError(f"{DATA_CSV} não encontrado. Execute scripts/ingest_transactions.py primeiro.")
+    texts = set()
+    for frame in pd.read_csv(DATA_CSV, usecols=lambda c: c in ("description", "descricao", "beneficiary"),
+                             chunksize=100_000):
+        texts.update(tx_text(row) for row in frame.to_dict("records"))
+    texts.discard("")
+    cache = DescriptionVectors.load(model=model_key())
+    embedded = cache.embed(sorted(texts), batch_size=batch_size)
+    if embedded:
+        cache.save()
+    chunks = build_chunk_vectors()
+    print(f"Score semântico: {len(texts)} descrições distintas ({embedded} embedadas, "
+          f"{len(texts) - embedded} do cache) -> {DESC_CACHE}; {chunks['chunks']} chunks de e-mail -> {CHUNK_VECTORS}")
+    return {"descriptions": len(texts), "embedded": embedded, **chunks}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Vetores das descrições de transações e dos chunks de e-mail para a correlação")
+    ap.add_argument("--batch-size", type=int, default=None, help="textos por chamada de embedding")
+    args = ap.parse_args()
+    ingest_tx_semantic(args.batch_size)
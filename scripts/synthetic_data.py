@@ -0,0 +1,182 @@
+# scripts/synthetic_data.py
+"""
+Gera dados sintéticos nos formatos de data/transacoes_bancarias.csv e data/emails.txt, em escala
+configurável (1x ≈ 2.000 transações e 120 e-mails, como os dados do projeto; 1000x ≈ 2 milhões).
+A escala multiplica funcionários e fornecedores, mantendo o período (abril–maio/2008): a densidade
+por funcionário/dia fica a mesma dos dados reais. Mesma semente -> mesmos arquivos.
+O ledger é escrito em pedaços vetorizados e o dump de e-mails em streaming (memória limitada).
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+BASE_TRANSACTIONS = 2000
+BASE_EMAILS = 120
+START = np.datetime64("2008-04-01")
+DAYS = 61
+SEPARATOR = "-" * 79
+
+EMPLOYEES = [
+    ("Michael Scott", "Gerente Regional", "Gerência"), ("Dwight Schrute", "Vendedor", "Vendas"),
+    ("Jim Halpert", "Vendedor", "Vendas"), ("Pam Beesly", "Recepcionista", "Administrativo"),
+    ("Angela Martin", "Contadora", "Contabilidade"), ("Kevin Malone", "Contador", "Contabilidade"),
+    ("Oscar Martinez", "Contador", "Contabilidade"), ("Andy Bernard", "Vendedor", "Vendas"),
+    ("Stanley Hudson", "Vendedor", "Vendas"), ("Phyllis Vance", "Vendedor", "Vendas"),
+    ("Creed Bratton", "Qualidade", "Qualidade"), ("Darryl Philbin", "Chefe de Depósito", "Depósito"),
+    ("Kelly Kapoor", "Atendimento", "Atendimento ao Cliente"), ("Meredith Palmer", "Rel. Fornecedores", "Suprimentos"),
+    ("Toby Flenderson", "RH", "Recursos Humanos"),
+]
+# categoria -> fornecedores (a descrição segue o padrão "Fornecedor - Despesa de Categoria")
+VENDORS = {
+    "Material de Escritório": ["Staples", "Papelaria Local", "Office Depot"],
+    "Refeição com Cliente": ["Chili's", "Cooper's Seafood", "Alfredo's Pizza Cafe"],
+    "Logística": ["Transportadora Keystone", "Frete Scranton"],
+    "Manutenção": ["Elétrica Lackawanna", "Hidráulica Scranton"],
+    "Copa e Cozinha": ["Água Crystal", "Mercado Gerrity's"],
+    "Transporte Local": ["Táxi Scranton", "Estacionamento Centro"],
+    "Correios": ["USPS", "FedEx"],
+    "Diversos": ["Loja de Conveniência", "Bazar Outros Itens"],
+    "Refeição": ["Cugino's", "Poor Richard's"],
+    "Viagem": ["Hotel Radisson", "Amtrak"],
+}
+CATEGORY_WEIGHTS = np.array([314, 276, 236, 225, 221, 205, 204, 118, 105, 85], dtype=float)
+# itens da lista negra da política (Seção 3), em algumas poucas transações
+PROHIBITED = ["Kit de Mágica Profissional", "Algemas de Pelúcia", "Katana Decorativa", "Baralho Marcado", "Nunchaku"]
+
+def _name(base, copy):
+    return base if copy == 0 else f"{base} {copy + 1}"
+
+def _email_address(name):
+    return name.lower().replace(" ", ".") + "@dundermifflin.com"
+
+def iter_ledger_chunks(scale=1, seed=0, chunksize=100_000):
+    """DataFrames com as colunas do ledger bruto, em pedaços de até `chunksize` linhas, ordenados por data."""
+    rng = np.random.default_rng(seed)
+    total = int(BASE_TRANSACTIONS * scale)
+    copies = max(1, int(round(scale)))
+    categories = list(VENDORS)
+    probs = CATEGORY_WEIGHTS / CATEGORY_WEIGHTS.sum()
+    # dia de cada linha já ordenado; o pedaço só sorteia os demais campos
+    days = np.sort(rng.integers(0, DAYS, size=total))
+    for start in range(0, total, chunksize):
+        n = min(chunksize, total - start)
+        emp = rng.integers(0, len(EMPLOYEES), size=n)
+        copy = rng.integers(0, copies, size=n)
+        cat = rng.choice(len(categories), size=n, p=probs)
+        amount = np.round(rng.lognormal(mean=3.6, sigma=0.8, size=n), 2)
+        # ~0,5% de despesas grandes (acima do limite de PO)
+        big = rng.random(n) < 0.005
+        amount[big] = np.round(rng.uniform(550, 5000, size=big.sum()), 2)
+        descr, cat_names = [], []
+        prohibited = rng.random(n) < 0.002
+        vendor_pick = rng.integers(0, 3, size=n)
+        for i in range(n):
+            c = categories[cat[i]]
+            vendors = VENDORS[c]
+            vendor = _name(vendors[vendor_pick[i] % len(vendors)], int(copy[i]) % copies)
+            if prohibited[i]:
+                descr.append(PROHIBITED[i % len(PROHIBITED)])
+            else:
+                descr.append(f"{vendor} - Despesa de {c}")
+            cat_names.append(c)
+        names = [EMPLOYEES[e] for e in emp]
+        yield pd.DataFrame({
+            "id_transacao": [f"TX_{1000 + start + i}" for i in range(n)],
+            "data": (START + days[start:start + n]).astype(str),
+            "funcionario": [_name(e[0], int(k)) for e, k in zip(names, copy)],
+            "cargo": [e[1] for e in names],
+            "descricao": descr,
+            "valor": amount,
+            "categoria": cat_names,
+            "departamento": [e[2] for e in names],
+        })
+
+def write_ledger(path, scale=1, seed=0):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = 0
+    with path.open("w", encoding="utf-8", newline="") as fo:
+        for i, chunk in enumerate(iter_ledger_chunks(scale, seed)):
+            chunk.to_csv(fo, index=False, header=(i == 0))
+            rows += len(chunk)
+    return rows
+
+MUNDANE = [
+    ("Reunião de equipe", "Pessoal, a reunião de {weekday} foi remarcada para as {hour}h. Tragam os relatórios de vendas."),
+    ("Almoço", "Alguém quer almoçar no {vendor}? Eu pago a primeira rodada."),
+    ("Re: Relatório trimestral", "Os números do trimestre batem com o sistema. Falta só a assinatura na página 4."),
+    ("Reembolso", "Deixei o recibo de ${amount} do {vendor} na sua mesa para reembolso."),
+    ("Festa do escritório", "O Comitê de Festas vai comprar o bolo e os balões. Orçamento curto, nada de extravagâncias."),
+]
+SUSPICIOUS = [
+    ("Urgente - pagamento", "Precisamos pagar o {vendor} (${amount}) pela conta alternativa. Não registrar no sistema."),
+    ("Confidencial", "Vamos dividir a compra do {vendor} em parcelas menores para não passar do limite. Não conte para ninguém."),
+    ("Operação Fênix", "A operação segue. Apague o recibo do {vendor} e use o cartão corporativo só quando eu avisar."),
+]
+FILLER = ("O relatório completo está na pasta compartilhada, com os anexos de cada fornecedor e as observações da "
+          "contabilidade sobre prazos, notas fiscais e centros de custo. ")
+
+def iter_email_blocks(scale=1, seed=0):
+    """Texto de cada mensagem do dump (sem separador), em ordem cronológica."""
+    rng = np.random.default_rng(seed + 1)
+    total = int(BASE_EMAILS * scale)
+    copies = max(1, int(round(scale)))
+    minutes = np.sort(rng.integers(0, DAYS * 24 * 60, size=total))
+    weekdays = ["segunda", "terça", "quarta", "quinta", "sexta"]
+    vendors = [v for vs in VENDORS.values() for v in vs]
+    previous = None
+    for i in range(total):
+        a, b = rng.choice(len(EMPLOYEES), size=2, replace=False)
+        k = int(rng.integers(0, copies))
+        sender, to = _name(EMPLOYEES[a][0], k), _name(EMPLOYEES[b][0], k)
+        when = START.astype("datetime64[m]") + int(minutes[i])
+        vendor = _name(vendors[int(rng.integers(0, len(vendors)))], k)
+        amount = f"{rng.lognormal(4.0, 1.0):.2f}"
+        if previous is not None and rng.random() < 0.05:
+            # encaminhamento com o corpo anterior citado (quase-duplicata)
+            subject, body = f"FW: {previous[0]}", f"Veja abaixo.\n\n{previous[1]}"
+        else:
+            pool = SUSPICIOUS if rng.random() < 0.1 else MUNDANE
+            subject, template = pool[int(rng.integers(0, len(pool)))]
+            body = template.format(weekday=weekdays[int(rng.integers(0, 5))], hour=int(rng.integers(9, 17)),
+                                   vendor=vendor, amount=amount)
+            # parte dos e-mails é longa o bastante para virar vários chunks
+            body += "\n" + FILLER * int(rng.integers(0, 6))
+        previous = (subject, body)
+        yield (f"De: {sender} <{_email_address(sender)}>\nPara: {to} <{_email_address(to)}>\n"
+               f"Data: {str(when).replace('T', ' ')}\nAssunto: {subject}\nMensagem:\n{body.strip()}")
+
+def write_emails(path, scale=1, seed=0):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with path.open("w", encoding="utf-8") as fo:
+        fo.write("DUMP DE SERVIDOR DE E-MAIL - DUNDER MIFFLIN SCRANTON (SINTÉTICO)\n")
+        for block in iter_email_blocks(scale, seed):
+            fo.write(f"{SEPARATOR}\n\n{block}\n")
+            n += 1
+        fo.write(f"{SEPARATOR}\n")
+    return n
+
+def generate(data_dir, scale=1, seed=0):
+    """Escreve transacoes_bancarias.csv e emails.txt em `data_dir`; retorna as contagens."""
+    data_dir = Path(data_dir)
+    return {
+        "transactions": write_ledger(data_dir / "transacoes_bancarias.csv", scale, seed),
+        "emails": write_emails(data_dir / "emails.txt", scale, seed),
+    }
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Gera ledger e dump de e-mails sintéticos")
+    ap.add_argument("--out", default="data_synthetic", help="diretório de saída")
+    ap.add_argument("--scale", type=float, default=1, help="fator de escala (1 a 1000)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    counts = generate(args.out, args.scale, args.seed)
+    print(f"{counts['transactions']} transações e {counts['emails']} e-mails gerados em {args.out}")
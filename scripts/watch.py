@@ -0,0 +1,459 @@
+# scripts/watch.py
+"""
+Auditoria contínua: acompanha data/emails.txt e data/transacoes_bancarias.csv (como `tail -f`) e,
+opcionalmente, uma pasta de entrada onde chegam arquivos novos (.txt de e-mails, .csv de transações).
+A cada rodada, só o que foi acrescentado é processado:
+- e-mails: parseados, gravados no JSONL, embedados e anexados ao índice (com dedup MinHash/LSH),
+  varridos pelas palavras-chave suspeitas e correlacionados com as transações da janela
+- transações: normalizadas, anexadas ao CSV normalizado, avaliadas pelas regras por linha,
+  agregadas (janela recente do ledger) e estatística, e correlacionadas com os e-mails da janela
+Cada alerta vira uma linha JSONL com a latência desde a escrita no arquivo de origem (mtime) até o alerta.
+Arquivos da pasta de entrada são acrescentados aos arquivos de origem (que continuam sendo a fonte da
+ingestão completa) e movidos para <pasta>/processados.
+As posições lidas ficam em vectorstore/watch_state.json: o watch retoma de onde parou.
+"""
+import sys, os
+# Adiciona a raiz do workspace ao path do Python
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+import bisect
+import io
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import pandas as pd
+from core import metrics
+
+ALERTS_PATH = Path("data/alerts.jsonl")
+STATE_PATH = Path("vectorstore/watch_state.json")
+POLL_SECONDS = 1.0
+# sem separador no fim, o último e-mail acrescentado só é processado depois de `SETTLE_SECONDS` sem mudanças
+SETTLE_SECONDS = 2.0
+EMAIL_SEPARATOR = "-" * 79
+
+def _now():
+    return datetime.now().isoformat(timespec="milliseconds")
+
+def append_text(path, text):
+    """Acrescenta `text` ao fim de `path`, pondo antes uma quebra de linha se o arquivo não terminar em uma."""
+    with open(path, "rb+") as fo:
+        size = fo.seek(0, os.SEEK_END)
+        if size:
+            fo.seek(size - 1)
+            last = fo.read(1)
+            if last != b"\n":
+                text = "\n" + text
+        fo.seek(0, os.SEEK_END)
+        fo.write(text.encode("utf-8"))
+
+class Watcher:
+    def __init__(self, out=ALERTS_PATH, drop_dir=None, min_score=None, settle=SETTLE_SECONDS,
+                 state_path=STATE_PATH, on_alert=None):
+        from agents.audit_agent import MEDIUM_RISK
+        self.out = Path(out)
+        self.drop_dir = Path(drop_dir) if drop_dir else None
+        self.min_score = MEDIUM_RISK if min_score is None else min_score
+        self.settle = settle
+        self.state_path = Path(state_path)
+        # on_alert(alerta) a cada alerta emitido (saída no CLI)
+        self.on_alert = on_alert
+        # horário de escrita mais antigo ainda não lido, por origem (arquivos da pasta de entrada)
+        self._pending_since = {}
+        self._tail = {"text": None, "since": None}
+        # melhor score de correlação conhecido por transação (só as já consultadas)
+        self._best = {}
+        self._load()
+
+    # --- estado ---
+
+    def _load(self):
+        """Carrega índice, e-mails, ledger e posições; sem estado salvo, começa no fim dos arquivos."""
+        from scripts import ingest_emails as ie, ingest_transactions as it
+        from agents.transaction_agent import TransactionAgent, ANOMALY_STATE, score_anomalies
+        from agents.correlation_agent import CorrelationAgent
+        from core.vectorstore import FaissIndex
+        with metrics.span("watch.load"):
+            self.fi = FaissIndex(0, ie.INDEX_PATH, ie.META_PATH)
+            self.manifest = ie.load_manifest(self.fi)
+            self.lsh = ie.load_lsh(self.fi)
+            self.emails = []
+            if ie.PARSED.exists():
+                with ie.PARSED.open("r", encoding="utf-8") as fo:
+                    self.emails = [json.loads(l) for l in fo]
+            self.ids = {e["id"] for e in self.emails}
+            self.ta = TransactionAgent()
+            self.ca = CorrelationAgent(ta=self.ta, emails=self.emails)
+            # vetores do score semântico carregados antes de qualquer anexo (que desatualiza a cópia dos chunks)
+            self.matcher = self.ca.semantic
+            # e-mails datados em ordem de data: a janela de cada transação sai por busca binária
+            self.dated = sorted(self.ca._load_emails(), key=lambda p: p[1])
+            self.dated_keys = [d for _, d in self.dated]
+            header = pd.read_csv(it.IN_CSV, nrows=100)
+            header.columns = [c.strip().lower() for c in header.columns]
+            self.tx_cols = it.detect_columns(header, it.IN_CSV)
+            self.tx_derived = [c for c in it.CANONICAL if c in header.columns and c not in self.tx_cols.values()]
+            with open(it.IN_CSV, "r", encoding="utf-8") as f:
+                self.tx_header = f.readline()
+            self.out_columns = list(pd.read_csv(it.OUT_CSV, nrows=0).columns)
+            # pontuação estatística em dia com o ledger antes de começar: só linhas novas geram alertas
+            self.scorer = self.ta._load_scorer(ANOMALY_STATE)
+            caught_up = score_anomalies(self.ta.df, self.scorer)
+            self.ta._save_scorer(self.scorer, ANOMALY_STATE, caught_up)
+        saved = json.loads(self.state_path.read_text(encoding="utf-8")) if self.state_path.exists() else {}
+        self.offsets = {}
+        for name, path in (("emails", ie.RAW), ("transactions", it.IN_CSV)):
+            st = path.stat()
+            prev = saved.get(name)
+            # retoma do estado salvo se o arquivo é o mesmo e não encolheu; senão, do fim (o que já está lá foi ingerido)
+            if prev and prev["inode"] == st.st_ino and prev["offset"] <= st.st_size:
+                self.offsets[name] = prev["offset"]
+            else:
+                self.offsets[name] = st.st_size
+        self._save_state()
+
+    def _save_state(self):
+        from scripts import ingest_emails as ie, ingest_transactions as it
+        state = {name: {"path": str(path), "inode": path.stat().st_ino, "offset": self.offsets[name]}
+                 for name, path in (("emails", ie.RAW), ("transactions", it.IN_CSV))}
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        tmp.replace(self.state_path)
+
+    def _read_new(self, name, path):
+        """(bytes acrescentados desde a última leitura, horário da escrita mais antiga não lida)."""
+        st = path.stat()
+        if st.st_size < self.offsets[name]:
+            print(f"⚠️ {path} encolheu (reescrito?): retomando do fim; rode a ingestão completa", file=sys.stderr)
+            self.offsets[name] = st.st_size
+            return b"", None
+        if st.st_size == self.offsets[name]:
+            return b"", None
+        with open(path, "rb") as f:
+            f.seek(self.offsets[name])
+            data = f.read(st.st_size - self.offsets[name])
+        appended = min(st.st_mtime, self._pending_since.pop(name, st.st_mtime))
+        return data, appended
+
+    # --- alertas ---
+
+    def _emit(self, alert, appended_at):
+        now = time.time()
+        latency = max(now - appended_at, 0.0) if appended_at else None
+        alert = {"detected_at": _now(),
+                 "appended_at": datetime.fromtimestamp(appended_at).isoformat(timespec="milliseconds") if appended_at else None,
+                 "latency_ms": round(latency * 1000, 1) if latency is not None else None, **alert}
+        if latency is not None:
+            metrics.observe("watch_alert_latency_seconds", latency, source=alert["source"])
+        metrics.inc("watch_alerts_total", alert=alert["alert"], source=alert["source"])
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        with self.out.open("a", encoding="utf-8") as fo:
+            fo.write(json.dumps(alert, ensure_ascii=False, default=str) + "\n")
+        if self.on_alert:
+            self.on_alert(alert)
+        return alert
+
+    @staticmethod
+    def _email_ref(e):
+        return {k: e.get(k) for k in ("id", "from", "to", "subject", "date")}
+
+    def _correlation_alert(self, idx, tx, best, source):
+        from agents.audit_agent import HIGH_RISK
+        c = self.ca.correlation(idx, tx, best)
+        return {"alert": "correlation", "source": source,
+                "severity": "high" if best["score"] >= HIGH_RISK else "medium",
+                "tx_index": c["tx_index"], "transaction": c["transaction"],
+                "email": self._email_ref(best["email"]), "score": round(best["score"], 1),
+                "days_diff": best["days_diff"], "score_breakdown": best["score_breakdown"]}
+
+    # --- pasta de entrada ---
+
+    def poll_drop_dir(self):
+        """Acrescenta os arquivos completos da pasta de entrada aos arquivos de origem e os move para processados/."""
+        from scripts import ingest_emails as ie, ingest_transactions as it
+        if self.drop_dir is None or not self.drop_dir.exists():
+            return 0
+        done_dir = self.drop_dir / "processados"
+        moved = 0
+        for f in sorted(p for p in self.drop_dir.iterdir() if p.is_file() and p.suffix.lower() in (".txt", ".csv")):
+            st = f.stat()
+            # ainda sendo escrito: espera o arquivo ficar parado
+            if time.time() - st.st_mtime < self.settle:
+                continue
+            text = f.read_text(encoding="utf-8")
+            if f.suffix.lower() == ".txt":
+                target, name = ie.RAW, "emails"
+                body = text.strip("\n")
+                if not body.endswith(EMAIL_SEPARATOR[:3]):
+                    body += "\n" + EMAIL_SEPARATOR
+                text = body + "\n"
+            else:
+                target, name = it.IN_CSV, "transactions"
+                lines = text.splitlines(keepends=True)
+                if not lines or [c.strip().lower() for c in lines[0].split(",")] != \
+                        [c.strip().lower() for c in self.tx_header.split(",")]:
+                    print(f"⚠️ {f.name}: cabeçalho diferente de {it.IN_CSV}; arquivo ignorado", file=sys.stderr)
+                    continue
+                text = "".join(lines[1:])
+                if text and not text.endswith("\n"):
+                    text += "\n"
+            # o arquivo de origem pode não terminar em quebra de linha
+            append_text(target, text)
+            self._pending_since[name] = min(st.st_mtime, self._pending_since.get(name, st.st_mtime))
+            done_dir.mkdir(exist_ok=True)
+            f.replace(done_dir / f.name)
+            moved += 1
+        return moved
+
+    # --- score semântico ---
+
+    def _refresh_chunk_vectors(self):
+        """
+        Depois de anexar e-mails, regrava a cópia dos vetores dos chunks a partir do índice em memória, para
+        os e-mails novos (e o `correlate` em lote) continuarem com o score semântico. Se a cópia já estava
+        ausente ou desatualizada no início, nada muda: o `correlate` também não a usaria.
+        """
+        from core.semantic_match import build_chunk_vectors
+        if self.matcher is None:
+            return
+        with metrics.span("watch.emails.chunk_vectors"):
+            build_chunk_vectors(emails=self.fi)
+            self.ca._semantic = None
+            self.matcher = self.ca.semantic
+
+    def _embed_descriptions(self, new):
+        """Embeda as descrições novas que faltam no cache (uma chamada interativa) e grava o cache."""
+        from core.semantic_match import tx_text
+        if self.matcher is None:
+            return
+        with metrics.span("watch.transactions.embed"):
+            if self.matcher.descriptions.embed([tx_text(tx) for _, tx in new.iterrows()], priority="interactive"):
+                self.matcher.descriptions.save()
+
+    # --- e-mails ---
+
+    def _new_parts(self, data):
+        """Mensagens completas (seguidas de separador) dos bytes novos; o resto fica pendente."""
+        from scripts.ingest_emails import SEPARATOR
+        parts, pos = [], 0
+        for m in SEPARATOR.finditer(data):
+            parts.append(data[pos:m.start()].decode("utf-8"))
+            pos = m.end()
+        rest = data[pos:]
+        if parts:
+            self._tail = {"text": None, "since": None}
+            return parts, pos
+        # sem separador: o último e-mail é considerado completo depois de `settle` segundos sem mudanças
+        if rest.strip():
+            if self._tail["text"] != rest:
+                self._tail = {"text": rest, "since": time.time()}
+            elif time.time() - self._tail["since"] >= self.settle:
+                self._tail = {"text": None, "since": None}
+                return [rest.decode("utf-8")], len(data)
+        return [], 0
+
+    def _with_ids(self, parts):
+        from scripts.ingest_emails import parse_email, email_uid
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+            email = parse_email(part)
+            uid, n = email_uid(email), 1
+            # mesma regra da ingestão: repetições do mesmo e-mail recebem sufixo pela ordem de ocorrência
+            while (uid if n == 1 else f"{uid}-{n}") in self.ids:
+                n += 1
+            email["id"] = uid if n == 1 else f"{uid}-{n}"
+            self.ids.add(email["id"])
+            yield email
+
+    def poll_emails(self):
+        from scripts import ingest_emails as ie
+        from agents.email_agent import SUSPICIOUS_KEYWORDS
+        data, appended = self._read_new("emails", ie.RAW)
+        if not data:
+            return []
+        parts, consumed = self._new_parts(data)
+        if not consumed:
+            # nada completo ainda: a escrita mais antiga continua pendente
+            self._pending_since["emails"] = appended
+            return []
+        self.offsets["emails"] += consumed
+        alerts = []
+        with metrics.span("watch.emails"):
+            new = list(self._with_ids(parts))
+            with ie.PARSED.open("a", encoding="utf-8") as fo:
+                for e in new:
+                    fo.write(json.dumps(e, ensure_ascii=False) + "\n")
+            self.emails.extend(new)
+            with metrics.span("watch.emails.index"):
+                ie.append_chunks(list(ie.iter_chunks(new)), self.fi, self.manifest, self.lsh, priority="interactive")
+            self._refresh_chunk_vectors()
+            metrics.inc("watch_emails_total", len(new))
+            for e in new:
+                body = (e.get("body") or "").lower()
+                hits = [kw for kw in SUSPICIOUS_KEYWORDS if kw.lower() in body]
+                if hits:
+                    alerts.append(self._emit({"alert": "keyword", "source": "emails", "severity": "medium",
+                                              "email": self._email_ref(e), "hits": hits}, appended))
+                alerts.extend(self._emit(a, appended) for a in self._correlate_email(e))
+        self._save_state()
+        return alerts
+
+    def _best_match(self, tx, fields):
+        """Melhor e-mail da janela de uma transação (busca binária na lista de e-mails ordenada por data)."""
+        window = timedelta(days=self.ca.days_window + 1)
+        lo = bisect.bisect_left(self.dated_keys, fields[0] - window)
+        hi = bisect.bisect_right(self.dated_keys, fields[0] + window)
+        window = []
+        for e, ed in self.dated[lo:hi]:
+            days_diff = abs((ed - fields[0]).days)
+            if days_diff <= self.ca.days_window:
+                window.append((e, days_diff))
+        best = None
+        for (e, days_diff), similarity in zip(window, self.ca.similarities(tx, [e for e, _ in window])):
+            c = self.ca.score_pair(fields, e, days_diff, similarity)
+            if best is None or c["score"] > best["score"]:
+                best = c
+        return best
+
+    def _correlate_email(self, e):
+        """
+        Um alerta por e-mail novo com as transações da janela (± days_window) das quais ele passa a ser
+        o melhor e-mail acima do corte (como no `correlate`, cada transação fica com o seu melhor e-mail).
+        """
+        try:
+            ed = pd_to_email_dt(e)
+        except (ValueError, OverflowError):
+            return []
+        df = self.ta.df
+        window = timedelta(days=self.ca.days_window)
+        near = df[(df["date"] >= pd.Timestamp(ed - window).normalize()) & (df["date"] <= pd.Timestamp(ed + window))]
+        matches = []
+        for idx, tx in near.iterrows():
+            fields = self.ca.tx_fields(tx)
+            days_diff = abs((ed - fields[0]).days)
+            if days_diff > self.ca.days_window:
+                continue
+            c = self.ca.score_pair(fields, e, days_diff, self.ca.similarities(tx, [e])[0])
+            if c["score"] < self.min_score:
+                continue
+            # melhor score anterior da transação (calculado uma vez e mantido)
+            if idx not in self._best:
+                prev = self._best_match(tx, fields)
+                self._best[idx] = prev["score"] if prev else 0.0
+            if c["score"] > self._best[idx]:
+                self._best[idx] = c["score"]
+                m = self._correlation_alert(idx, tx, c, "emails")
+                matches.append({k: m[k] for k in ("tx_index", "transaction", "score", "days_diff", "score_breakdown")})
+        pos = bisect.bisect_right(self.dated_keys, ed)
+        self.dated.insert(pos, (e, ed))
+        self.dated_keys.insert(pos, ed)
+        if not matches:
+            return []
+        from agents.audit_agent import HIGH_RISK
+        matches.sort(key=lambda m: -m["score"])
+        return [{"alert": "correlation", "source": "emails",
+                 "severity": "high" if matches[0]["score"] >= HIGH_RISK else "medium",
+                 "email": self._email_ref(e), "score": matches[0]["score"], "transactions": matches}]
+
+    # --- transações ---
+
+    def poll_transactions(self):
+        from scripts import ingest_transactions as it
+        from agents.transaction_agent import normalize_frame
+        data, appended = self._read_new("transactions", it.IN_CSV)
+        # só linhas completas; a última linha sem quebra fica para a próxima rodada
+        end = data.rfind(b"\n") + 1
+        if not end:
+            if data:
+                self._pending_since["transactions"] = appended
+            return []
+        self.offsets["transactions"] += end
+        with metrics.span("watch.transactions"):
+            chunk = pd.read_csv(io.StringIO(self.tx_header + data[:end].decode("utf-8")))
+            if chunk.empty:
+                self._save_state()
+                return []
+            chunk.columns = [c.strip().lower() for c in chunk.columns]
+            chunk = it.normalize_transactions(chunk.drop(columns=self.tx_derived), self.tx_cols)
+            chunk = chunk.reindex(columns=self.out_columns)
+            first = len(self.ta.df)
+            chunk.index = pd.RangeIndex(first, first + len(chunk))
+            # o CSV normalizado fica mais novo que o snapshot: os agentes passam a ler o CSV
+            chunk.to_csv(it.OUT_CSV, index=False, mode="a", header=False)
+            new = normalize_frame(chunk[[c for c in self.ta.df.columns if c in chunk.columns]].copy())
+            self.ta.df = pd.concat([self.ta.df, new])
+            self._embed_descriptions(new)
+            metrics.inc("watch_transactions_total", len(new))
+            alerts = [self._emit(a, appended) for a in self._tx_alerts(new)]
+        self._save_state()
+        return alerts
+
+    def _tx_alerts(self, new):
+        from agents.transaction_agent import AGGREGATE_RULES, ANOMALY_STATE, apply_aggregate_rule, score_anomalies
+        out = []
+        violations = self.ta.row_violations(new)
+        # regras agregadas: as linhas novas com as dos últimos dias do ledger; só episódios com linha nova
+        widest = max(r["window_days"] for r in AGGREGATE_RULES)
+        since = new["date"].min() - pd.Timedelta(days=widest - 1)
+        recent = self.ta.df[self.ta.df["date"] >= since.normalize()] if pd.notna(since) else new
+        fresh = set(new.index)
+        for rule in AGGREGATE_RULES:
+            violations += [v for v in apply_aggregate_rule(recent, rule) if fresh.intersection(v["related_rows"])]
+        flags = score_anomalies(new, self.scorer)
+        self.ta._save_scorer(self.scorer, ANOMALY_STATE, flags)
+        violations += flags
+        for v in violations:
+            out.append({"alert": "rule", "source": "transactions", **v})
+        # correlação com os e-mails da janela
+        for idx, tx in new.iterrows():
+            if pd.isna(tx.get("date")):
+                continue
+            best = self._best_match(tx, self.ca.tx_fields(tx))
+            self._best[idx] = best["score"] if best else 0.0
+            if best is not None and best["score"] >= self.min_score:
+                out.append(self._correlation_alert(idx, tx, best, "transactions"))
+        return out
+
+    # --- laço ---
+
+    def poll(self):
+        """Uma rodada: pasta de entrada, transações (mais baratas) e e-mails. Retorna os alertas emitidos."""
+        with metrics.span("watch.poll"):
+            self.poll_drop_dir()
+            return self.poll_transactions() + self.poll_emails()
+
+    def run(self, interval=POLL_SECONDS, once=False, stop=None):
+        """Rodadas a cada `interval` segundos até `stop()` ser verdadeiro (ou Ctrl+C); once=True faz uma só."""
+        total = 0
+        try:
+            while True:
+                total += len(self.poll())
+                if once or (stop and stop()):
+                    return total
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            return total
+
+def pd_to_email_dt(e):
+    from dateutil import parser as dtparser
+    if not e.get("date"):
+        raise ValueError("e-mail sem data")
+    return dtparser.parse(e["date"], dayfirst=False)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Acompanha e-mails e transações acrescentados e emite alertas em JSONL")
+    ap.add_argument("--drop-dir", default=None, help="pasta de entrada de arquivos novos (.txt de e-mails, .csv de transações)")
+    ap.add_argument("--out", default=str(ALERTS_PATH), help="arquivo JSONL de alertas")
+    ap.add_argument("--interval", type=float, default=POLL_SECONDS, help="segundos entre rodadas")
+    ap.add_argument("--min-score", type=float, default=None, help="score mínimo das correlações alertadas")
+    ap.add_argument("--once", action="store_true", help="processa o que estiver pendente e sai")
+    args = ap.parse_args()
+    w = Watcher(out=args.out, drop_dir=args.drop_dir, min_score=args.min_score,
+                on_alert=lambda a: print(json.dumps(a, ensure_ascii=False, default=str)))
+    n = w.run(args.interval, once=args.once)
+    print(f"{n} alertas em {args.out}", file=sys.stderr)
@@ -0,0 +1,24 @@
+# tests/test_watch.py
+import sys, os
+workspace_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, workspace_root)
+
+from scripts.watch import append_text
+
+def test_append_text_sem_quebra_no_fim(tmp_path):
+    path = tmp_path / "ledger.csv"
+    path.write_bytes(b"abc")
+    append_text(path, "X\n")
+    assert path.read_bytes() == b"abc\nX\n"
+
+def test_append_text_com_quebra_no_fim(tmp_path):
+    path = tmp_path / "ledger.csv"
+    path.write_bytes(b"abc\n")
+    append_text(path, "X\n")
+    assert path.read_bytes() == b"abc\nX\n"
+
+def test_append_text_arquivo_vazio(tmp_path):
+    path = tmp_path / "ledger.csv"
+    path.write_bytes(b"")
+    append_text(path, "X\n")
+    assert path.read_bytes() == b"X\n"